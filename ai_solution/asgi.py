@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_solution.settings')
 
-application = get_asgi_application()
+# Set up Django before the consumers import models.
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from main.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    # Django's own handler: async views and the async-capable middleware run
+    # on the event loop, sync views in its thread pool.
+    'http': django_asgi_app,
+    'websocket': AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+})
@@ -45,16 +45,66 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Outside SessionMiddleware, so session writes pin the client too.
+    'main.middleware.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.QueryProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'ai_solution.urls'
 
+# Per-request SQL profiling reported in Server-Timing response headers.
+# MODE is 'off', 'staff' (staff users only) or 'all'; set LOG_FILE to also
+# append one JSON line per request to a rotating log.
+QUERY_PROFILER = {
+    'MODE': 'staff',
+    'LOG_FILE': None,
+}
+
+# Anonymous full-page cache for the home, about and catalogue pages (see
+# main/page_cache.py). Each process keeps its pages in the default cache, keyed
+# by per-model version stamps that live in SHARED_CACHE and are bumped on
+# save/delete, so a change made through any process replaces them everywhere.
+PAGE_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 24 * 60 * 60,
+    'KEY_PREFIX': 'page-cache',
+    'SHARED_CACHE': 'shared',
+}
+
+# 'default' is Django's own default. 'tiered' holds expensive results such as
+# the admin dashboard aggregates: a per-process LRU in front of 'shared', a
+# file cache every process on the host reads (see main/tiered_cache.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'tiered': {
+        'BACKEND': 'main.tiered_cache.TieredCache',
+        'LOCATION': 'shared',
+        # Soft TTL; values are served stale for OPTIONS['STALE'] more seconds.
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'MAX_BYTES': 16 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 5,
+            'STALE': 300,
+            'LOCK_TIMEOUT': 30,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -68,6 +118,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.csrf_cookie',
             ],
         },
     },
@@ -79,13 +130,58 @@ WSGI_APPLICATION = 'ai_solution.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Applied to every new SQLite connection. Writers wait up to busy_timeout ms
+# for the lock instead of failing with "database is locked"; mmap_size is in
+# bytes and a negative cache_size is in KiB.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+}
+
+# The journal mode is stored in the database file, so switching to WAL would
+# rewrite the db.sqlite3 checked into the repository every time a management
+# command runs. Deployments opt in with SQLITE_WAL=1: readers then run while a
+# write is in progress, and NORMAL sync is durable across application crashes.
+# `manage.py sqlite_maintenance` checkpoints the WAL and runs optimize.
+if os.environ.get('SQLITE_WAL'):
+    SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', **SQLITE_PRAGMAS}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Transactions take the write lock when they start, so concurrent
+            # writers queue on busy_timeout rather than deadlock on upgrading
+            # a read lock mid-transaction.
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # A file rather than the shared-cache in-memory database, so tests run
+        # with the pragmas above and threaded tests get real locking.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Reads go to the READ_REPLICAS aliases (see main/db_router.py) except inside
+# transactions and, via a cookie, for STICKY_SECONDS after a client writes.
+# Setting SQLITE_READ_REPLICA to a file path adds a local SQLite replica,
+# refreshed from the primary by `manage.py sync_replicas`.
+DATABASE_ROUTERS = ['main.db_router.ReplicaRouter']
+READ_REPLICAS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 10,
+    'COOKIE_NAME': 'db_primary',
+}
+if os.environ.get('SQLITE_READ_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['SQLITE_READ_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS['ALIASES'] = ['replica']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -128,9 +224,44 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Outside DEBUG, collectstatic writes content-hashed names plus precompressed
+# .gz/.br copies (brotli is optional); main.assets.serve_static serves them
+# with immutable Cache-Control. Unhashed names are cached for STATIC_MAX_AGE.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'main.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+STATICFILES_COMPRESS_WORKERS = None  # None: ThreadPoolExecutor default
+STATIC_MAX_AGE = 300
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded media is served by main.assets.serve_media with Range, ETag and
+# conditional GET support. Behind nginx use 'x-accel-redirect' with an
+# internal location aliasing MEDIA_ROOT at ACCEL_REDIRECT_PREFIX, or
+# 'x-sendfile' behind Apache/lighttpd.
+MEDIA_SERVING = {
+    'MODE': 'django',
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+    'MAX_AGE': 86400,
+}
+
+# Resized WebP/JPEG copies of uploaded images (see main/images.py), made by
+# `manage.py generate_image_variants` from cron or with --loop.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960, 1280, 1920)
+IMAGE_VARIANT_QUALITY = 80
+# Seconds the variants of an image (or the lack of them) are cached per
+# process; variants generated by another process show up after this long.
+IMAGE_VARIANT_CACHE_TIMEOUT = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -140,11 +271,41 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGIN_URL = '/accounts/login/'
 
 ASGI_APPLICATION = 'ai_solution.asgi.application'
+# Route the home and services pages to their async variants, which gather
+# their queries on the async ORM. Only worth it when serving through
+# ai_solution.asgi; under WSGI each async view gets its own event loop.
+ASYNC_VIEWS = False
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels.layers.InMemoryChannelLayer'
     }
 }
+# The in-memory layer only reaches sockets in its own process. Set
+# CHANNEL_LAYER_PATH (a path prefix for the shard files) when running several
+# ASGI workers, or the external dashboard broadcaster, on one host.
+if os.environ.get('CHANNEL_LAYER_PATH'):
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'main.channel_layers.SQLiteChannelLayer',
+        'CONFIG': {
+            'path': os.environ['CHANNEL_LAYER_PATH'],
+            # Groups and channels are spread over this many files.
+            'shards': 4,
+            # Undelivered messages per channel before sends to it fail.
+            'capacity': 100,
+            'expiry': 60,
+            'group_expiry': 86400,
+        },
+    }
+
+# Live dashboard: 'embedded' runs one snapshot producer inside each ASGI process,
+# 'external' expects `manage.py run_dashboard_broadcaster` to be running against
+# a channel layer shared between processes. With the shared layer, embedded
+# producers in N workers would each publish every update to every dashboard.
+DASHBOARD_BROADCASTER = 'external' if os.environ.get('CHANNEL_LAYER_PATH') else 'embedded'
+# Updates are driven by model signals (main/signals.py); a full recompute only
+# runs on start and every DASHBOARD_CONSISTENCY_INTERVAL seconds.
+DASHBOARD_CONSISTENCY_INTERVAL = 300
+DASHBOARD_EVENT_DEBOUNCE = 0.25
 
 JAZZMIN_SETTINGS = {
     "site_title": "AI Solution Admin",
@@ -276,6 +437,16 @@ JAZZMIN_UI_TWEAKS = {
     }
 }
 
+# Seconds the row count behind page-number pagination is cached for.
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+
+# Admin analytics dashboard: 'live' queries the source tables on every load,
+# 'rollup' reads the charts from the StatRollup tables kept up to date by
+# `manage.py rollup_stats`. Either can be forced with ?source=live|rollup.
+ADMIN_DASHBOARD_SOURCE = 'live'
+# Seconds the dashboard aggregates are fresh for in the 'tiered' cache.
+ADMIN_DASHBOARD_CACHE_TIMEOUT = 60
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # Or your SMTP server
@@ -283,3 +454,26 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'your-email@gmail.com'
 EMAIL_HOST_PASSWORD = 'your-app-password'  # Use app password for Gmail
+DEFAULT_FROM_EMAIL = 'noreply@aisolution.com'
+EVENT_REGISTRATION_NOTIFY = ['admin@aisolution.com']
+
+# Transactional emails are written to the OutboxEmail table with the change
+# they report and sent by `manage.py send_outbox` (see main/outbox.py).
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 6,
+    'BACKOFF_BASE': 60,
+    'BACKOFF_MAX': 6 * 60 * 60,
+}
+
+# Newsletter campaigns are sent by `manage.py send_campaign <id>` (see
+# main/newsletter.py). RATE is messages per second, None for no limit. A run
+# owns its campaign for LEASE seconds past its last checkpoint; after a crash
+# the campaign can be resumed once that has run out.
+NEWSLETTER = {
+    'CONCURRENCY': 4,
+    'RATE': None,
+    'CHUNK_SIZE': 2000,
+    'CHECKPOINT_EVERY': 100,
+    'LEASE': 600,
+}
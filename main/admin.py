@@ -1,10 +1,12 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import (
     Service, BlogPost, Event, Testimonial, 
     TeamMember, Gallery, Contact, ContactMessage, 
     GalleryTag, BlogCategory, ServiceCategory, 
     Technology, FAQ, Portfolio, Newsletter, 
-    EventRegistration, BlogTag, Navigation
+    EventRegistration, BlogTag, Navigation, OutboxEmail,
+    NewsletterCampaign
 )
 
 @admin.register(ContactMessage)
@@ -37,6 +39,7 @@ class ServiceAdmin(admin.ModelAdmin):
 @admin.register(BlogPost)
 class BlogPostAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'published_date', 'is_published', 'read_time')
+    list_select_related = ('author',)
     list_filter = ('is_published', 'categories', 'author')
     search_fields = ('title', 'content')
     date_hierarchy = 'published_date'
@@ -44,7 +47,7 @@ class BlogPostAdmin(admin.ModelAdmin):
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('title', 'date', 'location', 'is_upcoming', 'event_type')
+    list_display = ('title', 'date', 'location', 'is_upcoming', 'event_type', 'seats_taken', 'max_participants')
     list_filter = ('is_upcoming', 'event_type', 'date')
     search_fields = ('title', 'description', 'location')
     date_hierarchy = 'date'
@@ -74,6 +77,7 @@ class GalleryAdmin(admin.ModelAdmin):
 @admin.register(Navigation)
 class NavigationAdmin(admin.ModelAdmin):
     list_display = ('title', 'url', 'order', 'is_active', 'parent')
+    list_select_related = ('parent',)
     list_filter = ('is_active',)
     search_fields = ('title', 'url')
     ordering = ('order',)
@@ -130,6 +134,49 @@ class NewsletterAdmin(admin.ModelAdmin):
 @admin.register(EventRegistration)
 class EventRegistrationAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'event', 'registration_date', 'status')
+    list_select_related = ('event',)
     list_filter = ('status', 'registration_date', 'event')
     search_fields = ('name', 'email', 'phone')
     date_hierarchy = 'registration_date'
+    # Status changes go through the actions, which keep Event.seats_taken in step.
+    readonly_fields = ('status',)
+    actions = ['confirm_registrations', 'cancel_registrations']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        # The seat belongs to the event it was taken from; moving a guest
+        # means cancelling here and registering them for the other event.
+        return (*self.readonly_fields, 'event')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return super().save_model(request, obj, form, change)
+        with transaction.atomic():
+            # Staff registrations queue like anyone else's once the event is full.
+            obj.status = 'pending' if obj.event.take_seat() else 'waitlisted'
+            super().save_model(request, obj, form, change)
+
+    @admin.action(description='Confirm selected registrations')
+    def confirm_registrations(self, request, queryset):
+        queryset.filter(status='pending').update(status='confirmed')
+
+    @admin.action(description='Cancel selected registrations')
+    def cancel_registrations(self, request, queryset):
+        for registration in queryset.select_related('event'):
+            registration.cancel()
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'sent_count', 'failed_count', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('status', 'last_subscriber_id', 'sent_count', 'failed_count', 'started_at', 'finished_at')
@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
 from django.db.models import Count, Sum, Avg
 from django.db.models.functions import TruncMonth, TruncDay, ExtractHour
 from django.shortcuts import render
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
+from . import rollups
 from .models import ContactMessage, BlogPost, Service, Event, EventRegistration
 
 def datetime_handler(obj):
@@ -12,31 +15,19 @@ def datetime_handler(obj):
         return obj.isoformat()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-@staff_member_required
-def admin_dashboard(request):
-    # Time ranges
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=30)
-    today = timezone.now().date()
-    yesterday = today - timedelta(days=1)
+def live_message_stats(today, yesterday):
+    """Message and registration statistics computed from the source tables."""
+    today_messages = ContactMessage.objects.filter(created_at__date=today).count()
+    return {
+        'stats_source': 'live',
 
-    # Basic Analytics
-    message_growth = (
-        ContactMessage.objects.filter(created_at__date=today).count() -
-        ContactMessage.objects.filter(created_at__date=yesterday).count()
-    )
-
-    context = {
         # Today's Stats
-        'today_messages': ContactMessage.objects.filter(created_at__date=today).count(),
-        'today_events': Event.objects.filter(date__date=today).count(),
+        'today_messages': today_messages,
         'today_registrations': EventRegistration.objects.filter(registration_date__date=today).count(),
-        'today_blogs': BlogPost.objects.filter(published_date__date=today).count(),
 
         # Growth (compared to yesterday)
-        'message_growth': message_growth,
-        'message_growth_abs': abs(message_growth),
-        
+        'message_growth': today_messages - ContactMessage.objects.filter(created_at__date=yesterday).count(),
+
         # Monthly Trends
         'messages_by_month': json.dumps(
             list(ContactMessage.objects.annotate(
@@ -57,23 +48,6 @@ def admin_dashboard(request):
             default=datetime_handler
         ),
 
-        # Category Distribution
-        'blog_categories': json.dumps(
-            list(BlogPost.objects.values('categories__name')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:10]),
-            default=datetime_handler
-        ),
-
-        # Service Performance
-        'service_stats': json.dumps(
-            list(Service.objects.values('category__name')
-            .annotate(
-                count=Count('id'),
-            ).order_by('-count')[:10]),
-            default=datetime_handler
-        ),
-
         # Event Analytics
         'event_stats': json.dumps(
             list(Event.objects.annotate(
@@ -91,12 +65,80 @@ def admin_dashboard(request):
             default=datetime_handler
         ),
 
-        # Total Counts
         'total_messages': ContactMessage.objects.count(),
+        'total_registrations': EventRegistration.objects.count(),
+    }
+
+def rollup_message_stats(today, yesterday):
+    """
+    The same statistics read from the StatRollup tables, so the cost grows with
+    the number of days rather than the number of rows.
+    """
+    today_messages = rollups.count_on('contactmessage', today)
+    return {
+        'stats_source': 'rollup',
+        'today_messages': today_messages,
+        'today_registrations': rollups.count_on('eventregistration', today),
+        'message_growth': today_messages - rollups.count_on('contactmessage', yesterday),
+        'messages_by_month': json.dumps(rollups.counts_by_month('contactmessage'), default=datetime_handler),
+        'messages_by_hour': json.dumps(rollups.counts_by_hour_of_day('contactmessage'), default=datetime_handler),
+        'event_stats': json.dumps(rollups.registrations_by_event(), default=datetime_handler),
+        'geo_distribution': json.dumps(rollups.registrations_by_location(), default=datetime_handler),
+        'total_messages': rollups.total('contactmessage'),
+        'total_registrations': rollups.total('eventregistration'),
+    }
+
+def dashboard_aggregates(source, today, yesterday):
+    stats = rollup_message_stats(today, yesterday) if source == 'rollup' else live_message_stats(today, yesterday)
+    return {
+        **stats,
+        'message_growth_abs': abs(stats['message_growth']),
+        'today_events': Event.objects.filter(date__date=today).count(),
+        'today_blogs': BlogPost.objects.filter(published_date__date=today).count(),
+
+        # Category Distribution
+        'blog_categories': json.dumps(
+            list(BlogPost.objects.values('categories__name')
+            .annotate(count=Count('id'))
+            .order_by('-count')[:10]),
+            default=datetime_handler
+        ),
+
+        # Service Performance
+        'service_stats': json.dumps(
+            list(Service.objects.values('category__name')
+            .annotate(
+                count=Count('id'),
+            ).order_by('-count')[:10]),
+            default=datetime_handler
+        ),
+
+        # Total Counts
         'total_blogs': BlogPost.objects.count(),
         'total_services': Service.objects.count(),
         'total_events': Event.objects.count(),
-        'total_registrations': EventRegistration.objects.count(),
+    }
+
+@staff_member_required
+def admin_dashboard(request):
+    today = timezone.now().date()
+    yesterday = today - timedelta(days=1)
+    source = request.GET.get('source', getattr(settings, 'ADMIN_DASHBOARD_SOURCE', 'live'))
+    if source != 'rollup':
+        source = 'live'
+
+    # Recomputed by one request at a time; the others meanwhile get the
+    # previous figures, which may be a few minutes old.
+    cache = caches['tiered']
+    aggregates = cache.get_or_compute(
+        f'admin-dashboard:{source}:{today.isoformat()}',
+        lambda: dashboard_aggregates(source, today, yesterday),
+        timeout=getattr(settings, 'ADMIN_DASHBOARD_CACHE_TIMEOUT', 60),
+    )
+
+    context = {
+        **aggregates,
+        'cache_stats': cache.stats(),
 
         # Jazzmin Integration
         'title': 'Analytics Dashboard',
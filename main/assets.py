@@ -0,0 +1,237 @@
+"""
+Serves collected static files with the precompressed sibling the client
+accepts (see main.storage) and far-future caching for content-hashed names,
+and uploaded media with byte ranges, strong ETags and conditional GET, or
+through the front proxy with X-Accel-Redirect/X-Sendfile.
+"""
+import mimetypes
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+# Content-Encoding -> file suffix, in order of preference.
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into {encoding: q}."""
+    accepted = {}
+    for part in header.split(','):
+        encoding, _, params = part.strip().partition(';')
+        if not encoding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[encoding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header, available):
+    """The preferred encoding among ``available`` that the client accepts, or None."""
+    accepted = accepted_encodings(header)
+    for encoding, _ in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+@lru_cache(maxsize=1)
+def hashed_names():
+    """Names written by the manifest storage; safe to cache forever."""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+@require_safe
+def serve_static(request, path):
+    # Paths escaping the root raise SuspiciousFileOperation (a 400).
+    fullpath = safe_join(settings.STATIC_ROOT, path)
+    if not os.path.isfile(fullpath):
+        raise Http404('Static file not found.')
+
+    available = {encoding: fullpath + suffix for encoding, suffix in ENCODINGS
+                 if os.path.isfile(fullpath + suffix)}
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), available)
+    served = available[encoding] if encoding else fullpath
+
+    stat = os.stat(served)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type, _ = mimetypes.guess_type(fullpath)
+        response = FileResponse(open(served, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    if available:
+        response['Vary'] = 'Accept-Encoding'
+    if path.replace(os.sep, '/') in hashed_names():
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = f'public, max-age={getattr(settings, "STATIC_MAX_AGE", 300)}'
+    return response
+
+
+MEDIA_SERVING_DEFAULTS = {
+    # 'django' streams the file from this view (os.sendfile under servers with
+    # wsgi.file_wrapper support), 'x-accel-redirect' hands it to nginx and
+    # 'x-sendfile' to Apache/lighttpd.
+    'MODE': 'django',
+    # Internal location the front proxy maps to MEDIA_ROOT, for X-Accel-Redirect.
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+    'MAX_AGE': 86400,
+}
+
+MEDIA_BLOCK_SIZE = 64 * 1024
+
+
+def media_config():
+    return {**MEDIA_SERVING_DEFAULTS, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive (start, end) byte range requested by a Range header,
+    or None to serve the whole file (no header, a syntax error or several
+    ranges, which are not supported).
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    specs = header[len('bytes='):].split(',')
+    if len(specs) != 1:
+        return None
+    first, _, last = specs[0].strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def file_etag(stat):
+    """
+    ETag built from the file's inode, mtime and size, like nginx and Apache
+    do, so serving a large file never has to read it just to validate it.
+    Uploads are written to a new file rather than in place, so any change of
+    content changes at least one of the three.
+    """
+    return f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def if_range_passes(header, etag, mtime):
+    """Whether a Range may be honoured given the request's If-Range validator."""
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        # If-Range only matches strong validators.
+        return header == etag
+    return parse_http_date_safe(header) == int(mtime)
+
+
+class RangeFile:
+    """
+    File-like view of ``length`` bytes of ``fh`` from ``start``. It exposes
+    fileno() with the file positioned at ``start``, so servers using
+    os.sendfile send exactly Content-Length bytes from there.
+    """
+
+    def __init__(self, fh, start, length):
+        self.fh = fh
+        self.name = fh.name
+        self.remaining = length
+        fh.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+@require_safe
+def serve_media(request, path):
+    # Paths escaping the root raise SuspiciousFileOperation (a 400).
+    fullpath = safe_join(settings.MEDIA_ROOT, path)
+    if not os.path.isfile(fullpath):
+        raise Http404('Media file not found.')
+
+    config = media_config()
+    content_type, _ = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    if config['MODE'] in ('x-accel-redirect', 'x-sendfile'):
+        # The proxy handles ranges and validators itself.
+        response = HttpResponse(content_type=content_type)
+        if config['MODE'] == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = config['ACCEL_REDIRECT_PREFIX'].rstrip('/') + '/' + path.lstrip('/')
+        else:
+            response['X-Sendfile'] = fullpath
+        return response
+
+    stat = os.stat(fullpath)
+    etag = file_etag(stat)
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(stat.st_mtime)
+    headers['Cache-Control'] = f"public, max-age={config['MAX_AGE']}"
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime), response=headers)
+    if conditional is not headers:
+        return conditional
+
+    size = stat.st_size
+    byte_range = None
+    if if_range_passes(request.headers.get('If-Range'), etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    fh = open(fullpath, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(fh, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = FileResponse(fh, content_type=content_type)
+    response.block_size = MEDIA_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+        response[header] = headers[header]
+    return response
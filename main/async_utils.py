@@ -0,0 +1,33 @@
+"""
+Helpers for the async variants of the public pages.
+
+Their querysets are evaluated with the async ORM and gathered, and everything
+base.html would otherwise load lazily is fetched up front, so the template can
+be rendered on the event loop without touching the database.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+
+from .navigation import aget_navigation_tree
+
+
+async def _evaluate(queryset):
+    return [obj async for obj in queryset]
+
+
+async def gather_querysets(querysets):
+    """Evaluate a {name: queryset} dict concurrently into {name: list}."""
+    results = await asyncio.gather(*(_evaluate(queryset) for queryset in querysets.values()))
+    return dict(zip(querysets, results))
+
+
+async def prepare_base_template(request):
+    """Load what base.html reads lazily: the navigation tree and the flash messages."""
+    await aget_navigation_tree()
+    # Messages only hit the database through the session, which anonymous
+    # visitors without a session cookie do not have.
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        await sync_to_async(len)(get_messages(request))
@@ -0,0 +1,230 @@
+"""
+Synthetic data seeding and latency measurement for `manage.py bench`.
+"""
+import asyncio
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    BlogCategory, BlogPost, BlogTag, ContactMessage, Event, EventRegistration, FAQ, Gallery,
+    GalleryTag, Portfolio, Service, ServiceCategory, TeamMember, Technology, Testimonial
+)
+
+SCALES = {
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+}
+
+BATCH_SIZE = 5000
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk inserts set auto_now/auto_now_add fields so rows spread over time."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _bulk_insert(model, rows):
+    """Insert objects from the ``rows`` generator in batches and return their ids in order."""
+    batch = []
+    for obj in rows:
+        batch.append(obj)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+    return list(model.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def _bulk_link(through, rows):
+    batch = []
+    for link in rows:
+        batch.append(through(**link))
+        if len(batch) >= BATCH_SIZE:
+            through.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        through.objects.bulk_create(batch)
+
+
+def seed(rows, seed_value=0, log=print):
+    """
+    Fill an empty database with ``rows`` contact messages, blog posts, event
+    registrations and gallery items, plus the small reference tables the
+    pages need. Deterministic for a given ``seed_value``.
+    """
+    rng = random.Random(seed_value)
+    now = timezone.now()
+
+    def spread(i, total, days=730):
+        return now - timedelta(minutes=(total - i) * days * 24 * 60 // max(total, 1))
+
+    author = User.objects.create_user('bench-author', 'author@example.com', 'bench', is_staff=True)
+
+    service_categories = ServiceCategory.objects.bulk_create(
+        ServiceCategory(name=f'Category {i}', icon='fas fa-robot', order=i) for i in range(5)
+    )
+    Service.objects.bulk_create(
+        Service(title=f'Service {i}', slug=f'service-{i}', category=service_categories[i % 5],
+                description='Service description ' * 20, short_description='Short description',
+                features=['Fast', 'Accurate'])
+        for i in range(20)
+    )
+    Technology.objects.bulk_create(Technology(name=f'Tech {i}', logo='technologies/bench.png', order=i)
+                                   for i in range(12))
+    FAQ.objects.bulk_create(FAQ(question=f'Question {i}?', answer='Answer', category='service', order=i)
+                            for i in range(10))
+    TeamMember.objects.bulk_create(TeamMember(name=f'Member {i}', position='Engineer', bio='Bio', order=i)
+                                   for i in range(10))
+    Portfolio.objects.bulk_create(Portfolio(title=f'Project {i}', description='Project', features=['AI'],
+                                            order=i) for i in range(10))
+    Testimonial.objects.bulk_create(
+        Testimonial(client_name=f'Client {i}', company='ACME', content='Great work',
+                    rating=rng.randint(1, 5), is_featured=i < 5, display_order=i)
+        for i in range(50)
+    )
+    blog_categories = BlogCategory.objects.bulk_create(BlogCategory(name=f'Topic {i}', slug=f'topic-{i}')
+                                                       for i in range(10))
+    blog_tags = BlogTag.objects.bulk_create(BlogTag(name=f'tag {i}', slug=f'tag-{i}') for i in range(20))
+    gallery_tags = GalleryTag.objects.bulk_create(GalleryTag(name=f'tag {i}', slug=f'tag-{i}')
+                                                  for i in range(20))
+
+    log(f'Seeding {rows} contact messages')
+    with explicit_timestamps(ContactMessage._meta.get_field('created_at'),
+                             ContactMessage._meta.get_field('updated_at')):
+        _bulk_insert(ContactMessage, (
+            ContactMessage(name=f'Client {i}', email=f'client{i % (rows // 3 + 1)}@example.com',
+                           phone='0123456789', company_name=f'Company {i % 500}', job_title='CTO',
+                           subject=f'Enquiry {i}', message='I would like to know more. ' * 10,
+                           created_at=spread(i, rows), updated_at=spread(i, rows))
+            for i in range(rows)
+        ))
+
+    log(f'Seeding {rows} blog posts')
+    words = ['machine', 'learning', 'prototype', 'virtual', 'assistant', 'cloud', 'vision', 'data']
+    with explicit_timestamps(BlogPost._meta.get_field('created_date'),
+                             BlogPost._meta.get_field('updated_date')):
+        post_ids = _bulk_insert(BlogPost, (
+            BlogPost(title=f'Post {i}: {rng.choice(words)} {rng.choice(words)}', author=author,
+                     content=' '.join(rng.choice(words) for _ in range(200)),
+                     meta_description='A post about AI', is_published=i % 10 != 0,
+                     read_time=rng.randint(2, 15), published_date=spread(i, rows),
+                     created_date=spread(i, rows), updated_date=spread(i, rows))
+            for i in range(rows)
+        ))
+    _bulk_link(BlogPost.categories.through, (
+        {'blogpost_id': post_id, 'blogcategory_id': blog_categories[post_id % 10].pk} for post_id in post_ids
+    ))
+    _bulk_link(BlogPost.tags.through, (
+        {'blogpost_id': post_id, 'blogtag_id': blog_tags[(post_id + offset) % 20].pk}
+        for post_id in post_ids for offset in (0, 7)
+    ))
+
+    events = max(rows // 100, 10)
+    log(f'Seeding {events} events and {rows} registrations')
+    event_ids = _bulk_insert(Event, (
+        Event(title=f'Event {i}', description='Event description', location=f'City {i % 25}',
+              date=now + timedelta(days=i - events // 2), is_upcoming=i >= events // 2,
+              event_type=('workshop', 'conference', 'webinar')[i % 3], max_participants=1000)
+        for i in range(events)
+    ))
+    with explicit_timestamps(EventRegistration._meta.get_field('registration_date')):
+        _bulk_insert(EventRegistration, (
+            EventRegistration(event_id=event_ids[i % events], name=f'Guest {i}', email=f'guest{i}@example.com',
+                              phone='0123456789', registration_date=spread(i, rows))
+            for i in range(rows)
+        ))
+
+    log(f'Seeding {rows} gallery items')
+    gallery_ids = _bulk_insert(Gallery, (
+        Gallery(image='gallery/bench.png', alt_text=f'Image {i}', description='Gallery image',
+                created_at=spread(i, rows))
+        for i in range(rows)
+    ))
+    _bulk_link(Gallery.tags.through, (
+        {'gallery_id': gallery_id, 'gallerytag_id': gallery_tags[(gallery_id + offset) % 20].pk}
+        for gallery_id in gallery_ids for offset in (0, 3)
+    ))
+
+    return author
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(durations, queries):
+    return {
+        'p50_ms': round(percentile(durations, 0.50), 3),
+        'p95_ms': round(percentile(durations, 0.95), 3),
+        'p99_ms': round(percentile(durations, 0.99), 3),
+        'mean_ms': round(sum(durations) / len(durations), 3),
+        'queries': queries,
+        'samples': len(durations),
+    }
+
+
+def measure(func, iterations, warmup=1):
+    """Time ``func`` and return its latency percentiles and query count."""
+    for _ in range(warmup):
+        func()
+    durations = []
+    queries = 0
+    result = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            result = func()
+            durations.append((time.perf_counter() - start) * 1000)
+        queries = max(queries, len(captured))
+    summary = summarize(durations, queries)
+    status = getattr(result, 'status_code', None)
+    if status is not None:
+        summary['status'] = status
+    return summary
+
+
+def measure_concurrent(fetch, concurrency, rounds, warmup=1):
+    """
+    Await ``concurrency`` calls of the async ``fetch`` at once, ``rounds``
+    times, and return the latency percentiles of the individual requests.
+    """
+    async def timed():
+        start = time.perf_counter()
+        response = await fetch()
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    async def run():
+        for _ in range(warmup):
+            await asyncio.gather(*(timed() for _ in range(concurrency)))
+        results = []
+        for _ in range(rounds):
+            results += await asyncio.gather(*(timed() for _ in range(concurrency)))
+        return results
+
+    results = asyncio.run(run())
+    # Queries run in the handler's worker threads and are not counted.
+    summary = summarize([duration for duration, _ in results], None)
+    summary['status'] = max(status for _, status in results)
+    summary['concurrency'] = concurrency
+    return summary
@@ -0,0 +1,353 @@
+"""
+A channel layer shared between processes on one host.
+
+InMemoryChannelLayer only reaches consumers in its own process, so it breaks
+as soon as more than one ASGI worker serves websockets (or the dashboard
+producer runs as `manage.py run_dashboard_broadcaster`). SQLiteChannelLayer
+keeps messages and group memberships in SQLite files that every process on
+the host opens:
+
+* Channels and groups are spread over SHARDS files by a hash of their name,
+  so writes to different groups and workers do not queue on one lock.
+* Each process polls once per POLL_INTERVAL for all of its process-specific
+  channels (the names new_channel() hands out share a per-process prefix) and
+  routes the messages to the waiting consumers, so the number of open
+  websockets does not multiply the queries.
+* A channel holding ``capacity`` undelivered messages raises ChannelFull on
+  send and is skipped by group_send; messages expire after ``expiry`` seconds
+  and group memberships after ``group_expiry``.
+
+Messages are pickled; the files must only be writable by the site's own user.
+"""
+import asyncio
+import hashlib
+import os
+import pickle
+import random
+import sqlite3
+import string
+import threading
+import time
+from collections import Counter, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    target TEXT NOT NULL,
+    expires REAL NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS message_channel_idx ON message (channel, id);
+CREATE INDEX IF NOT EXISTS message_target_idx ON message (target);
+CREATE TABLE IF NOT EXISTS group_member (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    joined REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+);
+"""
+
+# How often each process deletes expired messages and memberships.
+PURGE_INTERVAL = 30
+# Values bound per IN (...) list. SQLite refuses statements with more than
+# 32766 variables (999 before 3.32), and big groups would get there.
+MAX_VARIABLES = 500
+
+
+def _chunks(items, size=None):
+    size = size or MAX_VARIABLES
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ChannelBuffer:
+    """
+    Messages routed to one process-specific channel, as (expires, message)
+    pairs in arrival order, with an event that wakes its receivers.
+    """
+
+    def __init__(self):
+        self.messages = deque()
+        self.ready = asyncio.Event()
+
+    def __bool__(self):
+        return bool(self.messages)
+
+    def put(self, expires, message):
+        self.messages.append((expires, message))
+        self.ready.set()
+
+    async def get(self):
+        while not self.messages:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.messages.popleft()
+
+    def expire(self, now):
+        while self.messages and self.messages[0][0] <= now:
+            self.messages.popleft()
+
+    def clear(self):
+        self.messages.clear()
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path='channels', shards=4, expiry=60, group_expiry=86400,
+                 capacity=100, channel_capacity=None, poll_interval=0.05, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.paths = [f'{path}-{shard}.sqlite3' for shard in range(shards)]
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_prefix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._created = set()
+        self._last_purge = 0
+        # Receive side, bound to the event loop that first calls receive():
+        # (expires, message) pairs by channel, and receive() calls waiting on each.
+        self._loop = None
+        self._buffers = {}
+        self._receivers = Counter()
+        self._poller = None
+
+    # Storage
+
+    def _shard(self, name):
+        digest = hashlib.sha1(name.encode()).digest()
+        return int.from_bytes(digest[:4], 'big') % len(self.paths)
+
+    def _connect(self, shard):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get(shard)
+        if connection is None:
+            path = self.paths[shard]
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit; writes open their own BEGIN IMMEDIATE.
+            connection = sqlite3.connect(path, timeout=20, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Messages are short-lived; losing the last few on power loss is fine.
+            connection.execute('PRAGMA synchronous=NORMAL')
+            if shard not in self._created:
+                connection.executescript(SCHEMA)
+                self._created.add(shard)
+            connections[shard] = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _write(self, shard, work):
+        connection = self._connect(shard)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _run(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _store_key(self, channel):
+        """The name a process-specific channel's messages are stored under."""
+        return self.non_local_name(channel)
+
+    # Sending
+
+    def _send(self, channel, body):
+        now = time.time()
+        capacity = self.get_capacity(channel)
+
+        def insert(connection):
+            (count,) = connection.execute(
+                'SELECT COUNT(*) FROM message WHERE target = ? AND expires > ?', (channel, now)
+            ).fetchone()
+            if count >= capacity:
+                raise ChannelFull(channel)
+            connection.execute(
+                'INSERT INTO message (channel, target, expires, body) VALUES (?, ?, ?, ?)',
+                (self._store_key(channel), channel, now + self.expiry, body),
+            )
+
+        self._write(self._shard(self._store_key(channel)), insert)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        await self._run(self._send, channel, pickle.dumps(message))
+
+    # Receiving
+
+    def _pop(self, key, limit=None):
+        """Take the live messages stored under ``key``, oldest first."""
+        now = time.time()
+
+        def take(connection):
+            query = 'SELECT id, target, body FROM message WHERE channel = ? AND expires > ? ORDER BY id'
+            if limit:
+                query += f' LIMIT {int(limit)}'
+            rows = connection.execute(query, (key, now)).fetchall()
+            for ids in _chunks([row[0] for row in rows]):
+                connection.execute(f'DELETE FROM message WHERE id IN ({",".join("?" * len(ids))})', ids)
+            return rows
+
+        shard = self._shard(key)
+        # A cheap read first, so idle polls never take the write lock.
+        if not self._connect(shard).execute(
+            'SELECT 1 FROM message WHERE channel = ? AND expires > ? LIMIT 1', (key, now)
+        ).fetchone():
+            self._maybe_purge()
+            return []
+        return [(target, pickle.loads(body)) for _, target, body in self._write(shard, take)]
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        for shard in range(len(self.paths)):
+            self._write(shard, lambda connection: (
+                connection.execute('DELETE FROM message WHERE expires <= ?', (now,)),
+                connection.execute('DELETE FROM group_member WHERE joined <= ?', (now - self.group_expiry,)),
+            ))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if '!' not in channel:
+            # A normal channel may be read by any process; poll for it directly.
+            while True:
+                messages = await self._run(self._pop, channel, 1)
+                if messages:
+                    return messages[0][1]
+                await asyncio.sleep(self.poll_interval)
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._buffers, self._receivers, self._poller = loop, {}, Counter(), None
+        buffer = self._buffers.setdefault(channel, ChannelBuffer())
+        self._receivers[channel] += 1
+        if self._poller is None or self._poller.done():
+            self._poller = loop.create_task(self._poll(self.non_local_name(channel)))
+        try:
+            while True:
+                expires, message = await buffer.get()
+                if expires > time.time():
+                    return message
+        finally:
+            self._receivers[channel] -= 1
+            if not self._receivers[channel]:
+                del self._receivers[channel]
+                if not buffer and self._buffers.get(channel) is buffer:
+                    del self._buffers[channel]
+
+    async def _poll(self, key):
+        """Route this process's messages to its consumers while any are listening."""
+        while self._buffers:
+            for target, message in await self._run(self._pop, key):
+                self._buffers.setdefault(target, ChannelBuffer()).put(time.time() + self.expiry, message)
+            self._expire_buffers()
+            await asyncio.sleep(self.poll_interval)
+
+    def _expire_buffers(self):
+        """
+        Drop buffered messages nobody received within ``expiry``, and the
+        buffers of channels no one receives from any more (closed sockets).
+        """
+        now = time.time()
+        for channel, buffer in list(self._buffers.items()):
+            buffer.expire(now)
+            if not buffer and not self._receivers[channel]:
+                del self._buffers[channel]
+
+    async def new_channel(self, prefix='specific'):
+        token = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}.{self.client_prefix}!{token}'
+
+    # Groups
+
+    def _group_add(self, group, channel):
+        self._write(self._shard(group), lambda connection: connection.execute(
+            'INSERT OR REPLACE INTO group_member (grp, channel, joined) VALUES (?, ?, ?)',
+            (group, channel, time.time()),
+        ))
+
+    def _group_discard(self, group, channel):
+        self._write(self._shard(group), lambda connection: connection.execute(
+            'DELETE FROM group_member WHERE grp = ? AND channel = ?', (group, channel),
+        ))
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_discard, group, channel)
+
+    def _group_send(self, group, body):
+        now = time.time()
+        members = [channel for (channel,) in self._connect(self._shard(group)).execute(
+            'SELECT channel FROM group_member WHERE grp = ? AND joined > ?', (group, now - self.group_expiry)
+        )]
+        by_shard = {}
+        for channel in members:
+            by_shard.setdefault(self._shard(self._store_key(channel)), []).append(channel)
+
+        for shard, channels in by_shard.items():
+            def insert(connection, channels=channels):
+                queued = {}
+                # One fewer than the limit, leaving room for ``now``.
+                for chunk in _chunks(channels, MAX_VARIABLES - 1):
+                    queued.update(connection.execute(
+                        f'SELECT target, COUNT(*) FROM message WHERE target IN ({",".join("?" * len(chunk))}) '
+                        'AND expires > ? GROUP BY target', [*chunk, now],
+                    ))
+                # Full channels miss this message, as with every channel layer.
+                connection.executemany(
+                    'INSERT INTO message (channel, target, expires, body) VALUES (?, ?, ?, ?)',
+                    [(self._store_key(channel), channel, now + self.expiry, body) for channel in channels
+                     if queued.get(channel, 0) < self.get_capacity(channel)],
+                )
+
+            self._write(shard, insert)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_group_name(group)
+        await self._run(self._group_send, group, pickle.dumps(message))
+
+    # Flush extension
+
+    def _flush(self):
+        for shard in range(len(self.paths)):
+            self._write(shard, lambda connection: (
+                connection.execute('DELETE FROM message'),
+                connection.execute('DELETE FROM group_member'),
+            ))
+
+    async def flush(self):
+        await self._run(self._flush)
+        for buffer in self._buffers.values():
+            buffer.clear()
+
+    async def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
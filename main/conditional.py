@@ -0,0 +1,79 @@
+"""
+Conditional GET for the detail pages.
+
+Before the object is loaded and its template rendered, one query fetches the
+modification times of the object and of the related rows it displays. They
+give the Last-Modified header; the ETag additionally covers the version
+stamps (see main.page_cache) of related models without timestamps, such as
+categories and tags, so clients sending If-None-Match also see those change.
+A matching validator is answered with 304 straight away.
+"""
+import hashlib
+from datetime import datetime
+
+from django.db.models import F
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .page_cache import TEMPLATE_MODEL_LABELS, shared_model_versions, track_models
+
+
+class ConditionalDetailMixin:
+    """
+    DetailView mixin adding ETag and Last-Modified validators. Subclasses name
+    the values their page depends on in get_validator_annotations(); the
+    latest of the timestamps among them is the Last-Modified time and all of
+    them go into the ETag, along with the version stamps of ``etag_models``.
+    """
+    etag_models = ()
+    # Templates with a {% csrf_token %} form embed the visitor's token.
+    etag_varies_on_csrf = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        track_models(*cls.etag_models)
+
+    def get_validator_annotations(self):
+        return {'modified': F('updated_date')}
+
+    def get_validator_queryset(self):
+        queryset = self.get_queryset()
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        if pk is not None:
+            return queryset.filter(pk=pk)
+        return queryset.filter(**{self.get_slug_field(): self.kwargs.get(self.slug_url_kwarg)})
+
+    def get_validator_values(self):
+        """The annotated values for the requested object, or None if it does not exist."""
+        annotations = self.get_validator_annotations()
+        return self.get_validator_queryset().order_by().annotate(**annotations).values(*annotations).first()
+
+    def make_etag(self, values):
+        labels = sorted({*TEMPLATE_MODEL_LABELS, *(model._meta.label_lower for model in self.etag_models)})
+        # Shared stamps, so every worker gives an object the same ETag and
+        # sees a category renamed through any of them.
+        parts = [self.request.path, *(str(values[name]) for name in sorted(values)), *shared_model_versions(labels)]
+        if self.etag_varies_on_csrf:
+            parts.append(self.request.META.get('CSRF_COOKIE') or '')
+        return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        values = self.get_validator_values()
+        if values is None:
+            # Let get_object() raise the usual 404.
+            return super().get(request, *args, **kwargs)
+        timestamps = [value for value in values.values() if isinstance(value, datetime)]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        response = get_conditional_response(request, etag=self.make_etag(values), last_modified=last_modified)
+        if response is not None:
+            return response
+        response = super().get(request, *args, **kwargs)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+
+        def set_etag(response):
+            # After rendering, which may have issued the visitor's first CSRF cookie.
+            response['ETag'] = self.make_etag(values)
+
+        response.add_post_render_callback(set_etag)
+        return response
@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.middleware.csrf import get_token
+
+
+def csrf_cookie(request):
+    """
+    Issue the CSRF cookie on every page. The newsletter form in base.html reads
+    it from the cookie so that pages served by main.page_cache stay shareable.
+    """
+    get_token(request)
+    return {'csrf_cookie_name': settings.CSRF_COOKIE_NAME}
@@ -0,0 +1,457 @@
+import asyncio
+import copy
+import logging
+import math
+from datetime import datetime
+from decimal import Decimal
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Avg, Case, Count, Max, Q, Sum, When, Window
+from django.utils import timezone
+
+from .dashboard_protocol import diff
+from .db_router import primary_reads
+from .models import Event, Service, BlogPost, Testimonial, ContactMessage, EventRegistration
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_GROUP = 'dashboard'
+# Change events published by main.signals for the broadcaster to apply.
+DASHBOARD_EVENTS_GROUP = 'dashboard.events'
+
+# Published posts in the blog chart.
+RECENT_POSTS = 5
+# recent_activity holds the newest ACTIVITY_PER_TYPE rows of each type, and
+# the ACTIVITY_LIMIT newest of those.
+ACTIVITY_TYPES = ('Blog Post', 'Event', 'Testimonial')
+ACTIVITY_PER_TYPE = 3
+ACTIVITY_LIMIT = 5
+
+
+def _truncate(title, length=30):
+    return title[:length] + '...' if len(title) > length else title
+
+
+def get_quick_stats():
+    """
+    Counters for the stat cards, computed with one conditional aggregate per
+    table rather than one query per number.
+    """
+    contact = ContactMessage.objects.aggregate(
+        total_clients=Count('email', distinct=True),
+        companies=Count('company_name', distinct=True),
+        # values('company_name').distinct() used to count NULL as a company too
+        has_null_company=Max(Case(When(company_name__isnull=True, then=1), default=0)),
+    )
+
+    rating_buckets = {
+        'rating_1': Count('id', filter=Q(rating__lte=1)),
+        'rating_2': Count('id', filter=Q(rating__gt=1, rating__lte=2)),
+        'rating_3': Count('id', filter=Q(rating__gt=2, rating__lte=3)),
+        'rating_4': Count('id', filter=Q(rating__gt=3, rating__lte=4)),
+        'rating_5': Count('id', filter=Q(rating__gt=4)),
+    }
+    testimonials = Testimonial.objects.aggregate(
+        total_ratings=Count('id'),
+        avg_rating=Avg('rating'),
+        rating_sum=Sum('rating'),
+        **rating_buckets,
+    )
+
+    published = Q(is_published=True)
+    posts = BlogPost.objects.aggregate(
+        total_posts=Count('id', filter=published),
+        avg_read_time=Avg('read_time', filter=published),
+        read_time_sum=Sum('read_time', filter=published),
+        latest_published=Max('published_date', filter=published),
+    )
+
+    return {
+        'total_clients': contact['total_clients'],
+        'unique_companies': contact['companies'] + (contact['has_null_company'] or 0),
+        'total_ratings': testimonials['total_ratings'],
+        'avg_rating': round(float(testimonials['avg_rating'] or 0), 1),
+        'rating_distribution': [testimonials[bucket] for bucket in rating_buckets],
+        'total_posts': posts['total_posts'],
+        'avg_read_time': round(float(posts['avg_read_time'] or 0), 1),
+        'total_registrations': EventRegistration.objects.count(),
+        # Exact figures behind the rounded averages, for apply_event().
+        'totals': {
+            'rating_sum': testimonials['rating_sum'] or Decimal(0),
+            'read_time_sum': posts['read_time_sum'] or 0,
+            'latest_published': posts['latest_published'],
+        },
+    }
+
+
+def get_upcoming_events(now, limit=5):
+    """The next ``limit`` upcoming events plus the total number of them."""
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    events = list(
+        Event.objects.filter(date__gte=today, is_upcoming=True)
+        # The window count rides along with the sliced rows, saving a COUNT query.
+        .annotate(upcoming_total=Window(Count('id')))
+        .order_by('date')
+        .values('title', 'date', 'location', 'event_type', 'upcoming_total')[:limit]
+    )
+    total = events[0]['upcoming_total'] if events else 0
+    event_types = dict(Event.EVENT_TYPES)
+    return total, [
+        {
+            'title': event['title'],
+            'date': event['date'].strftime('%Y-%m-%d %H:%M'),
+            'location': event['location'],
+            'event_type': event_types.get(event['event_type'], event['event_type'])
+        }
+        for event in events
+    ]
+
+
+def _post_activity(post):
+    return {
+        'date': post['created_date'].strftime('%Y-%m-%d %H:%M'),
+        'type': 'Blog Post',
+        'description': post['title'],
+        'status': 'Published' if post['is_published'] else 'Draft',
+        'status_color': 'success' if post['is_published'] else 'warning'
+    }
+
+
+def _testimonial_activity(testimonial, now):
+    return {
+        'date': now.strftime('%Y-%m-%d %H:%M'),
+        'type': 'Testimonial',
+        'description': f"New review from {testimonial['client_name']}",
+        'status': f"{testimonial['rating']}★",
+        'status_color': 'warning'
+    }
+
+
+def get_recent_activity(now, limit=ACTIVITY_LIMIT):
+    activities = []
+
+    for post in BlogPost.objects.order_by('-created_date').values(
+        'title', 'created_date', 'is_published'
+    )[:ACTIVITY_PER_TYPE]:
+        activities.append(_post_activity(post))
+
+    for event in Event.objects.order_by('-date').values('title', 'date', 'is_upcoming')[:ACTIVITY_PER_TYPE]:
+        activities.append({
+            'date': event['date'].strftime('%Y-%m-%d %H:%M'),
+            'type': 'Event',
+            'description': event['title'],
+            'status': 'Upcoming' if event['is_upcoming'] else 'Past',
+            'status_color': 'primary' if event['is_upcoming'] else 'secondary'
+        })
+
+    # Testimonials have no timestamp of their own.
+    for testimonial in Testimonial.objects.order_by('-id').values('client_name', 'rating')[:ACTIVITY_PER_TYPE]:
+        activities.append(_testimonial_activity(testimonial, now))
+
+    # The dates share one format, so they sort correctly as strings.
+    activities.sort(key=lambda x: x['date'], reverse=True)
+    return activities[:limit]
+
+
+def get_dashboard_data():
+    return get_dashboard_state()[0]
+
+
+def get_dashboard_state():
+    """The dashboard data, plus the exact totals apply_event() updates it from."""
+    now = timezone.now()
+    stats = get_quick_stats()
+    upcoming_total, next_events = get_upcoming_events(now)
+
+    services = list(Service.objects.values('category__name').annotate(
+        service_count=Count('id')
+    ).order_by('-service_count'))
+
+    recent_posts = list(BlogPost.objects.filter(
+        is_published=True
+    ).order_by('-published_date').values('title', 'read_time')[:RECENT_POSTS])
+
+    data = {
+        'total_clients': stats['total_clients'],
+        'upcoming_events': upcoming_total,
+        'total_posts': stats['total_posts'],
+        'avg_rating': stats['avg_rating'],
+
+        'stats_details': {
+            'total_ratings': stats['total_ratings'],
+            'avg_read_time': stats['avg_read_time'],
+            'next_events': next_events,
+            'unique_companies': stats['unique_companies'],
+            'total_registrations': stats['total_registrations']
+        },
+
+        'services_data': {
+            'labels': [service['category__name'] or 'Uncategorized' for service in services],
+            'values': [service['service_count'] for service in services]
+        },
+
+        'blog_data': {
+            'labels': [_truncate(post['title']) for post in recent_posts],
+            'values': [post['read_time'] for post in recent_posts]
+        },
+
+        'ratings_data': {
+            'values': stats['rating_distribution']
+        },
+
+        'recent_activity': get_recent_activity(now)
+    }
+
+    # The date every testimonial in recent_activity carries.
+    totals = {**stats['totals'], 'testimonial_date': now.strftime('%Y-%m-%d %H:%M')}
+    return data, totals
+
+
+def contact_novelty(pk):
+    """
+    Whether the contact message ``pk`` brings a new client and a new company:
+    true unless an earlier message has the same email or company. None once
+    the message is gone.
+    """
+    # From the primary, where the message was just written.
+    with primary_reads():
+        message = ContactMessage.objects.filter(pk=pk).values('email', 'company_name').first()
+        if message is None:
+            return None
+        earlier = ContactMessage.objects.filter(pk__lt=pk)
+        return {
+            'new_client': not earlier.filter(email=message['email']).exists(),
+            # The NULL company counts as one company too.
+            'new_company': not earlier.filter(company_name=message['company_name']).exists()
+            if message['company_name'] is not None
+            else not earlier.filter(company_name__isnull=True).exists(),
+        }
+
+
+def _rating_bucket(rating):
+    """Index into ratings_data of the bucket get_quick_stats() counts ``rating`` in."""
+    return min(max(math.ceil(rating) - 1, 0), 4)
+
+
+def _add_activity(data, totals, entry, now):
+    """
+    Put ``entry``, the newest row of its type, into recent_activity as
+    get_recent_activity() would. False if the result depends on activities
+    the snapshot has already cut off.
+    """
+    activities = data['recent_activity']
+    full = len(activities) >= ACTIVITY_LIMIT
+    by_type = {kind: [activity for activity in activities if activity['type'] == kind]
+               for kind in ACTIVITY_TYPES}
+    date = now.strftime('%Y-%m-%d %H:%M')
+    if totals['testimonial_date'] != date:
+        # A recompute dates every testimonial now, which can lift one that was cut off.
+        testimonials = data['stats_details']['total_ratings'] - (entry['type'] == 'Testimonial')
+        if full and len(by_type['Testimonial']) < min(ACTIVITY_PER_TYPE, testimonials):
+            return False
+        for activity in by_type['Testimonial']:
+            activity['date'] = date
+        totals['testimonial_date'] = date
+    same_type = [entry, *by_type[entry['type']]]
+    if len(same_type) > ACTIVITY_PER_TYPE:
+        same_type.pop()
+        if full:
+            # The oldest of its type drops out; what would take its place was cut off.
+            return False
+    by_type[entry['type']] = same_type
+    # Same order as get_recent_activity(): by type, then newest date first.
+    merged = [activity for kind in ACTIVITY_TYPES for activity in by_type[kind]]
+    merged.sort(key=lambda activity: activity['date'], reverse=True)
+    data['recent_activity'] = merged[:ACTIVITY_LIMIT]
+    return True
+
+
+def apply_event(data, totals, event, now=None):
+    """
+    Apply a change event from main.signals to ``data`` and ``totals`` (from
+    get_dashboard_state()) in place. Returns False when the change cannot be
+    expressed as an increment and the snapshot has to be recomputed instead;
+    the arguments may then be half updated.
+    """
+    model, action = event['model'], event['action']
+    if model == 'eventregistration' and action in ('created', 'deleted'):
+        data['stats_details']['total_registrations'] += 1 if action == 'created' else -1
+        return True
+    if action != 'created' or model not in ('contactmessage', 'testimonial', 'blogpost'):
+        return False
+    now = now or timezone.now()
+    stats = data['stats_details']
+
+    if model == 'contactmessage':
+        if 'new_client' not in event:
+            return False
+        data['total_clients'] += event['new_client']
+        stats['unique_companies'] += event['new_company']
+        return True
+
+    if model == 'testimonial':
+        rating = Decimal(event['rating'])
+        stats['total_ratings'] += 1
+        totals['rating_sum'] += rating
+        data['avg_rating'] = round(float(totals['rating_sum'] / stats['total_ratings']), 1)
+        data['ratings_data']['values'][_rating_bucket(rating)] += 1
+        return _add_activity(data, totals, _testimonial_activity(event, now), now)
+
+    # A blog post.
+    if event['is_published']:
+        published = datetime.fromisoformat(event['published_date'])
+        latest = totals['latest_published']
+        if latest is not None and published < latest:
+            # Somewhere inside blog_data, which does not keep the dates.
+            return False
+        totals['latest_published'] = published
+        data['total_posts'] += 1
+        totals['read_time_sum'] += event['read_time']
+        stats['avg_read_time'] = round(float(totals['read_time_sum'] / data['total_posts']), 1)
+        blog = data['blog_data']
+        blog['labels'] = [_truncate(event['title']), *blog['labels']][:RECENT_POSTS]
+        blog['values'] = [event['read_time'], *blog['values']][:RECENT_POSTS]
+    post = {**event, 'created_date': datetime.fromisoformat(event['created_date'])}
+    return _add_activity(data, totals, _post_activity(post), now)
+
+
+class DashboardBroadcaster:
+    """
+    Keeps one dashboard snapshot per process and fans changes out to every
+    socket in the dashboard group, so database load does not grow with the
+    number of open dashboards.
+
+    The snapshot is computed in full on start and then only updated from the
+    change events published by main.signals, with a full recompute every
+    consistency interval to catch anything the events missed.
+    """
+
+    def __init__(self, interval=None, debounce=None):
+        self.interval = interval
+        self.debounce = debounce
+        self.subscribers = 0
+        self.latest = None
+        self.totals = None
+        self.seq = 0
+        self._task = None
+        self._refresh = None
+        self._dirty = False
+
+    def get_interval(self):
+        return self.interval or getattr(settings, 'DASHBOARD_CONSISTENCY_INTERVAL', 300)
+
+    def get_debounce(self):
+        if self.debounce is not None:
+            return self.debounce
+        return getattr(settings, 'DASHBOARD_EVENT_DEBOUNCE', 0.25)
+
+    def subscribe(self):
+        self.subscribers += 1
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self.run())
+
+    def unsubscribe(self):
+        self.subscribers = max(self.subscribers - 1, 0)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.latest = None
+            self.totals = None
+
+    async def publish(self, data):
+        ops = None
+        if self.latest is not None:
+            ops = diff(self.latest, data)
+            if not ops:
+                return
+        self.latest = data
+        self.seq += 1
+        # Diffs are computed once here rather than in every consumer. The full
+        # data rides along for sockets that missed a step and need a snapshot.
+        await get_channel_layer().group_send(DASHBOARD_GROUP, {
+            'type': 'dashboard.update',
+            'seq': self.seq,
+            'ops': ops,
+            'data': data,
+        })
+
+    async def refresh(self):
+        data, totals = await database_sync_to_async(get_dashboard_state)()
+        self.totals = totals
+        await self.publish(data)
+
+    def schedule_refresh(self, delay=None):
+        if self._refresh is not None and not self._refresh.done():
+            # Changes that land while a recompute is already querying may not be
+            # in its results, so make it go round once more.
+            self._dirty = True
+            return
+        self._refresh = asyncio.create_task(self._run_refresh(
+            self.get_debounce() if delay is None else delay
+        ))
+
+    async def _run_refresh(self, delay):
+        # Sleeping first coalesces bursts of events into one recompute.
+        await asyncio.sleep(delay)
+        while True:
+            self._dirty = False
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('Error while refreshing dashboard data')
+            if not self._dirty:
+                return
+
+    async def handle_event(self, event):
+        if self.latest is None or self._refresh is not None and not self._refresh.done():
+            self.schedule_refresh()
+            return
+        if event['model'] == 'contactmessage' and event['action'] == 'created':
+            # Worked out here rather than in the saving request, so sites
+            # without an open dashboard pay nothing for it.
+            novelty = await database_sync_to_async(contact_novelty)(event['pk'])
+            event = {**event, **(novelty or {})}
+        data, totals = copy.deepcopy((self.latest, self.totals))
+        if apply_event(data, totals, event):
+            self.totals = totals
+            await self.publish(data)
+        else:
+            self.schedule_refresh()
+
+    async def check_consistency(self, channel):
+        channel_layer = get_channel_layer()
+        while True:
+            # Re-joining keeps the membership from hitting the layer's group expiry.
+            await channel_layer.group_add(DASHBOARD_EVENTS_GROUP, channel)
+            self.schedule_refresh(delay=0)
+            await asyncio.sleep(self.get_interval())
+
+    async def run(self):
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(DASHBOARD_EVENTS_GROUP, channel)
+        consistency = asyncio.create_task(self.check_consistency(channel))
+        try:
+            while True:
+                event = await channel_layer.receive(channel)
+                try:
+                    await self.handle_event(event)
+                except Exception:
+                    logger.exception('Error while applying dashboard event')
+        finally:
+            consistency.cancel()
+            if self._refresh is not None:
+                self._refresh.cancel()
+            await channel_layer.group_discard(DASHBOARD_EVENTS_GROUP, channel)
+
+
+# One producer per process. Set DASHBOARD_BROADCASTER = 'external' and run
+# `manage.py run_dashboard_broadcaster` to have a single producer per deployment.
+broadcaster = DashboardBroadcaster()
+
+
+def uses_embedded_broadcaster():
+    return getattr(settings, 'DASHBOARD_BROADCASTER', 'embedded') == 'embedded'
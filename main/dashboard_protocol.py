@@ -0,0 +1,81 @@
+"""
+Wire protocol for the live dashboard.
+
+Clients opt in by offering one of the SUBPROTOCOLS during the WebSocket
+handshake. The first message is always a full snapshot; after that only
+JSON-patch style operations for the keys that changed are sent, and ticks
+without changes send nothing. Clients that offer no subprotocol keep
+receiving the bare dashboard payload, but only when it changes.
+
+    {"v": 1, "type": "snapshot", "seq": 4, "data": {...}}
+    {"v": 1, "type": "patch", "seq": 5, "ops": [{"op": "replace", "path": "/total_posts", "value": 12}]}
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, only needed for the binary encoding
+    msgpack = None
+
+PROTOCOL_VERSION = 1
+
+SUBPROTOCOL_JSON = f'dashboard.v{PROTOCOL_VERSION}.json'
+SUBPROTOCOL_MSGPACK = f'dashboard.v{PROTOCOL_VERSION}.msgpack'
+
+
+def available_subprotocols():
+    if msgpack is None:
+        return [SUBPROTOCOL_JSON]
+    return [SUBPROTOCOL_MSGPACK, SUBPROTOCOL_JSON]
+
+
+def negotiate(offered):
+    """Pick the subprotocol to accept, or None for legacy clients."""
+    supported = available_subprotocols()
+    # Honour the client's order of preference.
+    for subprotocol in offered or []:
+        if subprotocol in supported:
+            return subprotocol
+    return None
+
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def diff(old, new, path=''):
+    """
+    Return the patch operations that turn ``old`` into ``new``. Dicts are
+    compared key by key; any other value (lists included) is replaced whole.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        if old == new:
+            return []
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    ops = []
+    for key in old:
+        if key not in new:
+            ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+    for key, value in new.items():
+        child = f'{path}/{_escape(key)}'
+        if key not in old:
+            ops.append({'op': 'add', 'path': child, 'value': value})
+        else:
+            ops.extend(diff(old[key], value, child))
+    return ops
+
+
+def snapshot_message(data, seq):
+    return {'v': PROTOCOL_VERSION, 'type': 'snapshot', 'seq': seq, 'data': data}
+
+
+def patch_message(ops, seq):
+    return {'v': PROTOCOL_VERSION, 'type': 'patch', 'seq': seq, 'ops': ops}
+
+
+def encode(message, subprotocol):
+    """Return the ``send()`` keyword arguments for ``message``."""
+    if subprotocol == SUBPROTOCOL_MSGPACK:
+        return {'bytes_data': msgpack.packb(message, use_bin_type=True)}
+    return {'text_data': json.dumps(message, separators=(',', ':'))}
@@ -0,0 +1,104 @@
+"""
+Read replicas.
+
+ReplicaRouter sends reads to the aliases in READ_REPLICAS['ALIASES'] and
+writes to the primary ('default'). Reads stay on the primary inside a
+transaction on it, for the rest of a request once it has written, and, through
+a cookie set by PrimaryPinMiddleware, for STICKY_SECONDS after a client's
+write, so people see their own changes while the replicas catch up.
+
+For a local setup the replica is a copy of the primary SQLite file refreshed
+by `manage.py sync_replicas` (see sync_sqlite_replica()).
+"""
+import random
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_REPLICAS_DEFAULTS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 10,
+    'COOKIE_NAME': 'db_primary',
+}
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+# Per-request state set up by PrimaryPinMiddleware: {'pinned': bool, 'wrote': bool}.
+_request_state = ContextVar('main_db_request_state', default=None)
+
+
+def get_config():
+    return {**READ_REPLICAS_DEFAULTS, **getattr(settings, 'READ_REPLICAS', {})}
+
+
+def start_request(pinned):
+    """Begin routing for a request; returns the token for end_request()."""
+    return _request_state.set({'pinned': pinned, 'wrote': False})
+
+
+def end_request(token):
+    """Finish routing for a request; returns whether it wrote to the primary."""
+    state = _request_state.get()
+    _request_state.reset(token)
+    return bool(state and state['wrote'])
+
+
+@contextmanager
+def primary_reads():
+    """
+    Send reads inside the block to the primary. For results that are cached
+    past the replicas' lag: filled from a replica just after a write, they
+    would be stored under the new version stamp and stay stale until the next.
+    """
+    outer = _request_state.get()
+    state = {'pinned': True, 'wrote': False}
+    token = _request_state.set(state)
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+        if outer is not None and state['wrote']:
+            outer['wrote'] = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_config()['ALIASES']
+        if not replicas or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        state = _request_state.get()
+        if state and (state['pinned'] or state['wrote']):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema along with the data.
+        return db == PRIMARY
+
+
+def sync_sqlite_replica(path):
+    """Copy the primary SQLite database to ``path`` with the online backup API."""
+    primary = connections[PRIMARY]
+    if primary.vendor != 'sqlite':
+        raise ValueError('Only a SQLite primary can be synced to a replica file')
+    primary.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        # One consistent snapshot of the primary; readers of the replica keep
+        # their own snapshot until the copy commits.
+        primary.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,185 @@
+"""
+Resized WebP/JPEG variants of uploaded images.
+
+Variants are written next to the media tree under ``variants/`` at the
+widths in IMAGE_VARIANT_WIDTHS and recorded as ImageVariant rows. They are
+generated off the request path by `manage.py generate_image_variants`, which
+also removes the variants of replaced and deleted images; the
+`responsive_image` template tag turns them into ``srcset``/``width``/``height``
+attributes.
+"""
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import (
+    BlogPost, Event, EventPhoto, Gallery, ImageVariant, Portfolio, Service, TeamMember, Testimonial
+)
+
+logger = logging.getLogger(__name__)
+
+# model -> image fields that get variants
+IMAGE_FIELDS = {
+    Service: ['icon'],
+    BlogPost: ['featured_image'],
+    Event: ['featured_image'],
+    EventPhoto: ['image'],
+    Testimonial: ['client_photo'],
+    TeamMember: ['photo'],
+    Gallery: ['image'],
+    Portfolio: ['image'],
+}
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280, 1920)
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+VARIANT_DIR = 'variants'
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def get_quality():
+    return getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+
+
+def get_cache_timeout():
+    # Finite, since only the process that stores variants clears its own entry.
+    return getattr(settings, 'IMAGE_VARIANT_CACHE_TIMEOUT', 300)
+
+
+def variant_name(source, width, extension):
+    stem = os.path.splitext(source)[0]
+    return f'{VARIANT_DIR}/{stem}-{width}w.{extension}'
+
+
+def target_widths(original_width):
+    """Configured widths below the original, plus the original itself when it is below the largest."""
+    widths = [width for width in get_widths() if width < original_width]
+    if original_width < get_widths()[-1]:
+        widths.append(original_width)
+    return widths
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel: flatten transparent images onto white.
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=get_quality(), optimize=image_format == 'JPEG')
+    return buffer.getvalue()
+
+
+def render_variants(source):
+    """
+    Write the variants of the stored image ``source`` and return them as dicts.
+    Only touches storage, never the database, so it can run in a worker process.
+    """
+    try:
+        with default_storage.open(source) as fh:
+            image = ImageOps.exif_transpose(Image.open(fh))
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning('Cannot generate variants for %s: %s', source, exc)
+        return []
+
+    rendered = []
+    for width in target_widths(image.width):
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for format_name, (image_format, extension) in FORMATS.items():
+            name = variant_name(source, width, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(_encode(resized, image_format)))
+            rendered.append({'format': format_name, 'width': width, 'height': height, 'file': name})
+    return rendered
+
+
+def store_variants(source, rendered):
+    """Replace the ImageVariant rows of ``source`` with ``rendered``."""
+    keep = {variant['file'] for variant in rendered}
+    with transaction.atomic():
+        old = ImageVariant.objects.filter(source=source)
+        for name in old.values_list('file', flat=True):
+            if name not in keep:
+                default_storage.delete(name)
+        old.delete()
+        ImageVariant.objects.bulk_create(ImageVariant(source=source, **variant) for variant in rendered)
+    cache.delete(_cache_key(source))
+
+
+def delete_variants(sources):
+    """Delete the ImageVariant rows and files of ``sources``."""
+    variants = ImageVariant.objects.filter(source__in=sources)
+    with transaction.atomic():
+        names = list(variants.values_list('file', flat=True))
+        variants.delete()
+    for name in names:
+        default_storage.delete(name)
+    cache.delete_many([_cache_key(source) for source in sources])
+
+
+def image_sources():
+    """Storage names of every image in IMAGE_FIELDS."""
+    sources = set()
+    for model, fields in IMAGE_FIELDS.items():
+        for field in fields:
+            sources.update(
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True)
+            )
+    return sources
+
+
+def missing_sources(sources):
+    """The subset of ``sources`` that has no variants yet."""
+    done = set(ImageVariant.objects.filter(source__in=sources).values_list('source', flat=True))
+    return [source for source in sources if source not in done]
+
+
+def orphaned_sources(sources):
+    """Sources with variants that are not in ``sources``: replaced or deleted images."""
+    variants = ImageVariant.objects.values_list('source', flat=True).distinct()
+    return sorted(set(variants) - set(sources))
+
+
+def _cache_key(source):
+    return 'image-variants:' + hashlib.md5(source.encode()).hexdigest()
+
+
+def variants_for_many(sources):
+    """
+    Map each source name to its variants as (format, width, height, url)
+    tuples, from the cache or one query for all the misses.
+    """
+    sources = {source for source in sources if source}
+    keys = {_cache_key(source): source for source in sources}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = sources - found.keys()
+    if missing:
+        loaded = {source: [] for source in missing}
+        for variant in ImageVariant.objects.filter(source__in=missing).order_by('width'):
+            loaded[variant.source].append((variant.format, variant.width, variant.height, variant.file.url))
+        # Sources without variants are cached too, so plain images cost no query.
+        # Other processes (generate_image_variants, other workers) pick up new
+        # variants once the entry times out.
+        cache.set_many({_cache_key(source): value for source, value in loaded.items()}, get_cache_timeout())
+        found.update(loaded)
+    return found
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, get_resolver, include, path, reverse
+
+from main import benchmark, views
+from main.dashboard import get_dashboard_data
+from main.models import BlogPost, Event, Service
+
+
+def _first_pk(queryset):
+    return queryset.order_by('pk').values_list('pk', flat=True).first()
+
+
+# Arguments for the main: URLs that take them.
+URL_KWARGS = {
+    'service_detail': lambda: {'slug': Service.objects.order_by('pk').values_list('slug', flat=True).first()},
+    'blog_detail': lambda: {'pk': _first_pk(BlogPost.objects.filter(is_published=True))},
+    'event_detail': lambda: {'pk': _first_pk(Event.objects.all())},
+    'event_registration': lambda: {'event_id': _first_pk(Event.objects.all())},
+    'event_detail_api': lambda: {'pk': _first_pk(Event.objects.all())},
+}
+
+# Pages timed on top of the main: URLs, as (name, url, needs a staff login).
+EXTRA_PAGES = [
+    ('blog_list_search', lambda: reverse('main:blog_list') + '?search=prototype', False),
+    ('blog_list_deep_page', lambda: reverse('main:blog_list') + '?page=50', False),
+    ('admin_dashboard', lambda: reverse('admin-dashboard'), True),
+]
+
+
+# Pages with an async variant, timed both ways under concurrent load through
+# the ASGI handler, as (name, sync view, async view).
+CONCURRENT_PAGES = [
+    ('home', views.home_view, views.async_home_view),
+    ('service_list', views.ServiceListView.as_view(), views.AsyncServiceListView.as_view()),
+]
+
+
+class ConcurrentBenchURLs:
+    """URLconf serving the sync and async variant of each page side by side."""
+    urlpatterns = [path('', include('main.urls'))] + [
+        path(f'__bench__/{variant}/{name}/', view)
+        for name, *pair in CONCURRENT_PAGES
+        for variant, view in zip(('sync', 'async'), pair)
+    ]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with synthetic data and report p50/p95/p99 latency "
+        "and query counts for every public page, the admin dashboard and the live "
+        "dashboard snapshot. Results can be saved as JSON and compared between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmark.SCALES), default='small',
+                            help='Rows per large table: small=10k, medium=100k, large=1M.')
+        parser.add_argument('--rows', type=int, help='Exact rows per large table, overrides --scale.')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--only', action='append', help='Only time targets with this name.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Compare against results saved by an earlier --output.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data.')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Simultaneous requests when comparing sync and async views.')
+
+    def handle(self, *args, **options):
+        rows = options['rows'] or benchmark.SCALES[options['scale']]
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+
+        # Never touch the real database: build a test database in a temp file.
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        previous_test_name = test_settings.get('NAME')
+        handle, test_settings['NAME'] = tempfile.mkstemp(prefix='bench-', suffix='.sqlite3')
+        os.close(handle)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            start = time.perf_counter()
+            staff = benchmark.seed(rows, seed_value=options['seed'], log=self.stdout.write)
+            self.stdout.write(f'Seeded in {time.perf_counter() - start:.1f}s')
+            results = self.run_targets(staff, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            test_settings['NAME'] = previous_test_name
+
+        report = {
+            'meta': {
+                'revision': git_revision(),
+                'rows': rows,
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }
+        self.print_report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def targets(self, staff):
+        anonymous = Client(raise_request_exception=False)
+        admin = Client(raise_request_exception=False)
+        admin.force_login(staff)
+
+        for pattern in get_resolver('main.urls').url_patterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            kwargs = URL_KWARGS[pattern.name]() if pattern.name in URL_KWARGS else {}
+            client = admin if pattern.name == 'dashboard' else anonymous
+            url = reverse(f'main:{pattern.name}', kwargs=kwargs)
+            yield pattern.name, lambda client=client, url=url: client.get(url)
+
+        for name, url, needs_staff in EXTRA_PAGES:
+            client = admin if needs_staff else anonymous
+            yield name, lambda client=client, url=url(): client.get(url)
+
+        yield 'dashboard_snapshot', get_dashboard_data
+
+    def run_targets(self, staff, options):
+        # Failing pages show up as an HTTP status in the report rather than a
+        # traceback per iteration.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        results = {}
+        # With the page cache on, every iteration after the first would time a
+        # cache hit instead of the view.
+        with override_settings(PAGE_CACHE={'ENABLED': False}):
+            for name, func in self.targets(staff):
+                if options['only'] and name not in options['only']:
+                    continue
+                self.stdout.write(f'Timing {name}')
+                results[name] = benchmark.measure(func, options['iterations'])
+        results.update(self.run_concurrent(options))
+        if not results:
+            raise CommandError('No benchmark targets matched --only.')
+        return results
+
+    def run_concurrent(self, options):
+        """Sync vs async variants of the same page, with the page cache off."""
+        results = {}
+        client = AsyncClient(raise_request_exception=False)
+        concurrency = options['concurrency']
+        with override_settings(ROOT_URLCONF=ConcurrentBenchURLs, PAGE_CACHE={'ENABLED': False}):
+            for page, *_ in CONCURRENT_PAGES:
+                for variant in ('sync', 'async'):
+                    name = f'{page}_{variant}_c{concurrency}'
+                    if options['only'] and name not in options['only']:
+                        continue
+                    self.stdout.write(f'Timing {name}')
+                    url = f'/__bench__/{variant}/{page}/'
+                    results[name] = benchmark.measure_concurrent(
+                        lambda url=url: client.get(url), concurrency, options['iterations'],
+                    )
+        return results
+
+    def print_report(self, report, baseline):
+        self.stdout.write('')
+        header = f"{'target':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}"
+        if baseline:
+            header += f"{'p50 vs base':>14}{'queries vs base':>17}"
+        self.stdout.write(header)
+        for name, result in report['results'].items():
+            queries = '-' if result['queries'] is None else result['queries']
+            line = (f"{name:<28}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                    f"{result['p99_ms']:>10.2f}{queries:>9}")
+            previous = baseline and baseline['results'].get(name)
+            if previous:
+                ratio = result['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else float('inf')
+                if result['queries'] is None or previous['queries'] is None:
+                    line += f"{ratio:>13.2f}x{'-':>17}"
+                else:
+                    line += f"{ratio:>13.2f}x{result['queries'] - previous['queries']:>+17}"
+            if result.get('status', 200) >= 500:
+                line += f"  (HTTP {result['status']})"
+            self.stdout.write(line)
@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main import images
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the resized WebP/JPEG variants of every uploaded image that does not "
+        "have them yet, and delete the variants of replaced and deleted images. Images "
+        "are resized in a process pool; the database is only written from this process. "
+        "Run it from cron or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per CPU).')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate variants that already exist.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new images.')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between polls with --loop.')
+
+    def handle(self, *args, **options):
+        force, skipped = options['force'], set()
+        while True:
+            sources = images.image_sources()
+            orphaned = images.orphaned_sources(sources)
+            if orphaned:
+                images.delete_variants(orphaned)
+                self.stdout.write(f'Deleted the variants of {len(orphaned)} replaced or deleted images.')
+            sources = sorted(sources - skipped)
+            if not force:
+                sources = images.missing_sources(sources)
+            # --force regenerates everything once; later polls only pick up new uploads.
+            force = False
+            if sources:
+                skipped |= self.generate(sources, options['workers'])
+            elif not options['loop'] and not orphaned:
+                self.stdout.write('All images already have variants.')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def generate(self, sources, workers):
+        """Generate the variants of ``sources``; returns the ones that are not readable images."""
+        self.stdout.write(f'Generating variants for {len(sources)} images with {workers} workers')
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        skipped = set()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for source, rendered in zip(sources, pool.map(images.render_variants, sources, chunksize=4)):
+                images.store_variants(source, rendered)
+                if not rendered:
+                    skipped.add(source)
+                    self.stderr.write(f'Skipped {source}: not a readable image')
+        generated = len(sources) - len(skipped)
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {generated} images, skipped {len(skipped)}.'))
+        return skipped
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from main.page_cache import page_cache_stats, reset_page_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit, miss and bypass counts of the anonymous page cache per view."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them.')
+
+    def handle(self, *args, **options):
+        # Cached views register themselves when the URLconf is imported.
+        from django.urls import get_resolver
+        get_resolver().url_patterns
+
+        for name, counts in sorted(page_cache_stats().items()):
+            served = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / served if served else 0
+            self.stdout.write(
+                f"{name}: {counts['hit']} hits, {counts['miss']} misses, "
+                f"{counts['bypass']} bypassed ({ratio:.0%} hit rate)"
+            )
+        if options['reset']:
+            reset_page_cache_stats()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from main.rollups import ROLLUP_SOURCES, fold_entity, rebuild_entity
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold contact messages and event registrations added since the last run into "
+        "the per-day and per-hour StatRollup tables used by the admin dashboard. "
+        "Run it from cron every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity', choices=sorted(ROLLUP_SOURCES), action='append',
+                            help='Only fold this entity (may be repeated).')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Rows folded per transaction.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop the rollups and fold every row again, e.g. after deletions.')
+
+    def handle(self, *args, **options):
+        for entity in options['entity'] or sorted(ROLLUP_SOURCES):
+            if options['rebuild']:
+                folded = rebuild_entity(entity)
+            else:
+                folded = fold_entity(entity, batch_size=options['batch_size'])
+            self.stdout.write(f'{entity}: folded {folded} rows')
@@ -0,0 +1,28 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from main.dashboard import DashboardBroadcaster
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the dashboard snapshot producer as a standalone process. Use together "
+        "with DASHBOARD_BROADCASTER = 'external' so that one producer serves every "
+        "ASGI worker sharing the channel layer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between full consistency recomputes '
+                                 '(defaults to DASHBOARD_CONSISTENCY_INTERVAL).')
+
+    def handle(self, *args, **options):
+        producer = DashboardBroadcaster(interval=options['interval'])
+        self.stdout.write(
+            f'Broadcasting dashboard changes, full recompute every {producer.get_interval()}s'
+        )
+        try:
+            asyncio.run(producer.run())
+        except KeyboardInterrupt:
+            pass
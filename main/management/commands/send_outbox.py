@@ -0,0 +1,39 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from main.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the queued transactional emails in batches, one SMTP connection per "
+        "batch, retrying failures with exponential backoff. Run it from cron or "
+        "keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Messages per batch (default EMAIL_OUTBOX BATCH_SIZE).')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop.')
+        parser.add_argument('--smtp-host', help='Send through this SMTP server instead of EMAIL_HOST, '
+                                                'e.g. a local debugging server.')
+        parser.add_argument('--smtp-port', type=int, default=1025, help='Port for --smtp-host.')
+
+    def get_connection(self, options):
+        if not options['smtp_host']:
+            return None
+        return get_connection('django.core.mail.backends.smtp.EmailBackend', host=options['smtp_host'],
+                              port=options['smtp_port'], username='', password='',
+                              use_tls=False, use_ssl=False)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_batch(options['batch_size'], self.get_connection(options))
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+            elif not options['loop']:
+                return
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint the SQLite write-ahead log back into the database file, "
+        "truncating it, and run PRAGMA optimize to refresh the query planner's "
+        "statistics. Run it from cron or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--loop', action='store_true', help='Repeat every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds between runs with --loop.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"Database '{options['database']}' is not SQLite")
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                busy, wal_pages, checkpointed = cursor.fetchone()
+                cursor.execute('PRAGMA optimize')
+            if wal_pages == -1:
+                self.stdout.write('Database is not in WAL mode; nothing to checkpoint')
+            elif busy:
+                # Another connection was writing or reading an old snapshot;
+                # the next run picks up what is left.
+                self.stdout.write(f'Checkpoint incomplete: {checkpointed} of {wal_pages} WAL pages copied')
+            else:
+                self.stdout.write(f'Checkpointed {checkpointed} WAL pages')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from main.db_router import PRIMARY, get_config, sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the local SQLite read replicas "
+        "in READ_REPLICAS. Run it from cron or keep it running with --loop; "
+        "the interval bounds how far the replicas lag behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Repeat every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between syncs with --loop.')
+
+    def handle(self, *args, **options):
+        aliases = get_config()['ALIASES']
+        if not aliases:
+            raise CommandError('No read replicas are configured (READ_REPLICAS ALIASES)')
+        for alias in aliases:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"Replica '{alias}' is not SQLite; replicate it with the database's own tools")
+        while True:
+            for alias in aliases:
+                path = connections[alias].settings_dict['NAME']
+                if path == connections[PRIMARY].settings_dict['NAME']:
+                    # A test mirror of the primary.
+                    continue
+                start = time.perf_counter()
+                try:
+                    sync_sqlite_replica(path)
+                except ValueError as exc:
+                    raise CommandError(exc)
+                self.stdout.write(f'Synced {alias} in {(time.perf_counter() - start) * 1000:.0f} ms')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
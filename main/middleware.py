@@ -0,0 +1,212 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import db_router
+
+QUERY_PROFILER_DEFAULTS = {
+    # 'off', 'staff' (only requests from staff users) or 'all'
+    'MODE': 'off',
+    'SLOWEST': 3,
+    'DUPLICATES': 3,
+    # Optional JSONL file receiving one line per profiled request.
+    'LOG_FILE': None,
+    'LOG_MAX_BYTES': 10 * 1024 * 1024,
+    'LOG_BACKUP_COUNT': 5,
+}
+
+profile_logger = logging.getLogger('main.query_profiler')
+
+
+class QueryRecorder:
+    """Database execute wrapper that records the SQL and duration of each query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000))
+
+    @property
+    def total_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+    def duplicates(self, limit):
+        # Same SQL with different parameters is what an N+1 loop looks like.
+        counts = Counter(sql for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common(limit) if count > 1]
+
+
+def _header_text(sql, length=80):
+    text = ' '.join(sql.split())[:length]
+    return text.encode('ascii', 'replace').decode().replace('\\', '').replace('"', "'")
+
+
+class QueryProfilerMiddleware:
+    """
+    Records the queries run by each request and reports them in Server-Timing
+    headers (visible in the browser's network panel), and optionally in a
+    rotating JSONL log. Configured through the QUERY_PROFILER setting.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # Keep the ASGI handler from adapting the whole chain to a thread.
+            markcoroutinefunction(self)
+        self.config = {**QUERY_PROFILER_DEFAULTS, **getattr(settings, 'QUERY_PROFILER', {})}
+        if self.config['MODE'] == 'off':
+            raise MiddlewareNotUsed
+        if self.config['LOG_FILE'] and not profile_logger.handlers:
+            handler = RotatingFileHandler(
+                self.config['LOG_FILE'],
+                maxBytes=self.config['LOG_MAX_BYTES'],
+                backupCount=self.config['LOG_BACKUP_COUNT'],
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            profile_logger.addHandler(handler)
+            profile_logger.setLevel(logging.INFO)
+            profile_logger.propagate = False
+
+    def should_profile(self, request, user=None):
+        if self.config['MODE'] == 'all':
+            return True
+        # Without a session cookie there is no staff user; checking request.user
+        # anyway would add Vary: Cookie to every (cacheable) anonymous response.
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return False
+        if user is None:
+            user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        self.report(request, response, recorder, (time.perf_counter() - start) * 1000)
+        return response
+
+    async def __acall__(self, request):
+        user = None
+        if self.config['MODE'] != 'all' and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            user = await request.auser()
+        if not self.should_profile(request, user):
+            return await self.get_response(request)
+
+        # The async ORM runs queries in the request's sync thread, whose
+        # connections are not the event loop's, so the wrapper goes there.
+        recorder = QueryRecorder()
+        stack = ExitStack()
+
+        def install():
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+
+        start = time.perf_counter()
+        await sync_to_async(install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.report(request, response, recorder, (time.perf_counter() - start) * 1000)
+        return response
+
+    def report(self, request, response, recorder, total_ms):
+        slowest = recorder.slowest(self.config['SLOWEST'])
+        duplicates = recorder.duplicates(self.config['DUPLICATES'])
+
+        timings = [
+            f'db;dur={recorder.total_ms:.2f};desc="{len(recorder.queries)} queries"',
+            f'app;dur={total_ms:.2f}',
+        ]
+        timings += [
+            f'db-slow-{index};dur={duration:.2f};desc="{_header_text(sql)}"'
+            for index, (sql, duration) in enumerate(slowest)
+        ]
+        timings += [
+            f'db-dup-{index};desc="{count}x {_header_text(sql)}"'
+            for index, (sql, count) in enumerate(duplicates)
+        ]
+        response['Server-Timing'] = ', '.join(timings)
+
+        if self.config['LOG_FILE']:
+            profile_logger.info(json.dumps({
+                'time': time.time(),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': len(recorder.queries),
+                'db_ms': round(recorder.total_ms, 2),
+                'total_ms': round(total_ms, 2),
+                'slowest': [{'sql': sql, 'ms': round(duration, 2)} for sql, duration in slowest],
+                'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates],
+            }))
+
+
+class PrimaryPinMiddleware:
+    """
+    Keeps a request's reads on the primary database once it has written, and
+    sets a cookie that does the same for the client's requests during the
+    next READ_REPLICAS['STICKY_SECONDS'], while the replicas catch up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.config = db_router.get_config()
+        if not self.config['ALIASES']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = db_router.start_request(self.config['COOKIE_NAME'] in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = db_router.end_request(token)
+        return self.pin(response, wrote)
+
+    async def __acall__(self, request):
+        token = db_router.start_request(self.config['COOKIE_NAME'] in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrote = db_router.end_request(token)
+        return self.pin(response, wrote)
+
+    def pin(self, response, wrote):
+        if wrote:
+            response.set_cookie(self.config['COOKIE_NAME'], '1', max_age=self.config['STICKY_SECONDS'],
+                                httponly=True, samesite='Lax')
+        return response
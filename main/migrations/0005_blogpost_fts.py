@@ -0,0 +1,75 @@
+from django.db import migrations
+
+FTS_TABLE = 'main_blogpost_fts'
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, content, meta_description,
+        content='main_blogpost', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON main_blogpost BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content, meta_description)
+        VALUES (new.id, new.title, new.content, new.meta_description);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON main_blogpost BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content, meta_description)
+        VALUES ('delete', old.id, old.title, old.content, old.meta_description);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON main_blogpost BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content, meta_description)
+        VALUES ('delete', old.id, old.title, old.content, old.meta_description);
+        INSERT INTO {FTS_TABLE}(rowid, title, content, meta_description)
+        VALUES (new.id, new.title, new.content, new.meta_description);
+    END""",
+    # Backfill the index from the existing posts.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def fts5_supported(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Older builds do not report the option; try the module directly.
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+            return True
+        except Exception:
+            return False
+
+
+def create_index(apps, schema_editor):
+    # Other backends keep using the LIKE search in main.search.
+    if not fts5_supported(schema_editor):
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_stat_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-17 17:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_and_count_seats(apps, schema_editor):
+    Event = apps.get_model('main', 'Event')
+    EventRegistration = apps.get_model('main', 'EventRegistration')
+    # Keep the first registration of each (event, email) pair so the
+    # constraint can be added. The others cannot be brought back by
+    # unapplying this migration, so every one is printed as it goes.
+    duplicates = EventRegistration.objects.values('event', 'email').annotate(
+        first=Min('pk'), copies=Count('pk')
+    ).filter(copies__gt=1)
+    for row in duplicates:
+        extra = EventRegistration.objects.filter(event=row['event'], email=row['email']).exclude(pk=row['first'])
+        for registration in extra.order_by('pk'):
+            print(
+                f"\n  Deleting duplicate registration {registration.pk} of {registration.email!r} "
+                f"for event {row['event']} (name {registration.name!r}, status {registration.status}, "
+                f"registered {registration.registration_date:%Y-%m-%d %H:%M}; "
+                f"registration {row['first']} is kept)",
+                end='',
+            )
+        extra.delete()
+    seats = EventRegistration.objects.filter(status__in=('pending', 'confirmed')).values('event').annotate(
+        taken=Count('pk')
+    )
+    for row in seats:
+        Event.objects.filter(pk=row['event']).update(seats_taken=row['taken'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_newsletter_campaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waitlist_enabled',
+            field=models.BooleanField(default=False, help_text='Accept registrations on a waitlist once full'),
+        ),
+        migrations.AlterField(
+            model_name='eventregistration',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('waitlisted', 'Waitlisted'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(dedupe_and_count_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eventregistration',
+            constraint=models.UniqueConstraint(fields=('event', 'email'), name='unique_event_registration'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='claim_token',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, editable=False, help_text='The run holding claim_token owns the campaign until then, renewed at every checkpoint', null=True),
+        ),
+        migrations.AlterField(
+            model_name='newslettercampaign',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0, help_text='Messages that failed in the run and were queued in the outbox to be retried'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 18:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_newsletter_campaign_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogPostSearchIndex',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='main.blogpost')),
+                ('title', models.TextField()),
+                ('content', models.TextField()),
+                ('meta_description', models.TextField()),
+                ('document', models.TextField(db_column='main_blogpost_fts')),
+            ],
+            options={
+                'db_table': 'main_blogpost_fts',
+                'managed': False,
+            },
+        ),
+    ]
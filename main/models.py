@@ -1,7 +1,7 @@
 from django.db import models
 
 # Create your models here.
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -59,6 +59,32 @@ class BlogPost(models.Model):
 
     class Meta:
         ordering = ['-published_date']
+        indexes = [
+            # The blog archive and the home page: published posts, newest first.
+            # Partial, because Django filters booleans on SQLite as a bare
+            # `WHERE is_published`, which only a matching partial index serves.
+            models.Index(fields=['published_date'], condition=models.Q(is_published=True),
+                         name='blog_published_idx'),
+            models.Index(fields=['created_date'], name='blog_created_idx'),
+        ]
+
+
+class BlogPostSearchIndex(models.Model):
+    """
+    Row of the SQLite FTS5 index over BlogPost (migration 0005), read by
+    main.search. Its rowid is the post's id, and ``document`` is the hidden
+    column FTS5 names after the table, which MATCH, bm25() and snippet() take.
+    """
+    post = models.OneToOneField(BlogPost, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                related_name='search_index')
+    title = models.TextField()
+    content = models.TextField()
+    meta_description = models.TextField()
+    document = models.TextField(db_column='main_blogpost_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'main_blogpost_fts'
 
 class BlogCategory(models.Model):
     name = models.CharField(max_length=100)
@@ -87,7 +113,11 @@ class Event(models.Model):
     end_date = models.DateTimeField(null=True, blank=True)
     registration_url = models.URLField(blank=True)
     max_participants = models.PositiveIntegerField(null=True, blank=True)
+    # Registrations holding a seat, kept in step by take_seat()/release_seat().
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
+    waitlist_enabled = models.BooleanField(default=False, help_text="Accept registrations on a waitlist once full")
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES, default='all')
+    updated_date = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.title
@@ -96,6 +126,26 @@ class Event(models.Model):
     def is_past(self):
         return timezone.now() > self.date
 
+    def take_seat(self):
+        """
+        Reserve a seat with a single conditional UPDATE, so concurrent
+        registrations cannot overbook. Returns False if the event is full.
+        """
+        has_room = models.Q(max_participants__isnull=True) | models.Q(seats_taken__lt=models.F('max_participants'))
+        return bool(Event.objects.filter(has_room, pk=self.pk).update(seats_taken=models.F('seats_taken') + 1))
+
+    def release_seat(self):
+        Event.objects.filter(pk=self.pk, seats_taken__gt=0).update(seats_taken=models.F('seats_taken') - 1)
+
+    class Meta:
+        indexes = [
+            # The event archive, unfiltered, by type and upcoming only (see
+            # BlogPost for the partial index); each is ordered by date.
+            models.Index(fields=['date'], name='event_date_idx'),
+            models.Index(fields=['event_type', 'date'], name='event_type_date_idx'),
+            models.Index(fields=['date'], condition=models.Q(is_upcoming=True), name='event_upcoming_date_idx'),
+        ]
+
 class EventPhoto(models.Model):
     event = models.ForeignKey(Event, related_name='photos', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='event_photos/')
@@ -126,6 +176,9 @@ class Testimonial(models.Model):
 
     class Meta:
         ordering = ['-is_featured', 'display_order']
+        indexes = [
+            models.Index(fields=['-is_featured', 'display_order'], name='testimonial_order_idx'),
+        ]
 
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100)
@@ -143,6 +196,9 @@ class ContactMessage(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='contact_created_idx'),
+        ]
 
 class TeamMember(models.Model):
     name = models.CharField(max_length=100)
@@ -156,6 +212,11 @@ class TeamMember(models.Model):
     def __str__(self):
         return self.name 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['order'], name='team_order_idx'),
+        ]
+
 class Navigation(models.Model):
     """Model for navigation menu items"""
     title = models.CharField(max_length=100)
@@ -249,6 +310,9 @@ class Portfolio(models.Model):
     class Meta:
         ordering = ['order']
         verbose_name_plural = "Portfolios"
+        indexes = [
+            models.Index(fields=['order'], name='portfolio_order_idx'),
+        ]
 
     def __str__(self):
         return self.title 
@@ -262,7 +326,10 @@ class Newsletter(models.Model):
         return self.email
 
     class Meta:
-        ordering = ['-subscribed_at'] 
+        ordering = ['-subscribed_at']
+        indexes = [
+            models.Index(fields=['subscribed_at'], condition=models.Q(is_active=True), name='newsletter_active_idx'),
+        ]
 
 class EventRegistration(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='registrations')
@@ -273,11 +340,177 @@ class EventRegistration(models.Model):
     status = models.CharField(max_length=20, choices=[
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
+        ('waitlisted', 'Waitlisted'),
         ('cancelled', 'Cancelled')
     ], default='pending')
 
+    # Statuses counted in Event.seats_taken.
+    SEAT_STATUSES = ('pending', 'confirmed')
+
     def __str__(self):
         return f"{self.name} - {self.event.title}"
 
+    @property
+    def holds_seat(self):
+        return self.status in self.SEAT_STATUSES
+
+    def cancel(self):
+        """Cancel the registration, handing its seat to the oldest waitlisted one."""
+        if self.status == 'cancelled':
+            return
+        with transaction.atomic():
+            if self.holds_seat:
+                self.hand_over_seat()
+            self.status = 'cancelled'
+            self.save(update_fields=['status'])
+
+    def hand_over_seat(self):
+        """Give up this registration's seat to the waitlist, or free it."""
+        promoted = EventRegistration.objects.filter(
+            event_id=self.event_id, status='waitlisted'
+        ).order_by('registration_date', 'pk').select_for_update().first()
+        if promoted:
+            # main.outbox imports the models, so it is imported here.
+            from .outbox import enqueue_email
+
+            promoted.status = 'pending'
+            promoted.save(update_fields=['status'])
+            # Queued in the caller's transaction, so it goes out only if the
+            # promotion is committed.
+            enqueue_email(f'A place is available - {promoted.event.title}', 'main/email/waitlist_promoted.html',
+                          {'name': promoted.name, 'event': promoted.event, 'registration': promoted},
+                          [promoted.email])
+        else:
+            Event(pk=self.event_id).release_seat()
+
+    class Meta:
+        ordering = ['-registration_date']
+        indexes = [
+            models.Index(fields=['event', 'registration_date'], name='registration_event_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'email'], name='unique_event_registration'),
+        ]
+
+class StatRollup(models.Model):
+    """Pre-aggregated row counts per day or hour, maintained by `manage.py rollup_stats`"""
+    GRANULARITY_CHOICES = [
+        ('day', 'Day'),
+        ('hour', 'Hour'),
+    ]
+
+    entity = models.CharField(max_length=50)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    dimension = models.CharField(max_length=100, blank=True, default='', help_text="Optional breakdown key, e.g. event id")
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.entity} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}: {self.count}"
+
+    class Meta:
+        ordering = ['entity', 'granularity', 'bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['entity', 'granularity', 'bucket', 'dimension'],
+                name='unique_stat_rollup_bucket',
+            ),
+        ]
+
+class RollupWatermark(models.Model):
+    """Highest primary key already folded into StatRollup for an entity"""
+    entity = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.entity} up to #{self.last_id}"
+
+class ImageVariant(models.Model):
+    """Resized copy of an uploaded image, generated by main.images"""
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    source = models.CharField(max_length=255, db_index=True, help_text="Storage name of the original image")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to='variants/', max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.source} ({self.format}, {self.width}w)"
+
     class Meta:
-        ordering = ['-registration_date'] 
\ No newline at end of file
+        ordering = ['source', 'format', 'width']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'format', 'width'],
+                name='unique_image_variant',
+            ),
+        ]
+
+class OutboxEmail(models.Model):
+    """Email queued in the same transaction as the change it reports, sent by `manage.py send_outbox`"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(help_text="List of recipient addresses")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+class NewsletterCampaign(models.Model):
+    """Newsletter issue sent to the active subscribers by `manage.py send_campaign`"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    content = models.TextField(help_text="HTML; {{ email }} is replaced with the recipient's address")
+    template_name = models.CharField(max_length=255, default='main/email/newsletter.html')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    last_subscriber_id = models.PositiveIntegerField(
+        default=0, help_text="Checkpoint: every subscriber up to this id has been handled"
+    )
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(
+        default=0, help_text="Messages that failed in the run and were queued in the outbox to be retried"
+    )
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_until = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="The run holding claim_token owns the campaign until then, renewed at every checkpoint"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.subject
+
+    class Meta:
+        ordering = ['-created_at']
@@ -0,0 +1,122 @@
+"""
+Site navigation for the header in base.html.
+
+The active Navigation rows are loaded in one query and assembled into a
+nested tree, which is cached together with the rendered header and footer
+fragments. Everything is keyed by the shared Navigation version stamp kept
+by main.page_cache, so editing a menu item through any process replaces all
+of it on commit; PAGE_CACHE['TIMEOUT'] bounds what is left behind. While
+no Navigation rows exist the built-in DEFAULT_NAVIGATION menu is used.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .db_router import primary_reads
+from .models import Navigation
+from .page_cache import get_config, shared_model_versions
+
+NAVIGATION_LABEL = Navigation._meta.label_lower
+
+# (title, url name, icon, children)
+DEFAULT_NAVIGATION = [
+    ('Home', 'main:home', 'fas fa-home', []),
+    ('Services', 'main:service_list', 'fas fa-cogs', []),
+    ('About Us', 'main:about', 'fas fa-info-circle', []),
+    ('Contact', 'main:contact', 'fas fa-envelope', []),
+    ('Company', None, 'fas fa-building', [
+        ('Our Team', 'main:team_list', 'fas fa-users', []),
+        ('Testimonials', 'main:testimonial_list', 'fas fa-star', []),
+        ('Past Portfolios', 'main:portfolio_list', 'fas fa-briefcase', []),
+    ]),
+    ('Resources', None, 'fas fa-book', [
+        ('Blog', 'main:blog_list', 'fas fa-blog', []),
+        ('Events', 'main:event_list', 'fas fa-calendar', []),
+        ('Gallery', 'main:gallery_list', 'fas fa-images', []),
+    ]),
+]
+
+
+def _cache_key(*parts):
+    version, = shared_model_versions([NAVIGATION_LABEL])
+    return ':'.join([get_config()['KEY_PREFIX'], 'navigation', version, *parts])
+
+
+def _default_tree(items=DEFAULT_NAVIGATION):
+    return [
+        {'title': title, 'url': reverse(name) if name else '#', 'icon': icon,
+         'children': _default_tree(children)}
+        for title, name, icon, children in items
+    ]
+
+
+def _nest(rows):
+    nodes = {row['id']: {'title': row['title'], 'url': row['url'], 'icon': '', 'children': []} for row in rows}
+    tree = []
+    for row in rows:
+        if row['parent_id'] is None:
+            tree.append(nodes[row['id']])
+        elif row['parent_id'] in nodes:
+            nodes[row['parent_id']]['children'].append(nodes[row['id']])
+        # Items under an inactive parent are hidden along with it.
+    return tree
+
+
+def _active_rows():
+    return Navigation.objects.filter(is_active=True).values('id', 'title', 'url', 'parent_id')
+
+
+def build_navigation_tree():
+    """Nest the active Navigation rows under their parents, in one query."""
+    rows = list(_active_rows())
+    if not rows and not Navigation.objects.exists():
+        return _default_tree()
+    return _nest(rows)
+
+
+async def abuild_navigation_tree():
+    rows = [row async for row in _active_rows()]
+    if not rows and not await Navigation.objects.aexists():
+        return _default_tree()
+    return _nest(rows)
+
+
+def get_navigation_tree():
+    key = _cache_key('tree')
+    tree = cache.get(key)
+    if tree is None:
+        with primary_reads():
+            tree = build_navigation_tree()
+        cache.set(key, tree, get_config()['TIMEOUT'])
+    return tree
+
+
+async def aget_navigation_tree():
+    key = _cache_key('tree')
+    tree = cache.get(key)
+    if tree is None:
+        with primary_reads():
+            tree = await abuild_navigation_tree()
+        cache.set(key, tree, get_config()['TIMEOUT'])
+    return tree
+
+
+def active_index(tree, path):
+    """Position of the top-level item that ``path`` belongs to, or -1."""
+    for index, item in enumerate(tree):
+        if item['url'] == path or any(child['url'] == path for child in item['children']):
+            return index
+    return -1
+
+
+def render_fragment(template_name, context=None):
+    """Render a base.html fragment once per navigation version and context."""
+    parts = [template_name, *(f'{name}={value}' for name, value in sorted((context or {}).items()))]
+    key = _cache_key(*parts)
+    html = cache.get(key)
+    if html is None:
+        # Fragments must not depend on the visitor; only the URL tags and
+        # the given context are rendered into them.
+        html = render_to_string(template_name, {'navigation': get_navigation_tree(), **(context or {})})
+        cache.set(key, html, get_config()['TIMEOUT'])
+    return html
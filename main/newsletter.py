@@ -0,0 +1,251 @@
+"""
+Bulk newsletter delivery.
+
+A campaign is rendered once, with a placeholder where the recipient's address
+goes, and each message is that rendering with the address substituted. The
+active subscribers are streamed in id order and handed to a pool of worker
+threads, each holding its own persistent SMTP connection, with an optional
+shared rate limit. A run first claims the campaign with a conditional UPDATE,
+so two runs can never send it at once. After every CHECKPOINT_EVERY
+recipients the id below which all of them have been handled is saved on the
+campaign and the claim renewed, so an interrupted run resumes from there: a
+clean stop (Ctrl-C) re-sends nothing, a crash at most the messages since the
+last checkpoint. Messages that fail are queued in the transactional outbox
+(main.outbox), which retries them with backoff. Configured through the
+NEWSLETTER setting.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import router
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from . import outbox
+from .models import Newsletter, NewsletterCampaign, OutboxEmail
+
+NEWSLETTER_DEFAULTS = {
+    # Worker threads, each with its own SMTP connection.
+    'CONCURRENCY': 4,
+    # Messages per second across all workers; None for no limit.
+    'RATE': None,
+    # Subscribers fetched from the database at a time.
+    'CHUNK_SIZE': 2000,
+    'CHECKPOINT_EVERY': 100,
+    # Seconds a run owns the campaign without checkpointing before another
+    # run may take it over. The claim is also renewed at half this interval.
+    'LEASE': 10 * 60,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {**NEWSLETTER_DEFAULTS, **getattr(settings, 'NEWSLETTER', {})}
+
+
+class CampaignUnavailable(Exception):
+    """The campaign has been sent, or another run is sending it."""
+
+
+class RenderedCampaign:
+    """A campaign rendered once, split around the recipient placeholder."""
+
+    def __init__(self, campaign):
+        placeholder = f'recipient-{uuid.uuid4().hex}'
+        content = Template(campaign.content).render(Context({'email': placeholder}))
+        html = render_to_string(campaign.template_name, {
+            'campaign': campaign,
+            'content': mark_safe(content),
+            'email': placeholder,
+        })
+        self.subject = campaign.subject
+        self.html_parts = html.split(placeholder)
+        self.text_parts = strip_tags(html).split(placeholder)
+
+    def message(self, email, from_email=None, connection=None):
+        message = EmailMultiAlternatives(self.subject, email.join(self.text_parts), from_email, [email],
+                                         connection=connection)
+        message.attach_alternative(escape(email).join(self.html_parts), 'text/html')
+        return message
+
+    def outbox_email(self, email, from_email):
+        """The message for ``email`` as an unsaved OutboxEmail."""
+        return OutboxEmail(subject=self.subject, body=email.join(self.text_parts),
+                           html_body=escape(email).join(self.html_parts), from_email=from_email, to=[email])
+
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1 / rate seconds apart, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+class ConnectionPool:
+    """One persistent SMTP connection per worker thread, opened on first use."""
+
+    def __init__(self, connection_factory):
+        self.connection_factory = connection_factory
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.connection_factory()
+            with self.lock:
+                self.connections.append(connection)
+        connection.open()
+        return connection
+
+    def reset(self):
+        """Drop this thread's connection after the server hung up."""
+        connection = self.local.connection
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+def claim_campaign(campaign, config):
+    """
+    Take ``campaign`` for this run and reload it from the primary. Raises
+    CampaignUnavailable if it has been sent or another run's claim is live.
+    """
+    now = timezone.now()
+    token = uuid.uuid4()
+    claimed = NewsletterCampaign.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+        pk=campaign.pk, status__in=('draft', 'sending'),
+    ).update(
+        status='sending', started_at=Coalesce('started_at', Value(now)),
+        claim_token=token, claimed_until=now + timedelta(seconds=config['LEASE']),
+    )
+    if not claimed:
+        raise CampaignUnavailable(f'"{campaign}" has been sent or is being sent by another run')
+    campaign.refresh_from_db(using=router.db_for_write(NewsletterCampaign))
+    return token
+
+
+def send_campaign(campaign, concurrency=None, rate=None, connection_factory=None):
+    """
+    Send ``campaign`` to the active subscribers it has not reached yet.
+    Returns (sent, failed) counts for this run.
+    """
+    config = get_config()
+    concurrency = concurrency or config['CONCURRENCY']
+    token = claim_campaign(campaign, config)
+    rendered = RenderedCampaign(campaign)
+    from_email = settings.DEFAULT_FROM_EMAIL
+    limiter = RateLimiter(rate if rate is not None else config['RATE'])
+    pool = ConnectionPool(connection_factory or get_connection)
+    outbox_config = outbox.get_config()
+
+    def deliver(address):
+        limiter.wait()
+        try:
+            rendered.message(address, from_email, pool.get()).send()
+        except SMTPServerDisconnected:
+            # Idle connections get dropped; reconnect once before giving up.
+            pool.reset()
+            rendered.message(address, from_email, pool.get()).send()
+
+    subscribers = Newsletter.objects.filter(
+        is_active=True, pk__gt=campaign.last_subscriber_id
+    ).order_by('pk').values_list('pk', 'email')
+    sent = failed = 0
+    # Futures in submission (id) order; the checkpoint only ever moves past
+    # the oldest one, so every subscriber below it has been handled.
+    in_flight = deque()
+    renew_at = time.monotonic() + config['LEASE'] / 2
+
+    def settle():
+        nonlocal sent, failed
+        pk, address, future = in_flight.popleft()
+        try:
+            future.result()
+        except Exception as exc:
+            failed += 1
+            campaign.failed_count += 1
+            logger.warning('Campaign %s to %s failed, queued for retry: %s', campaign.pk, address, exc)
+            # Queued before the checkpoint can move past this subscriber.
+            email = rendered.outbox_email(address, from_email)
+            email.attempts = 1
+            email.last_error = f'{type(exc).__name__}: {exc}'
+            email.next_attempt_at = timezone.now() + outbox.backoff(1, outbox_config)
+            email.save()
+        else:
+            sent += 1
+            campaign.sent_count += 1
+        campaign.last_subscriber_id = pk
+        if (sent + failed) % config['CHECKPOINT_EVERY'] == 0 or time.monotonic() >= renew_at:
+            checkpoint()
+
+    def checkpoint(**fields):
+        nonlocal renew_at
+        renew_at = time.monotonic() + config['LEASE'] / 2
+        updated = NewsletterCampaign.objects.filter(pk=campaign.pk, claim_token=token).update(**{
+            'last_subscriber_id': campaign.last_subscriber_id,
+            'sent_count': campaign.sent_count,
+            'failed_count': campaign.failed_count,
+            'claimed_until': timezone.now() + timedelta(seconds=config['LEASE']),
+            **fields,
+        })
+        if not updated:
+            # The lease ran out and another run took over; it sends the rest.
+            raise CampaignUnavailable(f'"{campaign}" was taken over by another run')
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='newsletter')
+    try:
+        for pk, address in subscribers.iterator(chunk_size=config['CHUNK_SIZE']):
+            in_flight.append((pk, address, executor.submit(deliver, address)))
+            # Keep a few messages queued per worker, no more.
+            while len(in_flight) > concurrency * 2 or (in_flight and in_flight[0][2].done()):
+                settle()
+        while in_flight:
+            settle()
+        campaign.status = 'sent'
+        campaign.finished_at = timezone.now()
+    finally:
+        # On an interrupt, let the queued messages finish and record them.
+        executor.shutdown(wait=True)
+        try:
+            while in_flight:
+                settle()
+        finally:
+            pool.close()
+            # Hand the campaign back, finished or ready to resume.
+            checkpoint(status=campaign.status, finished_at=campaign.finished_at,
+                       claim_token=None, claimed_until=None)
+            campaign.claim_token = campaign.claimed_until = None
+    return sent, failed
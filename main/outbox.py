@@ -0,0 +1,121 @@
+"""
+Transactional email outbox.
+
+Views call enqueue_email() inside the transaction that makes the change the
+email reports, so a message exists if and only if the change was committed.
+`manage.py send_outbox` drains due messages in batches over one SMTP
+connection per batch, retrying failures with exponential backoff.
+Configured through the EMAIL_OUTBOX setting.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import OutboxEmail
+
+EMAIL_OUTBOX_DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 6,
+    # Retry n waits BACKOFF_BASE * 2**(n - 1) seconds, capped at BACKOFF_MAX.
+    'BACKOFF_BASE': 60,
+    'BACKOFF_MAX': 6 * 60 * 60,
+    # Claimed messages are hidden from other workers for this long, so a
+    # crashed worker's batch is picked up again afterwards.
+    'LEASE': 5 * 60,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {**EMAIL_OUTBOX_DEFAULTS, **getattr(settings, 'EMAIL_OUTBOX', {})}
+
+
+def enqueue_email(subject, template_name, context, to, from_email=None):
+    """Render ``template_name`` and queue it for ``to`` (a list of addresses)."""
+    html_body = render_to_string(template_name, context)
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=strip_tags(html_body),
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def backoff(attempts, config):
+    return timedelta(seconds=min(config['BACKOFF_BASE'] * 2 ** (attempts - 1), config['BACKOFF_MAX']))
+
+
+def claim_batch(batch_size, config):
+    """Lease up to ``batch_size`` due messages to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')
+        ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+        OutboxEmail.objects.filter(pk__in=ids).update(next_attempt_at=now + timedelta(seconds=config['LEASE']))
+        # Inside the transaction, so this is read from the primary.
+        return list(OutboxEmail.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to,
+                                     connection=connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Send one batch of due messages over a single connection. Returns
+    (sent, failed) counts; 0, 0 means the outbox has nothing due.
+    """
+    config = get_config()
+    emails = claim_batch(batch_size or config['BATCH_SIZE'], config)
+    if not emails:
+        return 0, 0
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as exc:
+        # Nothing can be sent; every message in the batch counts one attempt.
+        for email in emails:
+            _record_failure(email, exc, config)
+        return 0, len(emails)
+    try:
+        for email in emails:
+            try:
+                _message(email, connection).send()
+            except Exception as exc:
+                _record_failure(email, exc, config)
+                failed += 1
+            else:
+                email.status = 'sent'
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _record_failure(email, exc, config):
+    email.attempts += 1
+    email.last_error = f'{type(exc).__name__}: {exc}'
+    if email.attempts >= config['MAX_ATTEMPTS']:
+        email.status = 'failed'
+        logger.error('Giving up on outbox email %s after %s attempts: %s', email.pk, email.attempts, exc)
+    else:
+        email.next_attempt_at = timezone.now() + backoff(email.attempts, config)
+        logger.warning('Outbox email %s failed (attempt %s): %s', email.pk, email.attempts, exc)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
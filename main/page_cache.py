@@ -0,0 +1,214 @@
+"""
+Full-page cache for the pages every anonymous visitor sees the same way.
+
+Cached pages are keyed by URL and by a version stamp for each model the page
+renders. Saving or deleting a row replaces its model's stamp once the
+transaction commits (see main.signals), so the next request misses and
+re-renders; no TTL has to be guessed. Requests carrying a session or
+messages cookie (logged-in users, pending flash messages) bypass the cache.
+Configured through the PAGE_CACHE setting.
+"""
+import hashlib
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import get_resolver
+
+from .db_router import primary_reads
+
+PAGE_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    # Upper bound only; entries are normally replaced through the version stamps.
+    'TIMEOUT': 24 * 60 * 60,
+    # Change to drop every cached page, e.g. when templates change on deploy.
+    'KEY_PREFIX': 'page-cache',
+    # Cache alias every process reads, holding the version stamps (see
+    # shared_model_versions()); None keeps them in the default cache.
+    'SHARED_CACHE': 'shared',
+}
+
+# Models base.html renders on every page (see main.navigation).
+TEMPLATE_MODEL_LABELS = ('main.navigation',)
+
+OUTCOMES = ('hit', 'miss', 'bypass')
+
+# View name -> labels of the models it renders, filled in by cache_anonymous_page.
+cached_views = {}
+
+# Labels of the models whose stamps anything reads, filled in by
+# cache_anonymous_page and track_models() as the URLconf is imported. Saves of
+# other models (outbox emails, image variants, rollups) bump nothing.
+tracked_labels = set(TEMPLATE_MODEL_LABELS)
+
+
+def get_config():
+    return {**PAGE_CACHE_DEFAULTS, **getattr(settings, 'PAGE_CACHE', {})}
+
+
+def _version_key(label):
+    return f"{get_config()['KEY_PREFIX']}:version:{label}"
+
+
+def _stats_key(name, outcome):
+    return f"{get_config()['KEY_PREFIX']}:stats:{name}:{outcome}"
+
+
+def model_versions(labels, using=None):
+    """The current stamp of each model label in cache ``using``, creating missing ones."""
+    store = caches[using] if using else cache
+    keys = {_version_key(label): label for label in labels}
+    versions = store.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        # add() so concurrent first requests settle on the same stamp.
+        store.add(key, uuid.uuid4().hex, None)
+        versions[key] = store.get(key)
+    return [versions[key] for key in keys]
+
+
+def track_models(*models):
+    """Have saves and deletes of ``models`` replace their version stamps."""
+    tracked_labels.update(model._meta.label_lower for model in models)
+
+
+def is_tracked(model):
+    # A process that has not resolved a URL yet, such as a management command,
+    # has not imported the views that register their models.
+    get_resolver().url_patterns
+    return model._meta.label_lower in tracked_labels
+
+
+def shared_model_versions(labels):
+    """
+    model_versions() from the SHARED_CACHE alias, where bump_model_version()
+    replaces them, so they change everywhere when any process saves a row.
+    """
+    return model_versions(labels, using=get_config()['SHARED_CACHE'])
+
+
+def bump_model_version(model):
+    """Invalidate every cached page, fragment and shared result that renders ``model``."""
+    shared = get_config()['SHARED_CACHE']
+    store = caches[shared] if shared else cache
+    store.set(_version_key(model._meta.label_lower), uuid.uuid4().hex, None)
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Checked on cookies rather than request.user and the message storage,
+    # which would touch the session and add Vary: Cookie.
+    return (settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and CookieStorage.cookie_name not in request.COOKIES)
+
+
+def is_cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+        and 'no-store' not in response.get('Cache-Control', '')
+    )
+
+
+def page_key(request, labels):
+    url = request.build_absolute_uri()
+    # Shared stamps, so a save handled by any worker replaces the page in all.
+    digest = hashlib.md5('|'.join([url, *shared_model_versions(labels)]).encode()).hexdigest()
+    return f"{get_config()['KEY_PREFIX']}:page:{digest}"
+
+
+def record(name, outcome):
+    key = _stats_key(name, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(); losing one count is fine.
+        pass
+
+
+def page_cache_stats():
+    """{view name: {'hit': n, 'miss': n, 'bypass': n}} for every cached view."""
+    keys = {_stats_key(name, outcome): (name, outcome) for name in cached_views for outcome in OUTCOMES}
+    counts = cache.get_many(keys)
+    stats = {name: dict.fromkeys(OUTCOMES, 0) for name in cached_views}
+    for key, (name, outcome) in keys.items():
+        stats[name][outcome] = counts.get(key, 0)
+    return stats
+
+
+def reset_page_cache_stats():
+    cache.delete_many([_stats_key(name, outcome) for name in cached_views for outcome in OUTCOMES])
+
+
+def cache_anonymous_page(*models):
+    """
+    Serve the decorated view from the page cache for anonymous visitors. The
+    page is re-rendered whenever a row of one of ``models`` is saved or deleted.
+    Class-based views are wrapped after as_view(), as with cache_page.
+    """
+    labels = sorted({*TEMPLATE_MODEL_LABELS, *(model._meta.label_lower for model in models)})
+
+    def decorator(view):
+        name = getattr(view, 'view_class', view).__name__
+        cached_views[name] = labels
+        tracked_labels.update(labels)
+
+        def lookup(request):
+            """(cache key, cached response) or (None, None) when bypassing."""
+            if not get_config()['ENABLED'] or not is_cacheable_request(request):
+                record(name, 'bypass')
+                return None, None
+            key = page_key(request, labels)
+            cached = cache.get(key)
+            if cached is None:
+                record(name, 'miss')
+                return key, None
+            record(name, 'hit')
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return key, response
+
+        def finish(request, key, response, rendered):
+            if key is None:
+                response['X-Page-Cache'] = 'bypass'
+                return response
+            if rendered:
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                if is_cacheable_response(response):
+                    cache.set(key, (response.content, response['Content-Type']), get_config()['TIMEOUT'])
+                response['X-Page-Cache'] = 'miss'
+            # Cached HTML carries no CSRF token; base.html reads it from the
+            # cookie, which each visitor still needs to receive.
+            get_token(request)
+            return response
+
+        if iscoroutinefunction(view):
+            # The cache is used synchronously here too: Django's async cache
+            # methods would only move the same calls to a worker thread.
+            async def wrapper(request, *args, **kwargs):
+                key, response = lookup(request)
+                if response is not None:
+                    return finish(request, key, response, rendered=False)
+                with primary_reads():
+                    return finish(request, key, await view(request, *args, **kwargs), rendered=True)
+        else:
+            def wrapper(request, *args, **kwargs):
+                key, response = lookup(request)
+                if response is not None:
+                    return finish(request, key, response, rendered=False)
+                # Rendered from the primary: the page is stored under the
+                # current stamps, which a lagging replica may not match yet.
+                with primary_reads():
+                    return finish(request, key, view(request, *args, **kwargs), rendered=True)
+        return wraps(view)(wrapper)
+    return decorator
@@ -0,0 +1,149 @@
+"""
+Pagination for the blog and event archives.
+
+Page-number mode uses CachedCountPaginator, which keeps the COUNT(*) behind
+the page links in the cache for a short while. Cursor mode (``?cursor=`` or
+``?pagination=cursor``) seeks on an indexed (date, id) key instead of using
+OFFSET, so deep pages cost the same as the first one.
+"""
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'main.pagination.cursor'
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose total count is cached for PAGINATION_COUNT_CACHE_TIMEOUT seconds."""
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        key = 'paginator-count:' + hashlib.md5(str(query).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 60))
+        return count
+
+
+def encode_cursor(values, direction):
+    return signing.dumps({'v': [_dump(value) for value in values], 'd': direction},
+                         salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        return [_load(value) for value in data['v']], data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise Http404('Invalid page cursor.')
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+class KeysetPage:
+    """Quacks enough like a Page for the templates, plus the cursors to link to."""
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _seek(fields, values, forward):
+    """
+    Rows strictly after ``values`` in the (descending) ``fields`` order, or
+    strictly before them when going backwards.
+    """
+    lookup = 'lt' if forward else 'gt'
+    condition = Q()
+    for index, field in enumerate(fields):
+        equal = {fields[i]: values[i] for i in range(index)}
+        condition |= Q(**equal, **{f'{field}__{lookup}': values[index]})
+    return condition
+
+
+def keyset_paginate(queryset, fields, per_page, cursor=None):
+    """
+    Return a KeysetPage of ``queryset`` ordered by ``fields`` descending. The
+    last field must be unique (normally the primary key).
+    """
+    values, direction = decode_cursor(cursor) if cursor else (None, 'next')
+    if values is not None and len(values) != len(fields):
+        raise Http404('Invalid page cursor.')
+    forward = direction == 'next'
+
+    ordering = [f'-{field}' if forward else field for field in fields]
+    if values is not None:
+        queryset = queryset.filter(_seek(fields, values, forward))
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    def key(obj):
+        return [getattr(obj, field) for field in fields]
+
+    has_next = more if forward else True
+    has_previous = values is not None if forward else more
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(key(rows[-1]), 'next') if rows and has_next else None,
+        previous_cursor=encode_cursor(key(rows[0]), 'prev') if rows and has_previous else None,
+    )
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin adding cursor pagination over ``keyset_fields``, used when
+    the request carries ``cursor`` or ``pagination=cursor``. Page-number
+    pagination stays the default.
+    """
+    keyset_fields = ('id',)
+    paginator_class = CachedCountPaginator
+
+    def use_keyset(self):
+        return 'cursor' in self.request.GET or self.request.GET.get('pagination') == 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset():
+            return super().paginate_queryset(queryset, page_size)
+        page = keyset_paginate(queryset, self.keyset_fields, page_size, self.request.GET.get('cursor'))
+        return None, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,179 @@
+"""
+Incremental per-day and per-hour statistics for the admin dashboard.
+
+`manage.py rollup_stats` folds rows whose primary key is above the stored
+watermark into StatRollup, so each run only reads the rows added since the
+previous one. Rows are assumed to be immutable once counted; deletions are
+only reflected after `manage.py rollup_stats --rebuild`.
+
+That holds for the append-only tables in ROLLUP_SOURCES, which are also the
+ones that grow without bound. Blog posts, services and events are edited in
+place (dates, categories), so the dashboard keeps reading them live.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import ExtractHour, TruncDay, TruncHour, TruncMonth
+
+from .models import ContactMessage, Event, EventRegistration, RollupWatermark, StatRollup
+
+# entity -> (model, timestamp field, optional dimension field)
+ROLLUP_SOURCES = {
+    'contactmessage': (ContactMessage, 'created_at', None),
+    'eventregistration': (EventRegistration, 'registration_date', 'event_id'),
+}
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'hour': TruncHour,
+}
+
+
+def fold_entity(entity, batch_size=50000):
+    """Fold rows added since the watermark into the rollups. Returns the number of rows folded."""
+    model, date_field, dimension_field = ROLLUP_SOURCES[entity]
+    folded = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(entity=entity)
+            batch = model.objects.filter(pk__gt=watermark.last_id).order_by('pk')
+            upper = batch.values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+            if upper is None:
+                upper = batch.aggregate(upper=Max('pk'))['upper']
+            if upper is None:
+                return folded
+            rows = batch.filter(pk__lte=upper)
+
+            for granularity, trunc in GRANULARITIES.items():
+                group_by = ['bucket'] + ([dimension_field] if dimension_field else [])
+                counts = rows.order_by().annotate(bucket=trunc(date_field)).values(*group_by).annotate(
+                    count=Count('pk')
+                )
+                counts = [
+                    (row['bucket'], str(row[dimension_field]) if dimension_field else '', row['count'])
+                    for row in counts
+                ]
+                _add_counts(entity, granularity, counts)
+
+            folded += sum(count for _, _, count in counts)
+            watermark.last_id = upper
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def _add_counts(entity, granularity, counts):
+    if not counts:
+        return
+    existing = {
+        (rollup.bucket, rollup.dimension): rollup
+        for rollup in StatRollup.objects.filter(
+            entity=entity,
+            granularity=granularity,
+            bucket__in={bucket for bucket, _, _ in counts},
+        )
+    }
+    created, updated = [], []
+    for bucket, dimension, count in counts:
+        rollup = existing.get((bucket, dimension))
+        if rollup is None:
+            created.append(StatRollup(entity=entity, granularity=granularity, bucket=bucket,
+                                      dimension=dimension, count=count))
+        else:
+            rollup.count += count
+            updated.append(rollup)
+    StatRollup.objects.bulk_create(created)
+    StatRollup.objects.bulk_update(updated, ['count'])
+
+
+def rebuild_entity(entity):
+    with transaction.atomic():
+        StatRollup.objects.filter(entity=entity).delete()
+        RollupWatermark.objects.filter(entity=entity).delete()
+    return fold_entity(entity)
+
+
+def _rollups(entity, granularity='day'):
+    return StatRollup.objects.filter(entity=entity, granularity=granularity)
+
+
+def _unfolded(entity):
+    """Rows newer than the watermark; a short tail when rollup_stats runs regularly."""
+    model = ROLLUP_SOURCES[entity][0]
+    last_id = RollupWatermark.objects.filter(entity=entity).values_list('last_id', flat=True).first()
+    return model.objects.filter(pk__gt=last_id or 0)
+
+
+def count_on(entity, day):
+    """Rows of ``entity`` dated ``day``, from the rollups plus the unfolded tail."""
+    date_field = ROLLUP_SOURCES[entity][1]
+    rolled = _rollups(entity).filter(bucket__date=day).aggregate(total=Sum('count'))['total'] or 0
+    return rolled + _unfolded(entity).filter(**{f'{date_field}__date': day}).count()
+
+
+def total(entity):
+    rolled = _rollups(entity).aggregate(total=Sum('count'))['total'] or 0
+    return rolled + _unfolded(entity).count()
+
+
+def _merge(rolled, unfolded):
+    """Add the (key, count) pairs of the unfolded tail to the rolled-up ones."""
+    merged = dict(rolled)
+    for key, count in unfolded:
+        merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def counts_by_month(entity):
+    date_field = ROLLUP_SOURCES[entity][1]
+    merged = _merge(
+        _rollups(entity).annotate(month=TruncMonth('bucket')).values('month').annotate(
+            count=Sum('count')
+        ).values_list('month', 'count'),
+        _unfolded(entity).annotate(month=TruncMonth(date_field)).values('month').annotate(
+            count=Count('pk')
+        ).values_list('month', 'count'),
+    )
+    return sorted(merged.items())
+
+
+def counts_by_hour_of_day(entity):
+    date_field = ROLLUP_SOURCES[entity][1]
+    merged = _merge(
+        _rollups(entity, 'hour').annotate(hour=ExtractHour('bucket')).values('hour').annotate(
+            count=Sum('count')
+        ).values_list('hour', 'count'),
+        _unfolded(entity).annotate(hour=ExtractHour(date_field)).values('hour').annotate(
+            count=Count('pk')
+        ).values_list('hour', 'count'),
+    )
+    return sorted(merged.items())
+
+
+def _registrations_per_event():
+    """{event id: registrations}, from the rollups plus the unfolded tail."""
+    return _merge(
+        ((int(dimension), count) for dimension, count in _rollups('eventregistration').values(
+            'dimension'
+        ).annotate(count=Sum('count')).values_list('dimension', 'count')),
+        _unfolded('eventregistration').values('event_id').annotate(
+            count=Count('pk')
+        ).values_list('event_id', 'count'),
+    )
+
+
+def registrations_by_event(limit=10):
+    by_event = sorted(_registrations_per_event().items(), key=lambda item: item[1], reverse=True)[:limit]
+    titles = dict(Event.objects.filter(pk__in=[pk for pk, _ in by_event]).values_list('pk', 'title'))
+    return [
+        {'title': titles[pk], 'registration_count': count}
+        for pk, count in by_event if pk in titles
+    ]
+
+
+def registrations_by_location(limit=10):
+    locations = dict(Event.objects.values_list('pk', 'location'))
+    by_location = {}
+    for pk, count in _registrations_per_event().items():
+        location = locations.get(pk)
+        if location is not None:
+            by_location[location] = by_location.get(location, 0) + count
+    ranked = sorted(by_location.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'event__location': location, 'count': count} for location, count in ranked]
@@ -3,10 +3,10 @@ from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from . import consumers
 
+websocket_urlpatterns = [
+    re_path(r'ws/dashboard/$', consumers.DashboardConsumer.as_asgi()),
+]
+
 application = ProtocolTypeRouter({
-    'websocket': AuthMiddlewareStack(
-        URLRouter([
-            re_path(r'ws/dashboard/$', consumers.DashboardConsumer.as_asgi()),
-        ])
-    ),
-}) 
\ No newline at end of file
+    'websocket': AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+})
@@ -0,0 +1,98 @@
+"""
+Blog search backed by an SQLite FTS5 index (migration 0005), ranked with bm25
+and returning highlighted snippets. Other database backends, or SQLite builds
+without FTS5, fall back to the LIKE search.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Func, Lookup, Q, TextField, Value
+
+from .models import BlogPostSearchIndex
+
+BLOG_FTS_TABLE = BlogPostSearchIndex._meta.db_table
+
+# BlogPost fields copied into the index by the triggers of migration 0005, in
+# column order.
+BLOG_FTS_FIELDS = ('title', 'content', 'meta_description')
+
+# Markers put around matches by snippet(); the template filter highlight_snippet
+# escapes the text and turns them into <mark> tags.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# bm25 column weights for title, content and meta_description.
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+@BlogPostSearchIndex._meta.get_field('document').register_lookup
+class Match(Lookup):
+    """``search_index__document__match``: the FTS5 MATCH operator."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class BM25(Func):
+    function = 'bm25'
+    output_field = FloatField()
+
+
+class Snippet(Func):
+    function = 'snippet'
+    output_field = TextField()
+
+
+# Database NAME -> whether it has the FTS table; the migration decides it
+# once, so it is not introspected on every search.
+_fts_available = {}
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_available:
+        with connection.cursor() as cursor:
+            _fts_available[name] = BLOG_FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_available[name]
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query that matches every word as a prefix.
+    Words are quoted so user input cannot use FTS5 query syntax.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def like_search(queryset, text):
+    return queryset.filter(
+        Q(title__icontains=text) |
+        Q(content__icontains=text) |
+        Q(meta_description__icontains=text)
+    )
+
+
+def search_blog_posts(queryset, text):
+    """
+    Filter ``queryset`` to posts matching ``text``. With the FTS index the
+    posts are annotated with ``search_rank`` (lower is better) and
+    ``search_snippet``, and ordered by rank.
+    """
+    match = fts_query(text)
+    if not match or not fts_available():
+        return like_search(queryset, text).order_by('-published_date')
+
+    document = F('search_index__document')
+    # The filter joins the index on rowid, so the MATCH runs once for the
+    # whole query and bm25() and snippet() read the hit of the row being
+    # selected.
+    return queryset.filter(search_index__document__match=match).annotate(
+        search_rank=BM25(document, *map(Value, BM25_WEIGHTS)),
+        search_snippet=Snippet(document, Value(-1), Value(HIGHLIGHT_START), Value(HIGHLIGHT_END), Value('…'),
+                               Value(24)),
+    ).order_by('search_rank', '-published_date')
@@ -0,0 +1,107 @@
+import logging
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import page_cache
+from .dashboard import DASHBOARD_EVENTS_GROUP
+from .models import BlogPost, ContactMessage, Event, EventRegistration, Testimonial
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_MODELS = (ContactMessage, BlogPost, Event, EventRegistration, Testimonial)
+
+
+def publish_dashboard_event(event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(DASHBOARD_EVENTS_GROUP, {
+            'type': 'dashboard.event',
+            **event,
+        })
+    except Exception:
+        # The live dashboard must never break a form submission.
+        logger.exception('Could not publish dashboard event')
+
+
+def dashboard_event(instance, action):
+    """
+    The change event for ``instance``, with the fields dashboard.apply_event()
+    needs to apply a new row as an increment. Whether a contact message brings
+    a new client is left to the broadcaster (see dashboard.contact_novelty()).
+    """
+    event = {
+        'model': instance._meta.model_name,
+        'action': action,
+        'pk': instance.pk,
+    }
+    if action != 'created':
+        return event
+    if isinstance(instance, Testimonial):
+        event['client_name'] = instance.client_name
+        # As read back from the DecimalField, e.g. "5.0".
+        event['rating'] = str(Decimal(str(instance.rating)).quantize(Decimal('0.1')))
+    elif isinstance(instance, BlogPost):
+        event.update({
+            'title': instance.title,
+            'is_published': instance.is_published,
+            'read_time': instance.read_time,
+            'created_date': instance.created_date.isoformat(),
+            'published_date': instance.published_date.isoformat(),
+        })
+    return event
+
+
+@receiver(post_save)
+def dashboard_model_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or sender not in DASHBOARD_MODELS:
+        return
+    event = dashboard_event(instance, 'created' if created else 'updated')
+    # Only announce changes the dashboard queries can already see.
+    transaction.on_commit(lambda: publish_dashboard_event(event))
+
+
+@receiver(post_delete)
+def dashboard_model_deleted(sender, instance, **kwargs):
+    if sender not in DASHBOARD_MODELS:
+        return
+    event = dashboard_event(instance, 'deleted')
+    transaction.on_commit(lambda: publish_dashboard_event(event))
+
+
+@receiver(post_delete, sender=EventRegistration)
+def registration_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the event itself deletes its seat counter too.
+    if instance.holds_seat and not isinstance(origin, Event):
+        instance.hand_over_seat()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def page_cache_model_changed(sender, **kwargs):
+    if not page_cache.is_tracked(sender):
+        return
+    # After commit, so a page rendered from the old rows cannot be stored
+    # under the new stamp.
+    transaction.on_commit(lambda: page_cache.bump_model_version(sender))
+
+
+@receiver(m2m_changed)
+def page_cache_relation_changed(sender, instance, action, model, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    changed = [changed for changed in (type(instance), model) if page_cache.is_tracked(changed)]
+    if not changed:
+        return
+
+    def bump():
+        for changed_model in changed:
+            page_cache.bump_model_version(changed_model)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,99 @@
+"""
+Static file storage that writes content-hashed names (so they can be cached
+forever) plus precompressed ``.gz`` and ``.br`` siblings for text assets.
+Served by main.assets.serve_static or any front-end server that understands
+precompressed files (e.g. nginx ``gzip_static``/``brotli_static``).
+"""
+import gzip
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ico', '.ttf', '.otf', '.eot',
+}
+# Below this size the headers cost more than compression saves.
+MIN_COMPRESS_SIZE = 256
+
+
+def gzip_bytes(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_bytes(data):
+    return brotli.compress(data, quality=11)
+
+
+def encoders():
+    """(suffix, compress function) for every encoding available here."""
+    available = [('.gz', gzip_bytes)]
+    if brotli is not None:
+        available.insert(0, ('.br', brotli_bytes))
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses the hashed files after collectstatic."""
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # A reference to an asset that was never added keeps its unhashed
+            # URL (and 404s, as it would without this storage) rather than
+            # failing collectstatic or the page that renders it.
+            if content is not None:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        if brotli is None:
+            logger.warning('brotli is not installed; only .gz static files will be written')
+        candidates = sorted({
+            name for name in hashed_names
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+        })
+        workers = getattr(settings, 'STATICFILES_COMPRESS_WORKERS', None)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for name, written in zip(candidates, pool.map(self.compress_file, candidates)):
+                for compressed_name in written:
+                    yield name, compressed_name, True
+
+    def compress_file(self, name):
+        """Write the compressed siblings of ``name`` worth keeping and return their names."""
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+        written = []
+        for suffix, compress in encoders():
+            compressed = compress(data)
+            # Skip encodings that barely help; the plain file is served instead.
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            written.append(compressed_name)
+        return written
@@ -1,6 +1,12 @@
 from django import template
+from django.utils.html import escape, format_html, format_html_join
+from django.utils.safestring import mark_safe
 import calendar
 
+from main.images import variants_for_many
+from main.navigation import active_index, get_navigation_tree, render_fragment
+from main.search import HIGHLIGHT_END, HIGHLIGHT_START
+
 register = template.Library()
 
 @register.filter(name='multiply')
@@ -26,4 +32,72 @@ def filter_events(events, event_type):
     """Filter events by event type"""
     if not events:
         return []
-    return [event for event in events if event.event_type == event_type] 
\ No newline at end of file
+    return [event for event in events if event.event_type == event_type]
+
+@register.filter
+def highlight_snippet(snippet):
+    """Escape a search snippet and wrap the matched words in <mark> tags"""
+    if not snippet:
+        return ''
+    return mark_safe(
+        escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    )
+
+@register.filter
+def elided_page_range(page):
+    """Page numbers around the current page, so deep archives don't list every page"""
+    return page.paginator.get_elided_page_range(page.number)
+
+
+def _image_name(image):
+    name = getattr(image, 'name', None)
+    return name if isinstance(name, str) else None
+
+@register.simple_tag(takes_context=True)
+def preload_image_variants(context, objects, field):
+    """Look up the variants of every ``field`` image in ``objects`` at once, before a loop"""
+    names = [_image_name(getattr(obj, field)) for obj in objects]
+    context.render_context.setdefault('image_variants', {}).update(variants_for_many(names))
+    return ''
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, image, alt='', sizes='100vw', **attrs):
+    """
+    <picture> with WebP and JPEG srcsets for an ImageField value, falling back
+    to a plain <img> of the original until its variants exist.
+    """
+    name = _image_name(image)
+    if not name:
+        return ''
+    known = context.render_context.get('image_variants', {})
+    variants = known[name] if name in known else variants_for_many([name])[name]
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    if not variants:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', image.url, alt, extra)
+
+    def srcset(image_format):
+        return ', '.join(f'{url} {width}w' for fmt, width, _, url in variants if fmt == image_format)
+
+    # The largest JPEG doubles as the src for browsers without srcset support.
+    _, width, height, url = [variant for variant in variants if variant[0] == 'jpeg'][-1]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async"{}>'
+        '</picture>',
+        srcset('webp'), sizes, url, srcset('jpeg'), sizes, width, height, alt, extra,
+    )
+
+
+@register.simple_tag(takes_context=True)
+def site_header(context):
+    """The cached navigation bar, with the section of the current page marked active"""
+    request = context.get('request')
+    path = request.path if request else ''
+    return mark_safe(render_fragment('main/includes/header.html', {
+        'active': active_index(get_navigation_tree(), path),
+    }))
+
+@register.simple_tag
+def site_footer():
+    """The cached site footer"""
+    return mark_safe(render_fragment('main/includes/footer.html'))
@@ -1,3 +1,1716 @@
-from django.test import TestCase
+import ast
+import asyncio
+import copy
+import gzip
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO, StringIO
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.db import OperationalError, connection, connections, transaction
+from django.test import AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from unittest import mock, skipUnless
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import rollups, views
+from .admin_views import live_message_stats, rollup_message_stats
+from .assets import RangeNotSatisfiable, parse_range, serve_media, serve_static
+from .benchmark import percentile
+from .channel_layers import SQLiteChannelLayer
+from .consumers import DashboardConsumer
+from .dashboard import DASHBOARD_EVENTS_GROUP, DASHBOARD_GROUP, DashboardBroadcaster, apply_event, contact_novelty
+from .dashboard import get_dashboard_data, get_dashboard_state
+from .dashboard_protocol import SUBPROTOCOL_JSON, diff, encode, negotiate, patch_message
+from .db_router import sync_sqlite_replica
+from .middleware import PrimaryPinMiddleware, QueryProfilerMiddleware
+from .images import variants_for_many
+from .models import (
+    FAQ, BlogCategory, BlogPost, BlogPostSearchIndex, BlogTag, ContactMessage, Event, EventRegistration, Gallery,
+    GalleryTag, ImageVariant, Navigation, Newsletter, NewsletterCampaign, OutboxEmail, Service, ServiceCategory,
+    TeamMember, Testimonial
+)
+from .newsletter import CampaignUnavailable, send_campaign
+from .navigation import build_navigation_tree, get_navigation_tree
+from .outbox import deliver_batch
+from .page_cache import page_cache_stats
+from .pagination import CachedCountPaginator, encode_cursor, keyset_paginate
+from .storage import CompressedManifestStaticFilesStorage
+from .search import BLOG_FTS_FIELDS, BLOG_FTS_TABLE, BM25_WEIGHTS, HIGHLIGHT_END, HIGHLIGHT_START
+from .search import fts_available, search_blog_posts
+from .tiered_cache import TieredCache
+
+
+def create_dashboard_rows(count):
+    author, _ = User.objects.get_or_create(username='author')
+    category, _ = ServiceCategory.objects.get_or_create(name='AI', icon='fas fa-robot')
+    now = timezone.now()
+    start = Service.objects.count()
+    for i in range(start, start + count):
+        ContactMessage.objects.create(
+            name=f'Client {i}', email=f'client{i}@example.com', phone='123',
+            company_name=f'Company {i % 3}', subject='Hello', message='Hi',
+        )
+        BlogPost.objects.create(
+            title=f'Post {i}', content='Body', author=author, is_published=i % 2 == 0, read_time=4,
+        )
+        event = Event.objects.create(
+            title=f'Event {i}', description='Event', date=now + timedelta(days=i + 1), location='Sunderland',
+        )
+        EventRegistration.objects.create(event=event, name='Guest', email=f'guest{i}@example.com', phone='1')
+        Testimonial.objects.create(client_name=f'Client {i}', company='ACME', content='Great', rating=i % 5 + 1)
+        Service.objects.create(title=f'Service {i}', category=category, description='d',
+                               short_description='s', slug=f'service-{i}')
+
+
+class DashboardDataTests(TestCase):
+    # The old implementation issued ~25 queries per snapshot.
+    QUERY_BUDGET = 10
+
+    def test_query_count_stays_within_budget(self):
+        create_dashboard_rows(3)
+        with CaptureQueriesContext(connection) as small:
+            get_dashboard_data()
+        create_dashboard_rows(10)
+        with CaptureQueriesContext(connection) as large:
+            get_dashboard_data()
+
+        self.assertLessEqual(len(small), self.QUERY_BUDGET)
+        self.assertEqual(len(small), len(large))
+
+    def test_aggregates(self):
+        create_dashboard_rows(5)
+        ContactMessage.objects.create(name='Again', email='client0@example.com', phone='1',
+                                      subject='Again', message='Hi')
+
+        data = get_dashboard_data()
+
+        self.assertEqual(data['total_clients'], 5)
+        # Three named companies plus the message without one.
+        self.assertEqual(data['stats_details']['unique_companies'], 4)
+        self.assertEqual(data['total_posts'], 3)
+        self.assertEqual(data['upcoming_events'], 5)
+        self.assertEqual(len(data['stats_details']['next_events']), 5)
+        self.assertEqual(data['stats_details']['total_registrations'], 5)
+        self.assertEqual(data['stats_details']['total_ratings'], 5)
+        self.assertEqual(data['ratings_data']['values'], [1, 1, 1, 1, 1])
+        self.assertEqual(data['avg_rating'], 3.0)
+        self.assertEqual(data['stats_details']['avg_read_time'], 4.0)
+        self.assertEqual(data['services_data'], {'labels': ['AI'], 'values': [5]})
+        self.assertEqual(len(data['recent_activity']), 5)
+
+
+
+class DashboardEventTests(TestCase):
+    def setUp(self):
+        create_dashboard_rows(4)
+        self.author = User.objects.get(username='author')
+        now = timezone.now()
+        self.enterContext(mock.patch('main.dashboard.timezone.now', return_value=now))
+
+    def published_events(self, change):
+        """The dashboard events published for ``change()``, which are only sent on commit."""
+        with mock.patch('main.signals.publish_dashboard_event') as publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                change()
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        return [call.args[0] for call in publish.call_args_list]
+
+    def message(self, email, company):
+        return lambda: ContactMessage.objects.create(name='Client', email=email, phone='1', company_name=company,
+                                                     subject='Hi', message='Hi')
+
+    def post(self, **fields):
+        return lambda: BlogPost.objects.create(title='A new post with rather a long title', content='Body',
+                                               author=self.author, read_time=7, **fields)
+
+    def test_increments_match_a_recompute(self):
+        data, totals = get_dashboard_state()
+        registration = EventRegistration.objects.first()
+        changes = {
+            'new client': self.message('new@example.com', 'New Co'),
+            'returning client': self.message('client0@example.com', 'Company 0'),
+            'first message without a company': self.message('other@example.com', None),
+            'second message without a company': self.message('third@example.com', None),
+            'testimonial': lambda: Testimonial.objects.create(client_name='Reviewer', company='ACME',
+                                                              content='Good', rating=4.5),
+            'published post': self.post(is_published=True),
+            'draft': self.post(),
+            'registration': lambda: EventRegistration.objects.create(
+                event=registration.event, name='Guest', email='another@example.com', phone='1'),
+            'cancelled registration': registration.delete,
+        }
+        for name, change in changes.items():
+            with self.subTest(name):
+                event, = self.published_events(change)
+                if event['model'] == 'contactmessage':
+                    event.update(contact_novelty(event['pk']))
+                self.assertTrue(apply_event(data, totals, event))
+                self.assertEqual((data, totals), get_dashboard_state())
+
+    def test_other_changes_fall_back_to_a_recompute(self):
+        data, totals = get_dashboard_state()
+        event, = self.published_events(self.post(is_published=True,
+                                                 published_date=timezone.now() - timedelta(days=30)))
+        events = [
+            {'model': 'event', 'action': 'created', 'pk': 1},
+            {'model': 'testimonial', 'action': 'updated', 'pk': 1},
+            {'model': 'contactmessage', 'action': 'deleted', 'pk': 1},
+            # Created and deleted again before the broadcaster looked it up.
+            {'model': 'contactmessage', 'action': 'created', 'pk': 1},
+            # Published with a date inside the blog chart, which keeps no dates.
+            event,
+        ]
+        for event in events:
+            with self.subTest(event):
+                self.assertFalse(apply_event(copy.deepcopy(data), copy.deepcopy(totals), event))
+
+    def test_saves_run_no_dashboard_queries(self):
+        # New clients and companies are worked out by the broadcaster, if any.
+        with self.assertNumQueries(1):
+            self.message('new@example.com', 'New Co')()
+
+
+class DashboardBroadcasterTests(SimpleTestCase):
+    EVENT = {'model': 'event', 'action': 'updated', 'pk': 1}
+
+    def broadcaster(self, compute):
+        """A broadcaster with a snapshot, whose recomputes call ``compute(n)``."""
+        calls = []
+
+        def get_dashboard_state():
+            calls.append(1)
+            compute(len(calls))
+            return {'recomputes': len(calls)}, {}
+
+        self.enterContext(mock.patch('main.dashboard.get_dashboard_state', side_effect=get_dashboard_state))
+        broadcaster = DashboardBroadcaster(debounce=0.05)
+        broadcaster.latest, broadcaster.totals = {'recomputes': 0}, {}
+        return broadcaster, calls
+
+    def test_a_burst_of_events_is_one_recompute(self):
+        broadcaster, calls = self.broadcaster(lambda n: None)
+
+        async def burst():
+            for _ in range(5):
+                await broadcaster.handle_event(self.EVENT)
+            await broadcaster._refresh
+
+        async_to_sync(burst)()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(broadcaster.latest, {'recomputes': 1})
+
+    def test_changes_during_a_recompute_make_it_run_again(self):
+        querying, release = threading.Event(), threading.Event()
+
+        def compute(n):
+            if n == 1:
+                querying.set()
+                release.wait(5)
+
+        broadcaster, calls = self.broadcaster(compute)
+
+        async def change_while_querying():
+            await broadcaster.handle_event(self.EVENT)
+            await asyncio.get_running_loop().run_in_executor(None, querying.wait, 5)
+            await broadcaster.handle_event(self.EVENT)
+            release.set()
+            await broadcaster._refresh
+
+        async_to_sync(change_while_querying)()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(broadcaster.latest, {'recomputes': 2})
+
+    @override_settings(DASHBOARD_BROADCASTER='embedded')
+    def test_sockets_share_one_producer_until_the_last_disconnects(self):
+        broadcaster, calls = self.broadcaster(lambda n: None)
+        broadcaster.latest = broadcaster.totals = None
+        self.enterContext(mock.patch('main.consumers.broadcaster', broadcaster))
+        user = mock.Mock(is_authenticated=True, is_staff=True)
+
+        async def receive_json(communicator):
+            message = await communicator.receive_output(5)
+            self.assertEqual(message['type'], 'websocket.send')
+            return json.loads(message['text'])
+
+        async def dashboards(sockets):
+            communicators = []
+            for _ in range(sockets):
+                communicator = ApplicationCommunicator(DashboardConsumer.as_asgi(), {
+                    'type': 'websocket', 'path': '/ws/dashboard/', 'headers': [], 'subprotocols': [],
+                    'user': user,
+                })
+                await communicator.send_input({'type': 'websocket.connect'})
+                self.assertEqual((await communicator.receive_output(5))['type'], 'websocket.accept')
+                communicators.append(communicator)
+            # Whether it arrived as the broadcast or on connect, every socket
+            # gets the one snapshot the broadcaster computed on start.
+            self.assertEqual([await receive_json(c) for c in communicators], [{'recomputes': 1}] * sockets)
+
+            await get_channel_layer().group_send(DASHBOARD_EVENTS_GROUP, {
+                'type': 'dashboard.event', 'model': 'event', 'action': 'updated', 'pk': 1,
+            })
+            self.assertEqual([await receive_json(c) for c in communicators], [{'recomputes': 2}] * sockets)
+            self.assertEqual(len(calls), 2)
+
+            task = broadcaster._task
+            for communicator in communicators:
+                self.assertFalse(task.done())
+                await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+                await communicator.wait(5)
+            with self.assertRaises(asyncio.CancelledError):
+                await asyncio.wait_for(asyncio.shield(task), 5)
+            self.assertIsNone(broadcaster._task)
+            self.assertIsNone(broadcaster.latest)
+
+        async_to_sync(dashboards)(3)
+        self.assertEqual(len(calls), 2)
+
+
+class RollupTests(TestCase):
+    def test_rollup_charts_include_rows_added_since_the_last_fold(self):
+        create_dashboard_rows(3)
+        for entity in rollups.ROLLUP_SOURCES:
+            rollups.fold_entity(entity)
+        create_dashboard_rows(2)
+        today = timezone.now().date()
+        live = live_message_stats(today, today - timedelta(days=1))
+        rolled = rollup_message_stats(today, today - timedelta(days=1))
+        for key in ('messages_by_month', 'messages_by_hour', 'event_stats', 'geo_distribution'):
+            self.assertCountEqual(json.loads(rolled[key]), json.loads(live[key]), key)
+        self.assertEqual(rolled['total_messages'], 5)
+        self.assertEqual(sum(count for _, count in json.loads(rolled['messages_by_month'])), 5)
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        self.assertEqual(percentile(range(1, 11), 0.50), 5)
+        self.assertEqual(percentile(range(1, 101), 0.95), 95)
+        self.assertEqual(percentile(range(1, 101), 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+
+def apply_patch(document, ops):
+    """Apply diff() operations the way a dashboard client does."""
+    document = json.loads(json.dumps(document))
+    for op in ops:
+        *parents, last = [part.replace('~1', '/').replace('~0', '~') for part in op['path'].split('/')[1:]]
+        target = document
+        for part in parents:
+            target = target[part]
+        if op['op'] == 'remove':
+            del target[last]
+        else:
+            target[last] = op['value']
+    return document
+
+
+class DashboardProtocolTests(SimpleTestCase):
+    def test_diff_turns_the_old_snapshot_into_the_new_one(self):
+        old = {'total_posts': 3, 'stats': {'a/b': 1, 'gone': 2, 'same': [1, 2]}, 'list': [1, 2]}
+        new = {'total_posts': 4, 'stats': {'a/b': 5, 'same': [1, 2], 'new~': 0}, 'list': [1, 2, 3]}
+        ops = diff(old, new)
+        self.assertEqual(apply_patch(old, ops), new)
+        self.assertCountEqual(ops, [
+            {'op': 'replace', 'path': '/total_posts', 'value': 4},
+            {'op': 'replace', 'path': '/stats/a~1b', 'value': 5},
+            {'op': 'remove', 'path': '/stats/gone'},
+            {'op': 'add', 'path': '/stats/new~0', 'value': 0},
+            {'op': 'replace', 'path': '/list', 'value': [1, 2, 3]},
+        ])
+        self.assertEqual(diff(new, new), [])
+
+    def test_negotiation_and_encoding(self):
+        self.assertIsNone(negotiate(['chat']))
+        self.assertEqual(negotiate(['chat', SUBPROTOCOL_JSON]), SUBPROTOCOL_JSON)
+        encoded = encode(patch_message([], 7), SUBPROTOCOL_JSON)
+        self.assertEqual(json.loads(encoded['text_data']), {'v': 1, 'type': 'patch', 'seq': 7, 'ops': []})
+
+def create_list_rows(count):
+    author, _ = User.objects.get_or_create(username='author', defaults={'first_name': 'Ada'})
+    start = BlogPost.objects.count()
+    now = timezone.now()
+    for i in range(start, start + count):
+        category = BlogCategory.objects.create(name=f'Category {i}', slug=f'category-{i}')
+        tag = BlogTag.objects.create(name=f'Tag {i}', slug=f'tag-{i}')
+        post = BlogPost.objects.create(title=f'Post {i}', content='Body', author=author, is_published=True)
+        post.categories.add(category)
+        post.tags.add(tag)
+        gallery_tag = GalleryTag.objects.create(name=f'Tag {i}', slug=f'tag-{i}')
+        gallery = Gallery.objects.create(image='gallery/test.png', alt_text=f'Image {i}')
+        gallery.tags.add(gallery_tag)
+        event = Event.objects.create(title=f'Event {i}', description='Event', date=now + timedelta(days=i),
+                                     location='Sunderland')
+        EventRegistration.objects.create(event=event, name=f'Guest {i}', email=f'guest{i}@example.com', phone='1')
+
+
+class ListQueryCountTests(TestCase):
+    """The number of queries behind each list page must not grow with its rows."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def query_count(self, url, client=None):
+        # The paginator's cached count would make the second request cheaper.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, login=False):
+        if login:
+            self.client.force_login(self.admin)
+        create_list_rows(2)
+        few = self.query_count(url)
+        create_list_rows(6)
+        many = self.query_count(url)
+        self.assertEqual(few, many, f'{url} runs a query per row')
+
+    def test_blog_list(self):
+        self.assertConstantQueries(reverse('main:blog_list'))
+
+    def test_blog_search(self):
+        self.assertConstantQueries(reverse('main:blog_list') + '?search=post')
+
+    def test_gallery_list(self):
+        self.assertConstantQueries(reverse('main:gallery_list'))
+
+    def test_event_list(self):
+        self.assertConstantQueries(reverse('main:event_list'))
+
+    def test_home(self):
+        self.assertConstantQueries(reverse('main:home'))
+
+    def test_blog_admin(self):
+        self.assertConstantQueries(reverse('admin:main_blogpost_changelist'), login=True)
+
+    def test_registration_admin(self):
+        self.assertConstantQueries(reverse('admin:main_eventregistration_changelist'), login=True)
+
+
+
+class BlogSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+
+    def post(self, title, content='Body', **fields):
+        return BlogPost.objects.create(title=title, content=content, author=self.author, is_published=True,
+                                       read_time=4, **fields)
+
+    def search(self, text):
+        return list(search_blog_posts(BlogPost.objects.all(), text))
+
+    def test_title_matches_rank_above_content_matches(self):
+        self.post('Gardening notes', content='Robots can help in the garden too.')
+        self.post('Robots in the warehouse')
+        results = self.search('robot')
+        self.assertEqual([post.title for post in results], ['Robots in the warehouse', 'Gardening notes'])
+        self.assertLess(results[0].search_rank, results[1].search_rank)
+
+    def test_snippets_mark_the_matching_words(self):
+        self.post('Notes', content='Our new robot sorts parcels overnight.')
+        [post] = self.search('robot')
+        self.assertIn(f'{HIGHLIGHT_START}robot{HIGHLIGHT_END}', post.search_snippet)
+        response = self.client.get(reverse('main:blog_list') + '?search=robot')
+        self.assertContains(response, '<mark>robot</mark>')
+
+    def test_matches_in_one_join(self):
+        self.post('Robots')
+        sql = str(search_blog_posts(BlogPost.objects.all(), 'robot').query)
+        self.assertEqual(sql.count('MATCH'), 1)
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        post = self.post('Robots')
+        self.assertEqual(self.search('robot'), [post])
+        post.title = 'Drones'
+        post.save()
+        self.assertEqual(self.search('robot'), [])
+        self.assertEqual(self.search('drone'), [post])
+        post.delete()
+        self.assertEqual(self.search('drone'), [])
+
+    def test_index_columns_and_triggers_follow_the_model(self):
+        # Renamed or retyped BlogPost fields make Django rebuild the table on
+        # SQLite, which drops the triggers; the index then needs a migration too.
+        table = BlogPost._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA table_info({BLOG_FTS_TABLE})')
+            columns = tuple(row[1] for row in cursor.fetchall())
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [table])
+            triggers = dict(cursor.fetchall())
+        self.assertEqual(columns, BLOG_FTS_FIELDS)
+        self.assertEqual(len(BM25_WEIGHTS), len(BLOG_FTS_FIELDS))
+        for name in BLOG_FTS_FIELDS:
+            self.assertEqual(BlogPost._meta.get_field(name).column, name)
+            self.assertEqual(BlogPostSearchIndex._meta.get_field(name).column, name)
+        for trigger, rows in (('insert', ['new']), ('delete', ['old']), ('update', ['old', 'new'])):
+            sql = triggers[f'{BLOG_FTS_TABLE}_{trigger}']
+            for row in rows:
+                self.assertIn(f'VALUES (\'delete\', old.id, ' if row == 'old' else 'VALUES (new.id, ', sql)
+                self.assertIn(', '.join(f'{row}.{name}' for name in BLOG_FTS_FIELDS), sql)
+
+        post = self.post('Robots', meta_description='Warehouse robots')
+        post.content = 'Drones'
+        post.save()
+        self.post('Other').delete()
+        with connection.cursor() as cursor:
+            # Compares the index with main_blogpost row by row; raises if they differ.
+            cursor.execute(f"INSERT INTO {BLOG_FTS_TABLE}({BLOG_FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+
+    def test_like_fallback_without_the_index(self):
+        post = self.post('Notes', content='Humanoid robots')
+        self.post('Other')
+        with mock.patch('main.search.fts_available', return_value=False):
+            results = self.search('robots')
+        self.assertEqual(results, [post])
+        self.assertFalse(hasattr(results[0], 'search_rank'))
+
+    def test_index_lookup_is_cached(self):
+        fts_available()
+        with self.assertNumQueries(0):
+            self.assertTrue(fts_available())
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(username='author')
+        now = timezone.now()
+        # Six posts share a date, so paging has to fall back on the id.
+        dates = [now] * 6 + [now - timedelta(days=day) for day in range(1, 6)]
+        for i, date in enumerate(dates):
+            BlogPost.objects.create(title=f'Post {i}', content='Body', author=author, is_published=True,
+                                    published_date=date)
+        self.expected = list(BlogPost.objects.order_by('-published_date', '-id').values_list('pk', flat=True))
+
+    def paginate(self, cursor=None):
+        return keyset_paginate(BlogPost.objects.all(), ('published_date', 'id'), 3, cursor)
+
+    def test_keyset_pages_forward_and_back_across_equal_dates(self):
+        pages = [self.paginate()]
+        while pages[-1].has_next():
+            pages.append(self.paginate(pages[-1].next_cursor))
+        forward = [[post.pk for post in page] for page in pages]
+        self.assertEqual(sum(forward, []), self.expected)
+        self.assertEqual([len(page) for page in forward], [3, 3, 3, 2])
+
+        backward = [forward[-1]]
+        page = pages[-1]
+        while page.has_previous():
+            page = self.paginate(page.previous_cursor)
+            backward.insert(0, [post.pk for post in page])
+        self.assertEqual(backward, forward)
+
+    def test_tampered_and_garbled_cursors_are_rejected(self):
+        cursor = self.paginate().next_cursor
+        tampered = cursor[:-2] + ('AA' if not cursor.endswith('AA') else 'BB')
+        for bad in (tampered, 'garbled', encode_cursor([1], 'next')):
+            with self.assertRaises(Http404):
+                self.paginate(bad)
+        response = self.client.get(reverse('main:blog_list') + '?cursor=garbled')
+        self.assertEqual(response.status_code, 404)
+
+    def test_first_and_last_pages_only_link_one_way(self):
+        first = self.client.get(reverse('main:blog_list') + '?pagination=cursor')
+        self.assertContains(first, 'aria-label="Next"')
+        self.assertNotContains(first, 'aria-label="Previous"')
+        last = self.client.get(reverse('main:blog_list'), {'cursor': first.context['page_obj'].next_cursor})
+        self.assertEqual(len(last.context['page_obj']), 2)
+        self.assertContains(last, 'aria-label="Previous"')
+        self.assertNotContains(last, 'aria-label="Next"')
+
+    def test_page_count_is_cached(self):
+        queryset = BlogPost.objects.order_by('-published_date')
+        self.assertEqual(CachedCountPaginator(queryset, 3).count, 11)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset, 3).count, 11)
+
+
+class ImageVariantCacheTests(TestCase):
+    def test_variants_from_another_process_show_up_after_the_timeout(self):
+        cache.clear()
+        self.assertEqual(variants_for_many(['gallery/photo.png']), {'gallery/photo.png': []})
+        # Written by generate_image_variants, which cannot clear this process's cache.
+        ImageVariant.objects.create(source='gallery/photo.png', format='webp', width=320, height=200,
+                                    file='variants/gallery/photo-320w.webp')
+        self.assertEqual(variants_for_many(['gallery/photo.png']), {'gallery/photo.png': []})
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 301):
+            [(format_name, width, _, _)] = variants_for_many(['gallery/photo.png'])['gallery/photo.png']
+        self.assertEqual((format_name, width), ('webp', 320))
+
+
+class ImageVariantCommandTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name, IMAGE_VARIANT_WIDTHS=(320, 640)))
+        cache.clear()
+
+    def upload(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'teal').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def generate(self):
+        call_command('generate_image_variants', workers=1, stdout=StringIO(), stderr=StringIO())
+        return sorted(ImageVariant.objects.values_list('source', 'file'))
+
+    def test_variants_are_made_by_the_worker_and_removed_with_their_image(self):
+        gallery = Gallery.objects.create(image=self.upload('gallery/first.png'), alt_text='First')
+        # Saving does not resize anything.
+        self.assertFalse(ImageVariant.objects.exists())
+        first = self.generate()
+        self.assertEqual({source for source, _ in first}, {'gallery/first.png'})
+        self.assertEqual(len(first), 4)
+
+        gallery.image = self.upload('gallery/second.png')
+        gallery.save()
+        second = self.generate()
+        self.assertEqual({source for source, _ in second}, {'gallery/second.png'})
+        for _, name in first:
+            self.assertFalse(default_storage.exists(name), name)
+
+        gallery.delete()
+        self.assertEqual(self.generate(), [])
+        for _, name in second:
+            self.assertFalse(default_storage.exists(name), name)
+        self.assertEqual(variants_for_many(['gallery/second.png']), {'gallery/second.png': []})
+
+
+class QueryProfilerTests(TestCase):
+    def test_server_timing_reports_queries_and_duplicates(self):
+        def view(request):
+            for pk in range(3):
+                list(Event.objects.filter(pk=pk))
+            return HttpResponse()
+
+        with self.settings(QUERY_PROFILER={'MODE': 'all'}):
+            response = QueryProfilerMiddleware(view)(RequestFactory().get('/'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="3 queries", app;dur=[\d.]+')
+        self.assertIn('db-slow-0;dur=', timing)
+        self.assertRegex(timing, r'db-dup-0;desc="3x SELECT \'main_event\'')
+
+    def test_only_staff_requests_are_profiled_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('main:about')))
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(reverse('main:about')))
+
+
+class PrecompressedStaticTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.css = b'body { color: #333; margin: 0; }\n' * 50
+        for name, content in (('app.css', self.css), ('tiny.css', b'a{}')):
+            with open(os.path.join(self.root, name), 'wb') as fh:
+                fh.write(content)
+        self.enterContext(override_settings(STATIC_ROOT=self.root))
+
+    def test_compressible_files_get_gzip_siblings(self):
+        storage = CompressedManifestStaticFilesStorage(location=self.root)
+        self.assertIn('app.css.gz', storage.compress_file('app.css'))
+        with open(os.path.join(self.root, 'app.css.gz'), 'rb') as fh:
+            self.assertEqual(gzip.decompress(fh.read()), self.css)
+        # Too small to be worth it.
+        self.assertEqual(storage.compress_file('tiny.css'), [])
+
+    def test_served_encoding_follows_accept_encoding(self):
+        CompressedManifestStaticFilesStorage(location=self.root).compress_file('app.css')
+        response = serve_static(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br;q=0, gzip'), 'app.css')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.css)
+
+        response = serve_static(RequestFactory().get('/'), 'app.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.css)
+
+
+class MediaRangeTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.content = bytes(range(256)) * 4
+        with open(os.path.join(directory.name, 'clip.bin'), 'wb') as fh:
+            fh.write(self.content)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name, MEDIA_SERVING={'MODE': 'django'}))
+
+    def get(self, **headers):
+        return serve_media(RequestFactory().get('/media/clip.bin', **headers), 'clip.bin')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1024), (0, 99))
+        self.assertEqual(parse_range('bytes=-100', 1024), (924, 1023))
+        self.assertEqual(parse_range('bytes=1000-5000', 1024), (1000, 1023))
+        for unsupported in (None, 'items=0-1', 'bytes=0-1,5-6', 'bytes=x-y', 'bytes=9-2'):
+            self.assertIsNone(parse_range(unsupported, 1024), unsupported)
+        for unsatisfiable in ('bytes=1024-', 'bytes=-0'):
+            with self.assertRaises(RangeNotSatisfiable):
+                parse_range(unsatisfiable, 1024)
+
+    def test_range_requests_get_exactly_the_requested_bytes(self):
+        response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+    def test_unsatisfiable_ranges_are_416(self):
+        response = self.get(HTTP_RANGE='bytes=2048-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_etag_revalidation_and_if_range(self):
+        full = self.get()
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        etag = full['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        # A stale validator gets the whole, current file instead of a range.
+        stale = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(b''.join(stale.streaming_content), self.content)
+
+    def test_etag_changes_with_the_file(self):
+        etag = self.get()['ETag']
+        path = os.path.join(settings.MEDIA_ROOT, 'clip.bin')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertNotEqual(self.get()['ETag'], etag)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name)))
+
+    def test_anonymous_page_is_served_from_cache(self):
+        url = reverse('main:team_list')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(page_cache_stats()['TeamListView'], {'hit': 1, 'miss': 1, 'bypass': 0})
+
+    def test_saving_a_model_invalidates_its_pages(self):
+        url = reverse('main:team_list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMember.objects.create(name='Grace Hopper', position='CTO', bio='Pioneered compilers.')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Pioneered compilers.')
+
+    def test_other_models_do_not_invalidate(self):
+        url = reverse('main:team_list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Testimonial.objects.create(client_name='Client', company='ACME', content='Great', rating=5)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+    def test_saves_in_another_process_invalidate_its_pages(self):
+        url = reverse('main:team_list')
+        self.client.get(url)
+        with mock.patch('main.page_cache.cache', LocMemCache('other-process', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                TeamMember.objects.create(name='Grace Hopper', position='CTO', bio='Pioneered compilers.')
+        self.assertContains(self.client.get(url), 'Pioneered compilers.')
+
+    def test_models_no_page_renders_bump_nothing(self):
+        with mock.patch('main.page_cache.bump_model_version') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                ContactMessage.objects.create(name='Guest', email='guest@example.com', phone='1',
+                                              subject='Hi', message='Hi')
+                TeamMember.objects.create(name='Grace Hopper', position='CTO', bio='Pioneered compilers.')
+        bump.assert_called_once_with(TeamMember)
+
+    def test_logged_in_users_bypass(self):
+        self.client.force_login(User.objects.create_user('visitor', password='password'))
+        url = reverse('main:about')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'bypass')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'bypass')
+
+    def test_cached_page_issues_csrf_cookie_without_sharing_a_token(self):
+        url = reverse('main:about')
+        self.client.get(url)
+        response = self.client_class().get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertIn('csrftoken', response.cookies)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+
+class NavigationTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name)))
+
+    def test_tree_is_built_in_one_query(self):
+        company = Navigation.objects.create(title='Company', url='#', order=1)
+        Navigation.objects.create(title='Team', url='/team/', order=2, parent=company)
+        Navigation.objects.create(title='Hidden', url='/hidden/', order=3, parent=company, is_active=False)
+        Navigation.objects.create(title='Blog', url='/blog/', order=0)
+
+        with self.assertNumQueries(1):
+            tree = build_navigation_tree()
+
+        self.assertEqual([item['title'] for item in tree], ['Blog', 'Company'])
+        self.assertEqual([child['title'] for child in tree[1]['children']], ['Team'])
+
+    def test_default_menu_without_rows(self):
+        self.assertEqual(get_navigation_tree()[0]['url'], reverse('main:home'))
+
+    def test_changes_replace_the_cached_header(self):
+        url = reverse('main:contact')
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get(url)
+        # Bounded, so nothing stale outlives PAGE_CACHE['TIMEOUT'].
+        self.assertTrue(cache_set.call_args_list)
+        self.assertNotIn(None, [call.args[2] for call in cache_set.call_args_list])
+        with self.assertNumQueries(0):
+            get_navigation_tree()
+        # Edited through another worker, with its own local-memory cache.
+        with mock.patch('main.page_cache.cache', LocMemCache('other-process', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                Navigation.objects.create(title='Careers', url='/careers/')
+        self.assertContains(self.client.get(url), 'href="/careers/"')
+
+
+class ConditionalDetailTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name)))
+        author = User.objects.create_user('author', first_name='Ada')
+        self.post = BlogPost.objects.create(title='Post', content='Body', author=author, is_published=True)
+        self.url = reverse('main:blog_detail', args=[self.post.pk])
+
+    def test_matching_etag_returns_304_after_one_query(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_related_changes_replace_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.categories.add(BlogCategory.objects.create(name='AI', slug='ai'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.url)['ETag']
+        User.objects.filter(pk=self.post.author_id).update(first_name='Grace')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etags_follow_changes_made_in_other_processes(self):
+        category = BlogCategory.objects.create(name='AI', slug='ai')
+        self.post.categories.add(category)
+        etag = self.client.get(self.url)['ETag']
+        # A rename handled by another worker, with its own local-memory cache.
+        with mock.patch('main.page_cache.cache', LocMemCache('other-process', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                category.name = 'Machine Learning'
+                category.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Machine Learning')
+
+    def test_missing_object_is_404(self):
+        self.assertEqual(self.client.get(reverse('main:blog_detail', args=[0])).status_code, 404)
+
+
+@override_settings(PAGE_CACHE={'ENABLED': False})
+class AsyncViewTests(TestCase):
+    """The async variants must render the same pages as the sync views."""
+
+    def setUp(self):
+        cache.clear()
+        create_dashboard_rows(4)
+
+    async def assertSameContent(self, sync_view, async_view, path):
+        sync_response = await sync_to_async(sync_view)(RequestFactory().get(path))
+        if hasattr(sync_response, 'render'):
+            await sync_to_async(sync_response.render)()
+        async_response = await async_view(AsyncRequestFactory().get(path))
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_home(self):
+        await self.assertSameContent(views.home_view, views.async_home_view, '/')
+
+    async def test_service_list(self):
+        await self.assertSameContent(views.ServiceListView.as_view(), views.AsyncServiceListView.as_view(),
+                                     '/services/')
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('SMTP server down')
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title='Expo', description='Event', date=timezone.now() + timedelta(days=1),
+                                          location='Sunderland', max_participants=10)
+
+    def register(self):
+        return self.client.post(reverse('main:event_registration', args=[self.event.pk]), {
+            'name': 'Guest', 'email': 'guest@example.com', 'phone': '123',
+        })
+
+    def test_registration_queues_emails_without_sending(self):
+        self.assertEqual(self.register().json()['status'], 'success')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(OutboxEmail.objects.values_list('to', flat=True)),
+                         [['admin@aisolution.com'], ['guest@example.com']])
+
+    def test_batch_is_sent_over_one_connection(self):
+        self.register()
+        self.assertEqual(deliver_batch(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('Expo', mail.outbox[0].alternatives[0][0])
+        self.assertEqual(deliver_batch(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        self.register()
+        with self.settings(EMAIL_OUTBOX={'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 0}), self.assertLogs('main.outbox'):
+            self.assertEqual(deliver_batch(connection=FailingBackend()), (0, 2))
+            self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {('pending', 1)})
+            self.assertEqual(deliver_batch(connection=FailingBackend()), (0, 2))
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {('failed', 2)})
+        self.assertIn('SMTP server down', OutboxEmail.objects.first().last_error)
+
+
+class InterruptingBackend(EmailBackend):
+    """Sends ``limit`` messages, then fails as if the worker were stopped."""
+    limit = None
+
+    def send_messages(self, messages):
+        if len(mail.outbox) >= self.limit:
+            raise KeyboardInterrupt
+        return super().send_messages(messages)
+
+
+class RejectingBackend(EmailBackend):
+    """Refuses messages to ``rejected``."""
+    rejected = 'reader5@example.com'
+
+    def send_messages(self, messages):
+        if any(self.rejected in message.to for message in messages):
+            raise ConnectionRefusedError('Try again later')
+        return super().send_messages(messages)
+
+
+@override_settings(NEWSLETTER={'CHUNK_SIZE': 3, 'CHECKPOINT_EVERY': 2})
+class NewsletterCampaignTests(TestCase):
+    def setUp(self):
+        Newsletter.objects.bulk_create([Newsletter(email=f'reader{i}@example.com') for i in range(10)])
+        Newsletter.objects.filter(email='reader3@example.com').update(is_active=False)
+        self.campaign = NewsletterCampaign.objects.create(subject='October news',
+                                                          content='<p>Hello {{ email }}</p>')
+
+    def test_each_active_subscriber_gets_a_personalised_copy(self):
+        self.assertEqual(send_campaign(self.campaign, concurrency=3), (9, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         sorted(f'reader{i}@example.com' for i in range(10) if i != 3))
+        message = next(m for m in mail.outbox if m.to == ['reader5@example.com'])
+        self.assertIn('<p>Hello reader5@example.com</p>', message.alternatives[0][0])
+        self.assertIn('Hello reader5@example.com', message.body)
+        self.assertNotIn('<p>', message.body)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count), ('sent', 9))
+
+    def test_interrupted_campaign_resumes_without_resending(self):
+        InterruptingBackend.limit = 4
+        with self.assertRaises(KeyboardInterrupt):
+            send_campaign(self.campaign, concurrency=1, connection_factory=InterruptingBackend)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'sending')
+        self.assertEqual(self.campaign.sent_count, 4)
+        send_campaign(self.campaign, concurrency=2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         sorted(f'reader{i}@example.com' for i in range(10) if i != 3))
+
+    def test_only_one_run_sends_a_campaign(self):
+        # Another run holds a live claim.
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            status='sending', claim_token=uuid.uuid4(), claimed_until=timezone.now() + timedelta(minutes=5)
+        )
+        with self.assertRaises(CampaignUnavailable):
+            send_campaign(self.campaign)
+        self.assertEqual(mail.outbox, [])
+        # Its claim runs out without a checkpoint, as when it crashed.
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(claimed_until=timezone.now())
+        self.assertEqual(send_campaign(self.campaign), (9, 0))
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.claim_token), ('sent', None))
+        with self.assertRaises(CampaignUnavailable):
+            send_campaign(self.campaign)
+        self.assertEqual(len(mail.outbox), 9)
+
+    def test_failed_recipients_are_retried_from_the_outbox(self):
+        with self.assertLogs('main.newsletter', 'WARNING'):
+            self.assertEqual(send_campaign(self.campaign, connection_factory=RejectingBackend), (8, 1))
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.failed_count), ('sent', 1))
+        retry = OutboxEmail.objects.get()
+        self.assertEqual((retry.to, retry.attempts), (['reader5@example.com'], 1))
+        self.assertIn('Hello reader5@example.com', retry.body)
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_batch(), (1, 0))
+        self.assertIn('<p>Hello reader5@example.com</p>', mail.outbox[-1].alternatives[0][0])
+
+
+def register(event, email):
+    return Client().post(reverse('main:event_registration', args=[event.pk]), {
+        'name': 'Guest', 'email': email, 'phone': '123',
+    }).json()
+
+
+class SeatReservationTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title='Workshop', description='Event', location='Sunderland',
+                                          date=timezone.now() + timedelta(days=1), max_participants=2)
+
+    def test_full_event_rejects_even_with_stale_instance(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        self.assertTrue(self.event.take_seat())
+        self.assertTrue(self.event.take_seat())
+        self.assertFalse(stale.take_seat())
+        self.assertEqual(register(self.event, 'late@example.com')['message'], 'Sorry, this event is fully booked.')
+        self.assertFalse(EventRegistration.objects.exists())
+
+    def test_duplicate_email_is_rejected_without_taking_a_seat(self):
+        self.assertEqual(register(self.event, 'guest@example.com')['status'], 'success')
+        self.assertEqual(register(self.event, 'guest@example.com')['message'],
+                         'You are already registered for this event.')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 1)
+
+    def test_waitlist_is_promoted_when_a_seat_is_cancelled(self):
+        Event.objects.filter(pk=self.event.pk).update(waitlist_enabled=True)
+        for i in range(3):
+            register(self.event, f'guest{i}@example.com')
+        statuses = dict(EventRegistration.objects.values_list('email', 'status'))
+        self.assertEqual(statuses['guest2@example.com'], 'waitlisted')
+        EventRegistration.objects.get(email='guest0@example.com').cancel()
+        self.assertEqual(EventRegistration.objects.get(email='guest2@example.com').status, 'pending')
+        promoted = OutboxEmail.objects.get(to=['guest2@example.com'], subject__startswith='A place is available')
+        self.assertIn('it is now yours', promoted.body)
+        EventRegistration.objects.get(email='guest1@example.com').delete()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 1)
+
+    def test_admin_cannot_move_a_registration_to_another_event(self):
+        register(self.event, 'guest@example.com')
+        registration = EventRegistration.objects.get()
+        other = Event.objects.create(title='Meetup', description='Event', location='Sunderland',
+                                     date=timezone.now() + timedelta(days=2), max_participants=2)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:main_eventregistration_change', args=[registration.pk])
+        self.assertNotIn('event', self.client.get(url).context['adminform'].form.fields)
+        self.client.post(url, {'event': other.pk, 'name': 'Guest', 'email': 'guest@example.com', 'phone': '1'})
+        registration.refresh_from_db()
+        self.assertEqual(registration.event, self.event)
+        self.assertEqual(Event.objects.get(pk=other.pk).seats_taken, 0)
+
+
+class ConcurrentRegistrationTests(TransactionTestCase):
+    def test_concurrent_registrations_do_not_overbook(self):
+        event = Event.objects.create(title='Workshop', description='Event', location='Sunderland',
+                                     date=timezone.now() + timedelta(days=1), max_participants=10)
+        results = []
+        start = threading.Barrier(40)
+
+        def attempt(i):
+            start.wait()
+            try:
+                results.append(register(event, f'guest{i}@example.com')['status'])
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(i,)) for i in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        event.refresh_from_db()
+        self.assertEqual(results.count('success'), 10)
+        self.assertEqual(event.seats_taken, 10)
+        self.assertEqual(EventRegistration.objects.filter(event=event).count(), 10)
+
+
+def full_table_scans(queryset):
+    """Tables EXPLAIN QUERY PLAN reads row by row rather than through an index."""
+    return re.findall(r'\bSCAN (\w+)$', queryset.explain(), re.MULTILINE)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Parses SQLite query plans')
+class QueryPlanTests(TestCase):
+    """The list pages and dashboard must stay index-backed as their tables grow."""
+
+    def view_queryset(self, view_class, url='/'):
+        view = view_class()
+        view.setup(RequestFactory().get(url))
+        return view.get_queryset()
+
+    def assertIndexBacked(self, querysets):
+        for name, queryset in querysets.items():
+            with self.subTest(name):
+                self.assertEqual(full_table_scans(queryset), [], queryset.explain())
+
+    def test_list_views(self):
+        self.assertIndexBacked({
+            'blog': self.view_queryset(views.BlogListView),
+            'blog page after cursor': self.view_queryset(views.BlogListView).filter(published_date__lt=timezone.now()),
+            'blog category': self.view_queryset(views.BlogListView, '/?category=ai'),
+            'events': self.view_queryset(views.EventListView),
+            'events by type': self.view_queryset(views.EventListView, '/?type=workshop'),
+            'upcoming events': self.view_queryset(views.EventListView).filter(is_upcoming=True),
+            'testimonials': self.view_queryset(views.TestimonialListView),
+            'team': self.view_queryset(views.TeamListView),
+            'portfolio': self.view_queryset(views.PortfolioListView),
+            **{f'home {name}': queryset for name, queryset in views.home_querysets().items() if name != 'services'},
+        })
+
+    def test_dashboard_and_admin_lists(self):
+        now = timezone.now()
+        self.assertIndexBacked({
+            'next events': Event.objects.filter(date__gte=now, is_upcoming=True).order_by('date')[:5],
+            'latest events': Event.objects.order_by('-date')[:3],
+            'latest posts': BlogPost.objects.order_by('-created_date')[:3],
+            'recent published posts': BlogPost.objects.filter(is_published=True).order_by('-published_date')[:5],
+            'contact messages': ContactMessage.objects.all(),
+            'event registrations': EventRegistration.objects.filter(event_id=1),
+            'active subscribers': Newsletter.objects.filter(is_active=True),
+        })
+
+
+def setting_under_env(name, **env):
+    """The value of setting ``name`` in a fresh process, with ``env`` changed (None unsets)."""
+    environ = {**os.environ, **env}
+    result = subprocess.run(
+        [sys.executable, '-c', f'from ai_solution import settings; print(repr(settings.{name}))'],
+        cwd=settings.BASE_DIR, env={key: value for key, value in environ.items() if value is not None},
+        capture_output=True, text=True, check=True,
+    )
+    return ast.literal_eval(result.stdout)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Tests the SQLite connection profile')
+class SQLiteConcurrencyTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # What SQLITE_WAL=1 does; the test database is not checked in, and the
+        # journal mode stays with the file for every later connection.
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+
+    def test_wal_is_opt_in(self):
+        # Otherwise any management command rewrites the checked-in db.sqlite3.
+        self.assertNotIn('journal_mode', setting_under_env('SQLITE_PRAGMAS', SQLITE_WAL=None))
+        self.assertEqual(setting_under_env('SQLITE_PRAGMAS', SQLITE_WAL='1')['journal_mode'], 'WAL')
+
+    def test_connections_use_wal(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_readers_are_not_blocked_by_a_large_open_write(self):
+        Newsletter.objects.create(email='first@example.com')
+        written, read = threading.Event(), threading.Event()
+        counts, errors = [], []
+
+        def write():
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        # Overflow the page cache, which under a rollback
+                        # journal locks readers out until the commit.
+                        cursor.execute('PRAGMA cache_size = 10')
+                    Newsletter.objects.bulk_create(
+                        [Newsletter(email=f'reader{i}@example.com') for i in range(5000)]
+                    )
+                    written.set()
+                    read.wait(10)
+            finally:
+                connections.close_all()
+
+        def read_while_writing():
+            written.wait(10)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA busy_timeout = 500')
+                for _ in range(20):
+                    counts.append(Newsletter.objects.count())
+            except OperationalError as exc:
+                errors.append(exc)
+            finally:
+                read.set()
+                connections.close_all()
+
+        threads = [threading.Thread(target=write), threading.Thread(target=read_while_writing)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        # Readers see the last committed state, not the write in progress.
+        self.assertEqual(set(counts), {1})
+        self.assertEqual(Newsletter.objects.count(), 5001)
+
+    def test_concurrent_read_then_write_transactions_queue_instead_of_failing(self):
+        # A deferred transaction that reads before it writes fails outright
+        # when another writer commits in between; IMMEDIATE ones wait.
+        errors = []
+        start = threading.Barrier(10)
+
+        def subscribe(i):
+            start.wait()
+            try:
+                for j in range(20):
+                    with transaction.atomic():
+                        if not Newsletter.objects.filter(email=f'reader{i}-{j}@example.com').exists():
+                            Newsletter.objects.create(email=f'reader{i}-{j}@example.com')
+            except OperationalError as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=subscribe, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(Newsletter.objects.count(), 200)
+
+    def test_maintenance_checkpoints_the_wal(self):
+        ContactMessage.objects.create(name='Guest', email='guest@example.com', phone='1', subject='Hi', message='Hi')
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('Checkpointed', out.getvalue())
+
+
+@override_settings(READ_REPLICAS={'ALIASES': ['replica']})
+class ReplicaRoutingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A real second SQLite file, only ever filled by sync_sqlite_replica().
+        # Added after the test databases are set up, which would otherwise
+        # create it as a fresh test database or a mirror of the primary.
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.directory.name, 'replica.sqlite3')
+        connections.settings['replica'] = {**connections.settings['default'], 'NAME': cls.replica_path}
+        cls.databases = {*cls.databases, 'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def write(self, email):
+        ContactMessage.objects.create(name='Guest', email=email, phone='1', subject='Hi', message='Hi')
+
+    def routed_read(self, request):
+        def view(request):
+            if request.method == 'POST':
+                self.write('guest@example.com')
+            return HttpResponse(ContactMessage.objects.count())
+
+        return PrimaryPinMiddleware(view)(request)
+
+    def test_reads_go_to_replicas_outside_transactions(self):
+        self.assertEqual(Event.objects.all().db, 'replica')
+        with transaction.atomic():
+            self.assertEqual(Event.objects.all().db, 'default')
+        with self.settings(READ_REPLICAS={'ALIASES': []}):
+            self.assertEqual(Event.objects.all().db, 'default')
+
+    def test_reads_see_writes_once_the_replica_is_synced(self):
+        self.write('first@example.com')
+        sync_sqlite_replica(self.replica_path)
+        self.assertEqual(list(ContactMessage.objects.values_list('email', flat=True)), ['first@example.com'])
+
+        self.write('second@example.com')
+        # The replica lags until the next sync.
+        self.assertEqual(ContactMessage.objects.count(), 1)
+        sync_sqlite_replica(self.replica_path)
+        self.assertEqual(ContactMessage.objects.count(), 2)
+
+    def test_writes_pin_the_request_and_client_to_the_primary(self):
+        sync_sqlite_replica(self.replica_path)
+        response = self.routed_read(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'0')
+        self.assertNotIn('db_primary', response.cookies)
+
+        # The replica has not seen the write, but the request reads it back.
+        response = self.routed_read(RequestFactory().post('/'))
+        self.assertEqual(response.content, b'1')
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+        request = RequestFactory().get('/')
+        request.COOKIES['db_primary'] = '1'
+        self.assertEqual(self.routed_read(request).content, b'1')
+        # Routing state does not leak out of the request.
+        self.assertEqual(ContactMessage.objects.count(), 0)
+
+    def test_cached_pages_are_not_filled_from_a_lagging_replica(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name)))
+        sync_sqlite_replica(self.replica_path)
+        url = reverse('main:team_list')
+        self.client.get(url)
+        # Committed and the stamp bumped, but not synced to the replica yet.
+        TeamMember.objects.create(name='Grace Hopper', position='CTO', bio='Pioneered compilers.')
+        self.assertFalse(TeamMember.objects.exists())
+        miss = self.client.get(url)
+        self.assertEqual(miss['X-Page-Cache'], 'miss')
+        self.assertContains(miss, 'Pioneered compilers.')
+        hit = self.client.get(url)
+        self.assertEqual(hit['X-Page-Cache'], 'hit')
+        self.assertContains(hit, 'Pioneered compilers.')
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'layer')
+
+    def layer(self, **config):
+        layer = SQLiteChannelLayer(path=self.path, poll_interval=0.01, **config)
+        self.addCleanup(async_to_sync(layer.close))
+        return layer
+
+    def test_shared_layer_switches_to_the_external_broadcaster(self):
+        # Embedded producers in every worker would each update every dashboard.
+        self.assertEqual(setting_under_env('DASHBOARD_BROADCASTER', CHANNEL_LAYER_PATH=None), 'embedded')
+        self.assertEqual(setting_under_env('DASHBOARD_BROADCASTER', CHANNEL_LAYER_PATH=self.path), 'external')
+
+    def test_group_send_reaches_channels_of_other_processes(self):
+        # Separate instances stand in for separate processes sharing the files.
+        workers, producer = [self.layer(), self.layer()], self.layer()
+
+        async def broadcast():
+            channels = []
+            for worker in workers:
+                channels.append(await worker.new_channel())
+                await worker.group_add('dashboard', channels[-1])
+            await producer.group_send('dashboard', {'type': 'update', 'body': b'\x00'})
+            return [await asyncio.wait_for(worker.receive(channel), 5)
+                    for worker, channel in zip(workers, channels)]
+
+        self.assertEqual(async_to_sync(broadcast)(), [{'type': 'update', 'body': b'\x00'}] * 2)
+
+    def test_full_channels_raise_and_are_skipped_by_group_send(self):
+        layer = self.layer(capacity=2)
+
+        async def fill():
+            await layer.group_add('dashboard', 'full')
+            await layer.group_add('dashboard', 'empty')
+            await layer.send('full', {'type': 'first'})
+            await layer.send('full', {'type': 'second'})
+            with self.assertRaises(ChannelFull):
+                await layer.send('full', {'type': 'third'})
+            await layer.group_send('dashboard', {'type': 'broadcast'})
+            return ([await layer.receive('full'), await layer.receive('full')],
+                    await layer.receive('empty'))
+
+        full, empty = async_to_sync(fill)()
+        self.assertEqual(full, [{'type': 'first'}, {'type': 'second'}])
+        self.assertEqual(empty, {'type': 'broadcast'})
+
+    def test_messages_and_memberships_expire(self):
+        layer = self.layer(expiry=60, group_expiry=300)
+
+        async def send_then_read_later():
+            await layer.send('late', {'type': 'stale'})
+            await layer.group_add('dashboard', 'member')
+            with mock.patch('main.channel_layers.time.time', return_value=time.time() + 301):
+                await layer.group_send('dashboard', {'type': 'broadcast'})
+                for channel in ('late', 'member'):
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await asyncio.wait_for(layer.receive(channel), 0.2)
+
+        async_to_sync(send_then_read_later)()
+
+    def test_messages_for_closed_sockets_are_dropped(self):
+        layer = self.layer(expiry=0.2)
+
+        async def receive_beside_a_dead_channel():
+            live, dead = await layer.new_channel(), await layer.new_channel()
+            await layer.send(dead, {'type': 'unread'})
+            await layer.send(live, {'type': 'first'})
+            self.assertEqual(await asyncio.wait_for(layer.receive(live), 5), {'type': 'first'})
+            # The poller buffered the dead channel's message on the way.
+            self.assertIn(dead, layer._buffers)
+            receiving = asyncio.ensure_future(layer.receive(live))
+            await asyncio.sleep(0.5)
+            self.assertNotIn(dead, layer._buffers)
+            await layer.send(live, {'type': 'second'})
+            self.assertEqual(await asyncio.wait_for(receiving, 5), {'type': 'second'})
+            # With nobody receiving and nothing buffered, polling stops.
+            await asyncio.wait_for(layer._poller, 5)
+            self.assertEqual(layer._buffers, {})
+
+        async_to_sync(receive_beside_a_dead_channel)()
+
+    def test_large_groups_stay_under_the_sqlite_variable_limit(self):
+        layer = self.layer(shards=1)
+        connect = layer._connect
+
+        def strict_connect(shard):
+            # SQLite builds differ; the oldest still allow only 999.
+            connection = connect(shard)
+            connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+            return connection
+
+        layer._connect = strict_connect
+        worker = f'specific.{layer.client_prefix}!'
+        members = [f'{worker}{i}' for i in range(2500)]
+        with layer._connect(0) as connection:
+            connection.executemany('INSERT INTO group_member (grp, channel, joined) VALUES (?, ?, ?)',
+                                   [('dashboard', member, time.time()) for member in members])
+        async_to_sync(layer.group_send)('dashboard', {'type': 'broadcast'})
+        delivered = layer._pop(layer.non_local_name(members[0]))
+        self.assertEqual(sorted(target for target, _ in delivered), sorted(members))
+        self.assertEqual(layer._pop(layer.non_local_name(members[0])), [])
+
+    def test_groups_are_sharded_across_files(self):
+        layer = self.layer(shards=4)
+
+        async def join():
+            for i in range(40):
+                await layer.group_add(f'group{i}', 'member')
+
+        async_to_sync(join)()
+        counts = []
+        for path in layer.paths:
+            shard = sqlite3.connect(path)
+            try:
+                counts.append(shard.execute('SELECT COUNT(*) FROM group_member').fetchone()[0])
+            finally:
+                shard.close()
+        self.assertEqual(sum(counts), 40)
+        self.assertTrue(all(counts), counts)
+
+
+# Run in each worker process: opens dashboard websockets against the test
+# database, reports "ready", then reads the broadcasts every socket got.
+CHANNEL_WORKER = """
+import asyncio, json, sys
+import django
+django.setup()
+from django.conf import settings
+from django.db import connections
+connections['default'].settings_dict['NAME'] = sys.argv[1]
+settings.DASHBOARD_BROADCASTER = 'external'
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from main.consumers import DashboardConsumer
+
+async def receive_json(communicator):
+    message = await communicator.receive_output(30)
+    assert message['type'] == 'websocket.send', message
+    return json.loads(message['text'])
+
+async def main(sockets, broadcasts):
+    user = await sync_to_async(User.objects.get)(username='staff')
+    communicators = []
+    for _ in range(sockets):
+        communicator = ApplicationCommunicator(DashboardConsumer.as_asgi(), {
+            'type': 'websocket', 'path': '/ws/dashboard/', 'headers': [], 'subprotocols': [], 'user': user,
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        assert (await communicator.receive_output(10))['type'] == 'websocket.accept'
+        await receive_json(communicator)  # snapshot
+        communicators.append(communicator)
+    print('ready', flush=True)
+    received = [[(await receive_json(c))['broadcast'] for _ in range(broadcasts)] for c in communicators]
+    for communicator in communicators:
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(5)
+    print(json.dumps(received), flush=True)
+
+asyncio.run(main(int(sys.argv[2]), int(sys.argv[3])))
+"""
+
+
+class ChannelLayerLoadTests(TransactionTestCase):
+    def test_broadcasts_reach_sockets_in_every_worker_process(self):
+        User.objects.create_user('staff', password='pw', is_staff=True)
+        processes, sockets, broadcasts = 3, 10, 20
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'layer')
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'ai_solution.settings', 'CHANNEL_LAYER_PATH': path}
+        workers = [
+            subprocess.Popen([sys.executable, '-c', CHANNEL_WORKER, connection.settings_dict['NAME'],
+                              str(sockets), str(broadcasts)],
+                             cwd=settings.BASE_DIR, env=env, text=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            self.addCleanup(worker.kill)
+        for worker in workers:
+            if worker.stdout.readline().strip() != 'ready':
+                self.fail(worker.communicate()[1])
+
+        # Same files and shard count as the workers' CHANNEL_LAYERS setting.
+        producer = SQLiteChannelLayer(path=path)
+
+        async def broadcast():
+            for i in range(broadcasts):
+                await producer.group_send(DASHBOARD_GROUP, {
+                    'type': 'dashboard.update', 'seq': i, 'ops': None, 'data': {'broadcast': i},
+                })
+            await producer.close()
+
+        async_to_sync(broadcast)()
+        for worker in workers:
+            out, err = worker.communicate(timeout=60)
+            self.assertEqual(worker.returncode, 0, err)
+            self.assertEqual(json.loads(out), [list(range(broadcasts))] * sockets)
+
+
+def tiered_caches(directory, **options):
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+                   'TIMEOUT': None},
+        'tiered': {'BACKEND': 'main.tiered_cache.TieredCache', 'LOCATION': 'shared', 'OPTIONS': options},
+    }
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name, MAX_BYTES=4000)))
+        self.cache = caches['tiered']
+
+    def other_process(self):
+        return TieredCache('shared', {'OPTIONS': {'MAX_BYTES': 4000}})
+
+    def test_reads_fall_through_to_the_shared_tier(self):
+        self.cache.set('answer', {'value': 42})
+        other = self.other_process()
+        self.assertEqual(other.get('answer'), {'value': 42})
+        self.assertEqual(other.get('answer'), {'value': 42})
+        self.assertIsNone(other.get('question'))
+        self.assertEqual({name: other.stats()[name] for name in ('local_hits', 'shared_hits', 'misses')},
+                         {'local_hits': 1, 'shared_hits': 1, 'misses': 1})
+        other.delete('answer')
+        self.assertIsNone(caches['shared'].get(self.cache.make_key('answer')))
+
+    def test_local_tier_evicts_least_recently_used_within_its_size(self):
+        for i in range(3):
+            self.cache.set(f'page{i}', 'x' * 1000)
+        self.cache.get('page0')
+        self.cache.set('page3', 'x' * 1000)
+        self.assertLessEqual(self.cache.local.bytes, 4000)
+        self.assertIsNotNone(self.cache.local.get(self.cache.make_key('page0')))
+        self.assertIsNone(self.cache.local.get(self.cache.make_key('page1')))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        # Still in the shared tier.
+        self.assertEqual(self.cache.get('page1'), 'x' * 1000)
+
+    def test_stale_values_are_served_while_one_caller_recomputes(self):
+        computed, release = [], threading.Event()
+
+        def compute():
+            if computed:
+                release.wait(5)
+            computed.append(len(computed) + 1)
+            return len(computed)
+
+        self.assertEqual(self.cache.get_or_compute('report', compute, timeout=60), 1)
+        with mock.patch('main.tiered_cache.time.time', return_value=time.time() + 61):
+            # Stale: both callers get the old value and only one recomputes.
+            self.assertEqual(self.cache.get_or_compute('report', compute, timeout=60), 1)
+            other = self.other_process()
+            self.assertEqual(other.get_or_compute('report', compute, timeout=60), 1)
+            refreshing = list(self.cache.refreshing)
+            release.set()
+            for thread in refreshing:
+                thread.join(5)
+        self.assertEqual(self.cache.get_or_compute('report', compute, timeout=60), 2)
+        self.assertEqual(computed, [1, 2])
+        other.flush_stats()
+        self.assertEqual(self.cache.stats()['stale_hits'], 2)
+
+    def test_only_one_caller_computes_a_missing_key(self):
+        calls, results, refused = [], [], []
+        computing, release = threading.Event(), threading.Event()
+        acquire = TieredCache._acquire
+
+        def record_acquire(cache, key):
+            token = acquire(cache, key)
+            if token is None:
+                refused.append(key)
+            return token
+
+        def compute():
+            calls.append(1)
+            computing.set()
+            release.wait(5)
+            return 'report'
+
+        def fetch(cache):
+            results.append(cache.get_or_compute('report', compute))
+
+        processes = [self.other_process() for _ in range(10)]
+        threads = [threading.Thread(target=fetch, args=(process,)) for process in processes]
+        with mock.patch.object(TieredCache, '_acquire', autospec=True, side_effect=record_acquire):
+            threads[0].start()
+            self.assertTrue(computing.wait(5))
+            # Everyone else arrives while the first caller holds the lock.
+            for thread in threads[1:]:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while len(refused) < 9 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(results, ['report'] * 10)
+        self.assertEqual(len(calls), 1)
+        for process in processes:
+            process.flush_stats()
+        self.assertEqual(self.cache.stats()['waits'], 9)
+
+    def test_counts_from_concurrent_processes_all_add_up(self):
+        processes = [self.other_process() for _ in range(4)]
+        start = threading.Barrier(len(processes))
+
+        def count(process):
+            start.wait(5)
+            for _ in range(50):
+                process._count('misses')
+                process.flush_stats()
+
+        threads = [threading.Thread(target=count, args=(process,)) for process in processes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(self.cache.stats()['misses'], 200)
+
+    def test_reset_clears_the_counts_of_every_process(self):
+        other = self.other_process()
+        other._count('misses', 3)
+        other.flush_stats()
+        self.assertEqual(self.cache.stats()['misses'], 3)
+        self.cache.reset_stats()
+        self.assertEqual(self.cache.stats()['misses'], 0)
+        other._count('misses')
+        other.flush_stats()
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_single_flight_lock_is_exclusive_across_processes(self):
+        first, second = self.cache, self.other_process()
+        key = first.make_key('report')
+        # FileBasedCache.add() would let a caller that checked before the
+        # first write also succeed.
+        with mock.patch.object(type(caches['shared']), 'has_key', return_value=False):
+            token = first._acquire(key)
+            self.assertIsNotNone(token)
+            self.assertIsNone(second._acquire(key))
+        # Releasing someone else's lock does nothing.
+        second._release(key, 'not-the-owner')
+        self.assertIsNone(second._acquire(key))
+        # A holder that died leaves a lock that expires after LOCK_TIMEOUT.
+        later = time.time() + second.config['LOCK_TIMEOUT'] + 1
+        with mock.patch('main.tiered_cache.time.time', return_value=later):
+            taken_over = second._acquire(key)
+        self.assertIsNotNone(taken_over)
+        first._release(key, token)
+        self.assertIsNone(first._acquire(key))
+        second._release(key, taken_over)
+        self.assertIsNotNone(first._acquire(key))
+
+
+class CachedReferenceDataTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name)))
+
+    def faqs(self):
+        data = views.cached_reference_data('faqs', {'faqs': FAQ.objects.all()}, [FAQ])
+        return [faq.question for faq in data['faqs']]
+
+    def test_edits_in_another_process_replace_the_entry(self):
+        FAQ.objects.create(question='First?', answer='Yes', category='service')
+        self.assertEqual(self.faqs(), ['First?'])
+        # The admin edit lands in a process with its own local-memory cache.
+        with mock.patch('main.page_cache.cache', LocMemCache('other-process', {})):
+            with self.captureOnCommitCallbacks(execute=True):
+                FAQ.objects.create(question='Second?', answer='Yes', category='service', order=1)
+        self.assertEqual(self.faqs(), ['First?', 'Second?'])
+
+
+class CachedAdminDashboardTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(CACHES=tiered_caches(directory.name)))
+        create_dashboard_rows(4)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_aggregates_are_served_from_the_cache(self):
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(reverse('admin-dashboard'))
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(reverse('admin-dashboard'))
+        self.assertLess(len(second), len(first) - 10)
+        self.assertContains(response, 'Local hits')
+        self.assertEqual(caches['tiered'].stats()['recomputes'], 1)
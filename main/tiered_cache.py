@@ -0,0 +1,414 @@
+"""
+Two-tier cache backend.
+
+TieredCache keeps a bounded LRU of pickled values in each process in front of
+a cache shared by all of them (the alias named in LOCATION, a file or database
+cache). Reads try the local tier, then the shared one; writes go to both.
+Local entries live at most LOCAL_TIMEOUT seconds, which bounds how long one
+process can keep serving a value another process has replaced or deleted.
+
+get_or_compute() adds what plain get()/set() cannot give expensive results:
+
+* a soft TTL, after which the value is stale rather than gone: for STALE more
+  seconds it is still served while it is recomputed in the background
+  (stale-while-revalidate);
+* single flight: a lock lets one thread of one process recompute a missing or
+  stale key while the others serve the stale value or wait for the new one.
+  FileBasedCache.add() checks and then writes, so two processes can both
+  succeed; with a file cache as the shared tier the lock is instead a file
+  created with O_EXCL next to it. Database, memcached and Redis caches
+  implement add() atomically and hold the lock themselves.
+
+Hits, misses and evictions are counted per process. Every STATS_INTERVAL
+seconds each process writes its running totals to its own key in the shared
+tier, so no two processes ever update the same counter, and stats() adds
+them up.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, namedtuple
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+TIERED_CACHE_DEFAULTS = {
+    # Bytes of pickled values (plus keys) the local tier may hold.
+    'MAX_BYTES': 16 * 1024 * 1024,
+    'LOCAL_TIMEOUT': 5,
+    # Seconds a value from get_or_compute() is served after its soft TTL.
+    'STALE': 300,
+    # How long a recompute may hold the single-flight lock, and so how long
+    # others wait for it before computing the value themselves.
+    'LOCK_TIMEOUT': 30,
+    'STATS_INTERVAL': 10,
+}
+
+COUNTERS = ('local_hits', 'shared_hits', 'stale_hits', 'misses', 'recomputes', 'waits', 'evictions')
+
+# What get_or_compute() stores: the value and when it goes stale.
+Entry = namedtuple('Entry', 'value fresh_until')
+
+_missing = object()
+
+
+class LocalLRU:
+    """Pickled values by key, least recently used first, bounded by count and size."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            pickled, expires = item
+            if expires <= time.time():
+                self._remove(key)
+                return None
+            self.data.move_to_end(key)
+            return pickled
+
+    def set(self, key, pickled, expires):
+        """Store ``pickled``; returns how many entries were evicted for it."""
+        size = len(key) + len(pickled)
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return 0
+            self.data[key] = (pickled, expires)
+            self.bytes += size
+            evicted = 0
+            while len(self.data) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.data)))
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        item = self.data.pop(key, None)
+        if item is not None:
+            self.bytes -= len(key) + len(item[0])
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.config = {**TIERED_CACHE_DEFAULTS, **{name: options[name] for name in TIERED_CACHE_DEFAULTS
+                                                    if name in options}}
+        self.shared_alias = location
+        self.local = LocalLRU(self._max_entries, self.config['MAX_BYTES'])
+        self.counts = Counter()
+        # Everything this process has counted since the last reset_stats().
+        self.totals = Counter()
+        self.epoch = None
+        self.process_id = uuid.uuid4().hex
+        self.counts_lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        # Background recomputes, so tests and shutdown code can wait for them.
+        self.refreshing = set()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT):
+        expires = time.time() + self.config['LOCAL_TIMEOUT']
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        evicted = self.local.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+        if evicted:
+            self._count('evictions', evicted)
+
+    def _lookup(self, key):
+        """The stored object for ``key``, from the nearest tier that has it."""
+        pickled = self.local.get(key)
+        if pickled is not None:
+            self._count('local_hits')
+            return pickle.loads(pickled)
+        value = self.shared.get(key, _missing)
+        if value is _missing:
+            return _missing
+        self._count('shared_hits')
+        self._remember(key, value)
+        return value
+
+    # Django cache API
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._lookup(key)
+        if value is _missing:
+            self._count('misses')
+            return default
+        return value.value if isinstance(value, Entry) else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout)
+        self._remember(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        if not self.shared.add(key, value, timeout):
+            return False
+        self._remember(key, value, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.local.delete(key)
+        return self.shared.touch(key, self._timeout(timeout))
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.local.delete(key)
+        return self.shared.delete(key)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters live in the shared tier only, where every process sees them.
+        key = self.make_and_validate_key(key, version=version)
+        self.local.delete(key)
+        return self.shared.incr(key, delta)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    # Soft TTLs and single flight
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT, stale=None, version=None):
+        """
+        Return the cached value of ``key``, calling ``compute()`` to build it.
+        The value is fresh for ``timeout`` seconds and then served stale for
+        ``stale`` more (default STALE) while one caller recomputes it.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        stale = self.config['STALE'] if stale is None else stale
+        entry = self._lookup(key)
+        if isinstance(entry, Entry):
+            if timeout is None or entry.fresh_until > time.time():
+                return entry.value
+            self._count('stale_hits')
+            token = self._acquire(key)
+            if token:
+                self._refresh_in_background(key, compute, timeout, stale, token)
+            return entry.value
+
+        self._count('misses')
+        token = self._acquire(key)
+        if token:
+            return self._compute(key, compute, timeout, stale, token)
+        # Another worker is building it; wait for its result.
+        self._count('waits')
+        deadline = time.monotonic() + self.config['LOCK_TIMEOUT']
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self.shared.get(key, _missing)
+            if isinstance(entry, Entry):
+                self._remember(key, entry)
+                return entry.value
+        # The lock holder died or is too slow; build it here as well.
+        return self._compute(key, compute, timeout, stale, None)
+
+    def _lock_key(self, key):
+        return f'{key}:lock'
+
+    def _lock_path(self, key):
+        """The lock file for ``key``, or None if the shared tier's add() is atomic."""
+        shared = self.shared
+        if not isinstance(shared, FileBasedCache):
+            return None
+        directory = os.path.join(shared._dir, 'locks')
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, hashlib.sha1(key.encode()).hexdigest() + '.lock')
+
+    def _acquire(self, key):
+        """Take the single-flight lock for ``key``; returns a token, or None if it is held."""
+        token = uuid.uuid4().hex
+        path = self._lock_path(key)
+        if path is None:
+            return token if self.shared.add(self._lock_key(key), token, self.config['LOCK_TIMEOUT']) else None
+        for _ in range(2):
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_expired_lock(path):
+                    return None
+                continue
+            with os.fdopen(descriptor, 'w') as lock:
+                lock.write(f'{token} {time.time() + self.config["LOCK_TIMEOUT"]}')
+            return token
+        return None
+
+    def _read_lock(self, path):
+        """The token and expiry time in a lock file; (None, None) if it is gone or still being written."""
+        try:
+            with open(path) as lock:
+                token, _, expires = lock.read().partition(' ')
+        except FileNotFoundError:
+            return None, None
+        return (token, float(expires)) if expires else (None, None)
+
+    def _break_expired_lock(self, path):
+        """Remove a lock held longer than LOCK_TIMEOUT; True if this caller removed it."""
+        token, expires = self._read_lock(path)
+        if token is None or expires > time.time():
+            return False
+        # Renaming is atomic, so of several callers finding the same expired
+        # lock only one moves it away and retries.
+        expired = f'{path}.{uuid.uuid4().hex}'
+        try:
+            os.rename(path, expired)
+        except FileNotFoundError:
+            return False
+        os.remove(expired)
+        return True
+
+    def _release(self, key, token):
+        # Release only our own lock, not one taken after ours expired.
+        path = self._lock_path(key)
+        if path is None:
+            if self.shared.get(self._lock_key(key)) == token:
+                self.shared.delete(self._lock_key(key))
+        elif self._read_lock(path)[0] == token:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _compute(self, key, compute, timeout, stale, token):
+        try:
+            self._count('recomputes')
+            value = compute()
+            fresh_until = None if timeout is None else time.time() + timeout
+            hard_timeout = None if timeout is None else timeout + stale
+            entry = Entry(value, fresh_until)
+            self.shared.set(key, entry, hard_timeout)
+            self._remember(key, entry, hard_timeout)
+            return value
+        finally:
+            if token:
+                self._release(key, token)
+
+    def _refresh_in_background(self, key, compute, timeout, stale, token):
+        def refresh():
+            try:
+                self._compute(key, compute, timeout, stale, token)
+            except Exception:
+                # The stale value stays in place until the next attempt.
+                logger.exception('Recomputing cache key %s failed', key)
+            finally:
+                close_old_connections()
+                self.refreshing.discard(thread)
+
+        thread = threading.Thread(target=refresh, name=f'cache-refresh-{key}', daemon=True)
+        self.refreshing.add(thread)
+        thread.start()
+
+    # Statistics
+
+    def _stats_key(self, name):
+        return f'{self.key_prefix}:tiered-cache-stats:{name}'
+
+    def _count(self, name, n=1):
+        with self.counts_lock:
+            self.counts[name] += n
+            due = time.monotonic() - self.last_flush >= self.config['STATS_INTERVAL']
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Publish this process's totals to the shared tier."""
+        registry = self.shared.get_many([self._stats_key('epoch'), self._stats_key('processes')])
+        epoch = registry.get(self._stats_key('epoch'))
+        with self.counts_lock:
+            if epoch != self.epoch:
+                # Reset from some process since the last flush.
+                self.totals, self.epoch = Counter(), epoch
+            self.totals.update(self.counts)
+            self.counts = Counter()
+            self.last_flush = time.monotonic()
+            totals = dict(self.totals)
+        if not totals:
+            return
+        # Only this process writes this key, so no increment can be lost.
+        self.shared.set(self._stats_key(self.process_id), (epoch, totals), None)
+        if self.process_id not in registry.get(self._stats_key('processes'), frozenset()):
+            self._register_process()
+
+    def _register_process(self):
+        """Add this process to the ones stats() reads, under the single-flight lock."""
+        key = self._stats_key('processes')
+        token = self._acquire(key)
+        if token is None:
+            # Another process is joining; try again on the next flush.
+            return
+        try:
+            processes = self.shared.get(key, frozenset())
+            self.shared.set(key, processes | {self.process_id}, None)
+        finally:
+            self._release(key, token)
+
+    def stats(self):
+        """Totals across processes, plus the size of this process's local tier."""
+        self.flush_stats()
+        processes = self.shared.get(self._stats_key('processes'), frozenset())
+        stats = dict.fromkeys(COUNTERS, 0)
+        for epoch, totals in self.shared.get_many([self._stats_key(pid) for pid in processes]).values():
+            # Totals from before the last reset, until their process flushes again.
+            if epoch == self.epoch:
+                for name, n in totals.items():
+                    stats[name] += n
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        hits = stats['local_hits'] + stats['shared_hits']
+        # Percent of lookups answered by either tier.
+        stats['hit_rate'] = round(100 * hits / lookups, 1) if lookups else None
+        stats['local_entries'] = len(self.local)
+        stats['local_bytes'] = self.local.bytes
+        stats['local_max_bytes'] = self.local.max_bytes
+        return stats
+
+    def reset_stats(self):
+        processes = self.shared.get(self._stats_key('processes'), frozenset())
+        with self.counts_lock:
+            self.counts, self.totals = Counter(), Counter()
+            self.epoch = uuid.uuid4().hex
+        # Other processes drop their totals when they see the new epoch.
+        self.shared.set(self._stats_key('epoch'), self.epoch, None)
+        self.shared.delete_many([self._stats_key(pid) for pid in processes] + [self._stats_key('processes')])
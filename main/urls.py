@@ -1,15 +1,27 @@
+from django.conf import settings
 from django.urls import path
 from . import views
+from .models import FAQ, Portfolio, Service, ServiceCategory, Technology, TeamMember, Testimonial
+from .page_cache import cache_anonymous_page
 from .views import PortfolioListView
 
 app_name = 'main'
 
+# Under ASGI the async variants gather their queries on the async ORM.
+if settings.ASYNC_VIEWS:
+    home_view = views.async_home_view
+    service_list_view = views.AsyncServiceListView.as_view()
+else:
+    home_view = views.home_view
+    service_list_view = views.ServiceListView.as_view()
+
 urlpatterns = [
     # Home page
-    path('', views.home_view, name='home'),
+    path('', home_view, name='home'),
     
     # Services
-    path('services/', views.ServiceListView.as_view(), name='service_list'),
+    path('services/', cache_anonymous_page(Service, ServiceCategory, Technology, FAQ)(service_list_view),
+         name='service_list'),
     path('services/<slug:slug>/', views.ServiceDetailView.as_view(), name='service_detail'),
     
     # Blog
@@ -22,10 +34,11 @@ urlpatterns = [
     path('events/<int:event_id>/register/', views.event_registration, name='event_registration'),
     
     # Testimonials
-    path('testimonials/', views.TestimonialListView.as_view(), name='testimonial_list'),
+    path('testimonials/', cache_anonymous_page(Testimonial)(views.TestimonialListView.as_view()),
+         name='testimonial_list'),
     
     # Team
-    path('team/', views.TeamListView.as_view(), name='team_list'),
+    path('team/', cache_anonymous_page(TeamMember)(views.TeamListView.as_view()), name='team_list'),
     
     # Gallery
     path('gallery/', views.GalleryListView.as_view(), name='gallery_list'),
@@ -38,7 +51,7 @@ urlpatterns = [
     path('demo-video/', views.demo_video_view, name='demo_video'),
     
     # Portfolios
-    path('portfolios/', PortfolioListView.as_view(), name='portfolio_list'),
+    path('portfolios/', cache_anonymous_page(Portfolio)(PortfolioListView.as_view()), name='portfolio_list'),
     
     # Dashboard
     path('dashboard/', views.dashboard_view, name='dashboard'),
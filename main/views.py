@@ -1,3 +1,6 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView
 from django.contrib import messages
@@ -6,54 +9,107 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from .models import (
     Service, BlogPost, Event, Testimonial, 
-    TeamMember, Gallery, Contact, ContactMessage, GalleryTag, BlogCategory, ServiceCategory, Technology, FAQ, Portfolio, Newsletter, EventRegistration
+    TeamMember, Gallery, Contact, ContactMessage, GalleryTag, BlogCategory, BlogTag, ServiceCategory, Technology, FAQ, Portfolio, Newsletter
 )
 from .forms import ContactForm, EventRegistrationForm
-from django.db.models import Q
+from .async_utils import gather_querysets, prepare_base_template
+from .conditional import ConditionalDetailMixin
+from .db_router import primary_reads
+from .page_cache import cache_anonymous_page, shared_model_versions
+from .outbox import enqueue_email
+from .pagination import KeysetPaginationMixin
+from .search import search_blog_posts
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.http import JsonResponse
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+
+def cached_reference_data(name, querysets, models):
+    """
+    Evaluate the {name: queryset} dict ``querysets`` through the tiered cache.
+    The key carries the version stamps of ``models`` from the shared tier, so
+    saving one of them in any process replaces the entry; the TTL is only a
+    backstop.
+    """
+    versions = shared_model_versions(sorted(model._meta.label_lower for model in models))
+
+    def compute():
+        # From the primary, which the stamps describe; see primary_reads().
+        with primary_reads():
+            return {key: list(queryset) for key, queryset in querysets.items()}
+
+    return caches['tiered'].get_or_compute(f"reference-data:{name}:{':'.join(versions)}", compute, timeout=60 * 60)
 
 class ServiceListView(ListView):
     model = Service
+    queryset = Service.objects.select_related('category')
     template_name = 'main/service_list.html'
     context_object_name = 'services'
 
+    def get_extra_querysets(self):
+        return {
+            'service_categories': ServiceCategory.objects.all(),
+            'technologies': Technology.objects.all(),
+            'faqs': FAQ.objects.filter(category='service'),
+        }
+
+    def get_reference_data(self):
+        return cached_reference_data('services', self.get_extra_querysets(), (ServiceCategory, Technology, FAQ))
+
     def get_context_data(self, **kwargs):
+        # AsyncServiceListView passes the reference data in already loaded.
+        reference_data = kwargs.pop('reference_data', None) or self.get_reference_data()
         context = super().get_context_data(**kwargs)
-        context['service_categories'] = ServiceCategory.objects.all()
-        context['technologies'] = Technology.objects.all()
-        context['faqs'] = FAQ.objects.filter(category='service')
+        context.update(reference_data)
         return context
 
-class ServiceDetailView(DetailView):
+class AsyncServiceListView(ServiceListView):
+    """ServiceListView that loads its list and reference data concurrently on the async ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        results, reference_data = await asyncio.gather(
+            gather_querysets({'object_list': self.get_queryset()}),
+            sync_to_async(self.get_reference_data)(),
+        )
+        self.object_list = results['object_list']
+        await prepare_base_template(request)
+        # Rendered here, as a TemplateResponse would be rendered in a worker thread.
+        return render(request, self.template_name, self.get_context_data(reference_data=reference_data))
+
+class ServiceDetailView(ConditionalDetailMixin, DetailView):
     model = Service
+    etag_models = (ServiceCategory,)
     template_name = 'main/service_detail.html'
     context_object_name = 'service'
 
-class BlogListView(ListView):
+class BlogListView(KeysetPaginationMixin, ListView):
     model = BlogPost
     template_name = 'main/blog_list.html'
     context_object_name = 'posts'
     paginate_by = 9
+    keyset_fields = ('published_date', 'id')
+
+    def use_keyset(self):
+        # Search results are ordered by relevance, which has no stable cursor.
+        return not self.request.GET.get('search') and super().use_keyset()
 
     def get_queryset(self):
-        queryset = BlogPost.objects.filter(is_published=True)
+        # The cards show the author and first category of every post.
+        queryset = BlogPost.objects.filter(is_published=True).select_related(
+            'author'
+        ).prefetch_related('categories')
         
         # Category filter
         category_slug = self.request.GET.get('category')
         if category_slug:
             queryset = queryset.filter(categories__slug=category_slug)
         
-        # Search filter
+        # Search filter (full-text ranked on SQLite, see main.search)
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query) |
-                Q(meta_description__icontains=search_query)
-            )
+            return search_blog_posts(queryset, search_query)
         
         return queryset.order_by('-published_date')
 
@@ -68,17 +124,27 @@ class BlogListView(ListView):
             
         return context
 
-class BlogDetailView(DetailView):
+class BlogDetailView(ConditionalDetailMixin, DetailView):
     model = BlogPost
+    etag_models = (BlogCategory, BlogTag)
     template_name = 'main/blog_detail.html'
     context_object_name = 'post'
 
-class EventListView(ListView):
+    def get_validator_annotations(self):
+        # The author's name is shown but users have no modification time.
+        return {
+            'modified': F('updated_date'),
+            'author_first_name': F('author__first_name'),
+            'author_last_name': F('author__last_name'),
+        }
+
+class EventListView(KeysetPaginationMixin, ListView):
     model = Event
     template_name = 'main/event_list.html'
     context_object_name = 'events'
     paginate_by = 9
     ordering = ['-date']
+    keyset_fields = ('date', 'id')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -95,8 +161,9 @@ class EventListView(ListView):
         context['event_types'] = Event.EVENT_TYPES
         return context
 
-class EventDetailView(DetailView):
+class EventDetailView(ConditionalDetailMixin, DetailView):
     model = Event
+    etag_varies_on_csrf = True
     template_name = 'main/event_detail.html'
     context_object_name = 'event'
 
@@ -132,6 +199,7 @@ class TeamListView(ListView):
 
 class GalleryListView(ListView):
     model = Gallery
+    queryset = Gallery.objects.prefetch_related('tags')
     template_name = 'main/gallery_list.html'
     context_object_name = 'galleries'
 
@@ -155,13 +223,22 @@ def contact_view(request):
 def contact_success_view(request):
     return render(request, 'main/contact_success.html')
 
-def home_view(request):
-    context = {
+def home_querysets():
+    return {
         'services': Service.objects.all()[:3],
-        'recent_posts': BlogPost.objects.filter(is_published=True)[:3],
+        'recent_posts': BlogPost.objects.filter(is_published=True).select_related('author')[:3],
         'testimonials': Testimonial.objects.filter(is_featured=True)[:3],
         'upcoming_events': Event.objects.filter(is_upcoming=True)[:3]
     }
+
+@cache_anonymous_page(Service, BlogPost, User, Testimonial, Event)
+def home_view(request):
+    return render(request, 'main/home.html', home_querysets())
+
+@cache_anonymous_page(Service, BlogPost, User, Testimonial, Event)
+async def async_home_view(request):
+    context = await gather_querysets(home_querysets())
+    await prepare_base_template(request)
     return render(request, 'main/home.html', context)
 
 def demo_video_view(request):
@@ -179,6 +256,7 @@ def dashboard_view(request):
         return redirect('main:home')
     return render(request, 'main/dashboard.html')
 
+@cache_anonymous_page()
 def about_view(request):
     return render(request, 'main/about.html')
 
@@ -228,54 +306,45 @@ def event_registration(request, event_id):
         if form.is_valid():
             registration = form.save(commit=False)
             registration.event = event
-            registration.status = 'pending'
             
-            # Check if spots are available
-            current_registrations = EventRegistration.objects.filter(event=event).count()
-            if event.max_participants and current_registrations >= event.max_participants:
+            context = {
+                'name': registration.name,
+                'event': event,
+                'registration': registration,
+            }
+            try:
+                # The emails are queued with the registration and sent by
+                # `manage.py send_outbox`, so SMTP never delays the response.
+                with transaction.atomic():
+                    # Seats are taken with a conditional UPDATE on the event,
+                    # not by counting registrations, so they cannot be oversold.
+                    if event.take_seat():
+                        registration.status = 'pending'
+                    elif event.waitlist_enabled:
+                        registration.status = 'waitlisted'
+                    else:
+                        return JsonResponse({
+                            'status': 'error',
+                            'message': 'Sorry, this event is fully booked.'
+                        })
+                    registration.save()
+                    enqueue_email(f'Registration Confirmation - {event.title}',
+                                  'main/email/registration_confirmation.html', context, [registration.email])
+                    enqueue_email(f'New Event Registration - {event.title}',
+                                  'main/email/admin_notification.html', context, settings.EVENT_REGISTRATION_NOTIFY)
+            except IntegrityError:
+                # The seat taken above was rolled back with the registration.
                 return JsonResponse({
                     'status': 'error',
-                    'message': 'Sorry, this event is fully booked.'
+                    'message': 'You are already registered for this event.'
                 })
             
-            registration.save()
-            
-            # Send confirmation email
-            try:
-                # Email to participant
-                context = {
-                    'name': registration.name,
-                    'event': event,
-                    'registration': registration,
-                }
-                html_message = render_to_string('main/email/registration_confirmation.html', context)
-                plain_message = strip_tags(html_message)
-                
-                send_mail(
-                    f'Registration Confirmation - {event.title}',
-                    plain_message,
-                    'noreply@aisolution.com',
-                    [registration.email],
-                    html_message=html_message,
-                    fail_silently=False,
-                )
-                
-                # Email to admin
-                admin_html = render_to_string('main/email/admin_notification.html', context)
-                admin_plain = strip_tags(admin_html)
-                send_mail(
-                    f'New Event Registration - {event.title}',
-                    admin_plain,
-                    'noreply@aisolution.com',
-                    ['admin@aisolution.com'],
-                    html_message=admin_html,
-                    fail_silently=False,
-                )
-                
-            except Exception as e:
-                # Log the error but don't prevent registration
-                print(f"Email sending failed: {str(e)}")
-            
+            if registration.status == 'waitlisted':
+                return JsonResponse({
+                    'status': 'success',
+                    'message': 'The event is full, so you have been added to the waitlist. '
+                               'We will email you if a place becomes available.'
+                })
             return JsonResponse({
                 'status': 'success',
                 'message': 'Thank you for registering! Check your email for confirmation.'